@@ -0,0 +1,78 @@
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+
+class AllocationDrift():
+    '''
+    Compare the actual tag allocations over time (see TagWeights.allocations) with the target allocations (alloc_tags).
+
+    alloc_tags should be as {
+                                'main_tag_1': {
+                                            'weight': 0.3,
+                                            'subtags': {
+                                                'subtag_1': weight,
+                                                ...
+                                                }
+                                            }
+                                ...
+                            }
+    The target of a subtag is its main tag weight x subtag weight (the fraction of the portfolio, as the actual subtag allocations).
+    A tag drifts out of its target band when |actual - target| > threshold.
+    '''
+    def __init__(self, alloc_tags:Dict[str, Dict], threshold:float=0.05):
+        self.threshold = threshold
+        self.main_targets = pd.Series({main_tag: mt_dict['weight'] for main_tag, mt_dict in alloc_tags.items()}, dtype='float64')
+        sub_targets = {(main_tag, subtag): mt_dict['weight'] * weight
+                       for main_tag, mt_dict in alloc_tags.items() for subtag, weight in mt_dict.get('subtags', {}).items()}
+        self.sub_targets = pd.Series(list(sub_targets.values()), dtype='float64',
+                                     index=pd.MultiIndex.from_tuples(list(sub_targets.keys()), names=['main_tag', 'subtag']))
+
+    def drift(self, main_allocations:pd.DataFrame, sub_allocations:pd.DataFrame):
+        """
+        Compute actual minus target weight of every targeted tag at every date.
+
+        Parameters:
+        - main_allocations, sub_allocations (DataFrame): dates x main tag and dates x (main_tag, subtag) actual allocations (untagged targets count as 0).
+
+        Returns:
+        - Tuple[DataFrame, DataFrame]: dates x main tag and dates x (main_tag, subtag) drifts.
+        """
+        main_drift = main_allocations.reindex(columns=self.main_targets.index, fill_value=0) - self.main_targets
+        sub_drift = sub_allocations.reindex(columns=self.sub_targets.index, fill_value=0) - self.sub_targets
+        return main_drift, sub_drift
+
+    def _band_states(self, drift:pd.DataFrame) -> np.ndarray:
+        # -1 under the target band, 0 within it, 1 over it
+        values = drift.to_numpy(dtype='float64')
+        return (np.sign(values) * (np.abs(values) > self.threshold)).astype('int8')
+
+    def events(self, main_drift:pd.DataFrame, sub_drift:pd.DataFrame) -> pd.DataFrame:
+        """
+        Get the threshold crossing events: the dates a tag leaves or comes back into its target band
+        (a tag already out of its band at the first date starts with an event).
+
+        Returns:
+        - DataFrame: One row per event with 'date', 'main_tag', 'subtag' (None for main tags), 'drift' and 'state' ('over', 'under' or 'within') columns, sorted by date.
+        """
+        state_names = np.array(['under', 'within', 'over'])
+        events = []
+        for drift, labels in ((main_drift, [(tag, None) for tag in main_drift.columns]), (sub_drift, list(sub_drift.columns))):
+            if drift.empty:
+                continue
+            states = self._band_states(drift)
+            # Compare each date with the previous one (an in band state before the first date)
+            changed = np.diff(states, axis=0, prepend=np.zeros((1, states.shape[1]), dtype='int8')) != 0
+            date_rows, tag_columns = np.nonzero(changed)
+            labels = np.array(labels, dtype='object').reshape(-1, 2)
+            events.append(pd.DataFrame({
+                'date': drift.index[date_rows],
+                'main_tag': labels[tag_columns, 0],
+                'subtag': labels[tag_columns, 1],
+                'drift': drift.to_numpy(dtype='float64')[date_rows, tag_columns],
+                'state': state_names[states[date_rows, tag_columns] + 1]
+                }))
+        if not events:
+            return pd.DataFrame(columns=['date', 'main_tag', 'subtag', 'drift', 'state'])
+        return pd.concat(events, ignore_index=True).sort_values(by='date', kind='stable', ignore_index=True)
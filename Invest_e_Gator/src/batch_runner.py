@@ -0,0 +1,140 @@
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+from Invest_e_Gator.src.portfolio import Portfolio
+from Invest_e_Gator.src.portfolio_metrics import PortfolioMetrics
+from Invest_e_Gator.src.market_data_planner import MarketDataPlanner
+from Invest_e_Gator.src.ticker import Ticker
+from Invest_e_Gator.src.secondary_modules.currency_conversion import fx_rate_matrix
+from Invest_e_Gator.src.degiro_csv_processing import SQLiteManagment
+
+
+class BatchMetricsRunner():
+    '''
+    Compute the metrics of many portfolios (of one or many users) in one job:
+    - load every (user_id, table_name) ledger stored through SQLiteManagment,
+    - fetch the price history they need once (union of every portfolio's windows, so a ticker held by many users is fetched once),
+    - compute the metrics of the portfolios in parallel (processes share the price history store files and FX caches),
+    - write the results back to SQLite as <table_name>_positions_metrics and <table_name>_totals_metrics tables.
+    '''
+    def __init__(self, portfolios:List[Tuple[str, str]], base_currency:str='usd', today:bool=False, lot_method:str='fifo',
+                 incremental:bool=True, n_workers:int=None, use_cache:bool=True):
+        self.portfolios = portfolios
+        self.base_currency = base_currency.lower()
+        self.today = today
+        self.lot_method = lot_method
+        # Reuse the metrics computed by previous runs, one state per (user_id, table_name, base_currency, lot_method) (see Portfolio.metrics_state_key)
+        self.incremental = incremental
+        # Portfolios computed in parallel (None or 1 to compute them one after the other in this process)
+        self.n_workers = n_workers
+        # Answer portfolios whose ledger and prices didn't change from the metrics cache
+        self.use_cache = use_cache
+
+        self.loaded = {}    # (user_id, table_name) -> Portfolio
+        self.results = {}   # (user_id, table_name) -> (positions metrics, totals metrics)
+
+    def load(self) -> Dict[Tuple[str, str], Portfolio]:
+        for user_id, table_name in self.portfolios:
+            portfolio = Portfolio(user_id=user_id, base_currency=self.base_currency)
+            try:
+                portfolio.load_transactions_from_sqlite(table_name=table_name)
+            except Exception as e:
+                print(f'Could not load {table_name} of user {user_id}: {e}')
+                continue
+            if portfolio.transactions_df.empty:
+                print(f'No transactions in {table_name} of user {user_id}.')
+                continue
+            self.loaded[(user_id, table_name)] = portfolio
+        return self.loaded
+
+    def _metrics_dates(self, portfolio:Portfolio):
+        return PortfolioMetrics(portfolio.transactions_df, self.base_currency, today=self.today).all_dates
+
+    def prefetch(self) -> Dict[str, Tuple]:
+        """
+        Fetch the price history of every loaded portfolio at once: one window per ticker covering all portfolios' windows.
+
+        Returns:
+        - Dict[str, Tuple]: {ticker_symbol: (start, end)} fetched windows.
+        """
+        windows = {}
+        for portfolio in self.loaded.values():
+            dates = self._metrics_dates(portfolio)
+            for ticker, (start, end) in MarketDataPlanner(portfolio.transactions_df, start_date=min(dates), end_date=max(dates)).plan().items():
+                known_start, known_end = windows.get(ticker, (start, end))
+                windows[ticker] = (min(start, known_start), max(end, known_end))
+        Ticker.bulk_sync_price_history(windows, extend_to_today=False)
+        # Load the FX rate matrix before the worker processes are forked so that they inherit it
+        fx_rate_matrix.load()
+        return windows
+
+    def compute(self) -> Dict[Tuple[str, str], Tuple[pd.DataFrame, pd.DataFrame]]:
+        jobs = {key: (portfolio.transactions_df, self.base_currency, self.today, self.lot_method,
+                      portfolio.metrics_state_key(today=self.today, lot_method=self.lot_method) if self.incremental else None,
+                      self.use_cache, key)
+                for key, portfolio in self.loaded.items()}
+
+        if self.n_workers is not None and self.n_workers > 1 and len(jobs) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=min(self.n_workers, len(jobs))) as executor:
+                futures = {key: executor.submit(_compute_portfolio_metrics, *job) for key, job in jobs.items()}
+                outcomes = {key: _result_or_error(future) for key, future in futures.items()}
+        else:
+            outcomes = {key: _result_or_error(None, job) for key, job in jobs.items()}
+
+        for (user_id, table_name), outcome in outcomes.items():
+            if isinstance(outcome, Exception):
+                print(f'Could not compute metrics of {table_name} of user {user_id}: {outcome}')
+            else:
+                self.results[(user_id, table_name)] = outcome
+        return self.results
+
+    def write(self):
+        """
+        Store the computed metrics in SQLite, one <table_name>_positions_metrics and <table_name>_totals_metrics table per ledger table name.
+        Rows of the users computed in this batch are replaced, rows of other users sharing the table are kept.
+        """
+        tables = {}
+        for (user_id, table_name), (positions, totals) in self.results.items():
+            positions = positions.reset_index()
+            positions['ticker_symbol'] = positions['ticker_symbol'].astype(str)
+            for suffix, df in (('positions_metrics', positions), ('totals_metrics', totals.reset_index())):
+                tables.setdefault(f'{table_name}_{suffix}', []).append(df.assign(user_id=user_id))
+
+        with SQLiteManagment.get_db_connection() as conn:
+            for table_name, dfs in tables.items():
+                df = pd.concat(dfs, ignore_index=True)
+                exists = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,)).fetchone()
+                if exists:
+                    user_ids = list(df['user_id'].unique())
+                    conn.execute(f"DELETE FROM {table_name} WHERE user_id IN ({','.join('?' * len(user_ids))})", user_ids)
+                    conn.commit()
+                df.to_sql(table_name, conn, if_exists='append', index=False)
+
+    def run(self) -> Dict[Tuple[str, str], Tuple[pd.DataFrame, pd.DataFrame]]:
+        """
+        Load, prefetch, compute and write the metrics of all portfolios.
+
+        Returns:
+        - Dict[Tuple[str, str], Tuple[DataFrame, DataFrame]]: (user_id, table_name) -> (positions metrics, totals metrics), see PortfolioMetrics.compute_metrics(tidy=True).
+        """
+        self.load()
+        self.prefetch()
+        self.compute()
+        self.write()
+        return self.results
+
+
+def _compute_portfolio_metrics(transactions_df:pd.DataFrame, base_currency:str, today:bool, lot_method:str, state_key:str,
+                               use_cache:bool, cache_owner:Tuple[str, str]):
+    # Process pool worker (prices are already in the local store so nothing is fetched)
+    return PortfolioMetrics(transactions_df, base_currency, today=today, lot_method=lot_method, state_key=state_key,
+                            use_cache=use_cache, cache_owner=cache_owner).compute_metrics(tidy=True)
+
+def _result_or_error(future, job=None):
+    # Result of a job (run now if there is no future), or the exception it raised so that one portfolio doesn't stop the batch
+    try:
+        return future.result() if future is not None else _compute_portfolio_metrics(*job)
+    except Exception as e:
+        return e
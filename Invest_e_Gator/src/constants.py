@@ -13,6 +13,9 @@ available_metrics = [
                      'total_pl'                          # total portfolio return (p/l)
                      ]
 
+# Lot matching methods for realized gains/losses
+lot_methods = ['fifo', 'lifo', 'average']
+
 available_currencies = ['usd', 'eur', 'jpy', 'gbp', 'aud', 'cad', 'chf', 'cny', 'hkd', 'nzd', 'sgd', 
                         'krw', 'inr', 'rub', 'brl', 'mxn', 'zar', 'try', 'pln', 'dkk', 'sek', 'nok', 
                         'czk', 'ils', 'myr', 'thb', 'idr', 'huf', 'ron', 'bgn', 'hrk', 'ltl', 'php']
@@ -138,6 +141,15 @@ yfinance_info_attributes = {
 }
 
 
+# yfinance.Ticker.info fields cached together with their own time to live (see conf/config.yaml 'yfinance_INFO_TTL_SECONDS')
+# Fields not listed here fall in the 'default' group
+yfinance_info_field_groups = {
+    'static': ['longName', 'uuid', 'quoteType', 'exchange', 'longBusinessSummary', 'country', 
+               'industryKey', 'sectorKey', 'fullTimeEmployees', 'companyOfficers', 'currency'],
+    'price': ['currentPrice', 'previousClose', 'open', 'dayLow', 'dayHigh', 'volume', 'marketCap'],
+}
+
+
 yfinance_history_interval_period_choices = {
     'interval': ['1m', '2m', '5m', '15m', '30m', '60m', '90m', '1h', '1d', '5d', '1wk', '1mo', '3mo'],
     'period': ['1d', '5d', '1mo', '3mo', '6mo', '1y', '2y', '5y', '10y', 'ytd', 'max', None],
@@ -149,4 +161,10 @@ from pathlib import Path
 # Assuming we are in Invest_e_Gator\src\constants.py
 root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 results_path = os.path.join(root_path, 'results')
-
+# Local caches (market data, fx rates, computed metrics)
+cache_path = os.path.join(root_path, 'cache')
+price_history_path = os.path.join(cache_path, 'price_history')
+info_cache_path = os.path.join(cache_path, 'yfinance_info.db')
+fx_rate_cache_path = os.path.join(cache_path, 'fx_rates.db')
+metrics_state_path = os.path.join(cache_path, 'metrics_state')
+metrics_cache_path = os.path.join(cache_path, 'metrics_cache.db')
@@ -6,8 +6,6 @@ import numpy as np
 import sqlite3
 from contextlib import contextmanager
 
-import finnhub
-from ratelimit import limits, sleep_and_retry
 import time
 
 from dotenv import load_dotenv
@@ -15,6 +13,7 @@ load_dotenv()  # Load environment variables from .env file
 
 
 from Invest_e_Gator.src.secondary_modules.pydantic_valids import validate_load_csv
+from Invest_e_Gator.src.secondary_modules.metrics_cache import metrics_cache
 
 # Assuming we are in src\degiro_csv_processing.py
 ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -142,6 +141,9 @@ class DataProcess:
             raise ValueError(f"Couldn't find ticker symbol for the following isin codes: {not_found_isin}. Please provide them via the mapper csv file.")
     
     def _get_ticker_symbol_from_isin_via_finnhub(self, ISIN_codes:List[str], CALLS=50, ONE_MINUTE=60):
+        # finnhub and ratelimit are only imported when ISIN codes actually need a lookup
+        import finnhub
+        from ratelimit import limits, sleep_and_retry
         
         def get_finnhub_client():
             # Get API key
@@ -260,6 +262,8 @@ class DataProcess:
     def write_to_sqlite(self):
         # Store the DataFrame in the SQLite database table
         SQLiteManagment.store_dataframe_in_sqlite(self.user_id, self.df, table_name=self.pf_name)
+        # Metrics computed from the previous version of the ledger table are stale
+        metrics_cache.invalidate(self.user_id, table_name=self.pf_name)
         
     def get_processed_df(self):
         return(self.df)
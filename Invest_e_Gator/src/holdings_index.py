@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+
+class HoldingsIndex():
+    '''
+    Event-sourced index of the positions of a ledger, answering point-in-time holdings queries without re-aggregating the ledger.
+
+    The ledger is kept as date sorted arrays (the transaction index), with a snapshot of every ticker's cumulative quantity and cost
+    every snapshot_every transactions. Holdings at a date are the last snapshot before it plus a replay of at most snapshot_every transactions.
+    '''
+    def __init__(self, transactions_df:pd.DataFrame, snapshot_every:int=256, quantity_tolerance:float=1e-9):
+        transactions = transactions_df.sort_values(by='date_hour', kind='stable')
+        self.snapshot_every = snapshot_every
+        # Remaining quantity under which a position is considered closed
+        self.quantity_tolerance = quantity_tolerance
+
+        # Transaction index
+        self.tickers = pd.Index(transactions['ticker_symbol'].unique())
+        self.dates = transactions['date_hour'].to_numpy(dtype='datetime64[ns]')
+        self.ticker_codes = self.tickers.get_indexer(transactions['ticker_symbol'])
+        self.deltas = np.column_stack([transactions['quantity'].to_numpy(dtype='float64'),
+                                       transactions['transact_amount_base_currency'].to_numpy(dtype='float64')])
+        # Row of each ticker's first transaction
+        self.first_rows = np.unique(self.ticker_codes, return_index=True)[1]
+
+        # snapshots[s] holds the (quantity, cost) of every ticker after the first s * snapshot_every transactions
+        n_snapshots = len(self.dates) // snapshot_every + 1
+        # The extra last chunk holds the transactions after the last snapshot
+        chunk_deltas = np.zeros((n_snapshots + 1, len(self.tickers), 2))
+        np.add.at(chunk_deltas, (np.arange(len(self.dates)) // snapshot_every + 1, self.ticker_codes), self.deltas)
+        self.snapshots = np.cumsum(chunk_deltas[:-1], axis=0)
+
+    def _state_after(self, n_transactions:int) -> np.ndarray:
+        # (quantity, cost) per ticker after the first n_transactions: snapshot lookup plus a short replay
+        snapshot = n_transactions // self.snapshot_every
+        state = self.snapshots[snapshot].copy()
+        replayed = slice(snapshot * self.snapshot_every, n_transactions)
+        np.add.at(state, self.ticker_codes[replayed], self.deltas[replayed])
+        return state
+
+    def _to_frame(self, state:np.ndarray) -> pd.DataFrame:
+        quantity, cost = state[:, 0], state[:, 1]
+        quantity[np.abs(quantity) < self.quantity_tolerance] = 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cost_average = np.where(quantity != 0, cost / quantity, 0)
+        return pd.DataFrame({'quantity': quantity, 'cost': cost, 'cost_average': cost_average}, index=self.tickers.rename('ticker_symbol'))
+
+    def holdings_at(self, date, include_closed:bool=False) -> pd.DataFrame:
+        """
+        Get the holdings as of a date (transactions dated on or before it).
+
+        Parameters:
+        - date (str or datetime): Date of the holdings.
+        - include_closed (bool): Also return tickers traded before the date but not held anymore.
+
+        Returns:
+        - DataFrame: 'quantity', 'cost' (net amount invested in base currency) and 'cost_average' per ticker_symbol.
+        """
+        n_transactions = int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(date), 'ns'), side='right'))
+        held = self._to_frame(self._state_after(n_transactions))
+        # Tickers not traded yet are left out
+        held = held[self.first_rows < n_transactions]
+        return held if include_closed else held[held['quantity'] != 0]
+
+    def holdings_between(self, start, end, freq:str='D') -> pd.DataFrame:
+        """
+        Get the quantity held of each ticker at each date from start to end.
+
+        Parameters:
+        - start, end (str or datetime): First and last dates.
+        - freq (str): Frequency of the dates (pandas offset alias).
+
+        Returns:
+        - DataFrame: dates x ticker_symbol quantities (tickers held at some point over the dates only).
+        """
+        dates = pd.date_range(start, end, freq=freq)
+        if not len(dates):
+            return pd.DataFrame(columns=self.tickers.rename('ticker_symbol'), dtype='float64')
+        first, last = np.searchsorted(self.dates, dates.values[[0, -1]], side='right')
+        # Holdings at the first date, then the transactions in between binned to the first date on or after them
+        quantities = np.zeros((len(dates), len(self.tickers)))
+        quantities[0] = self._state_after(int(first))[:, 0]
+        date_bins = np.searchsorted(dates.values, self.dates[first:last], side='left')
+        np.add.at(quantities, (date_bins, self.ticker_codes[first:last]), self.deltas[first:last, 0])
+        quantities = np.cumsum(quantities, axis=0)
+        quantities[np.abs(quantities) < self.quantity_tolerance] = 0
+        held = quantities.any(axis=0)
+        return pd.DataFrame(quantities[:, held], index=dates, columns=self.tickers[held].rename('ticker_symbol'))
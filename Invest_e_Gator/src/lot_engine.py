@@ -0,0 +1,115 @@
+from typing import Dict
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from Invest_e_Gator.src.constants import lot_methods
+
+
+class LotEngine():
+    '''
+    Match real sales with open buy lots in one chronological walk over the ledger.
+
+    Each ticker keeps a deque of open lots [remaining shares, price, date_hour, ledger row]:
+    - 'fifo': sales consume the oldest lots first.
+    - 'lifo': sales consume the newest lots first.
+    - 'average': open lots are pooled into a single lot at the average cost.
+    Shares sold beyond the open lots are kept as open sale lots and matched with the next buys, the gain/loss being realized at that buy.
+    '''
+    def __init__(self, transactions_df:pd.DataFrame, method:str='fifo'):
+        if method not in lot_methods:
+            raise ValueError(f'In LotEngine, method should be one of {lot_methods}.')
+        self.transactions_df = transactions_df.sort_values(by='date_hour', kind='stable').reset_index(drop=True)
+        self.method = method
+
+        self.realized = None    # Realized gains/losses per ledger row
+        self.lots = None        # ticker_symbol -> (open buy lots, open sale lots)
+
+    def _add_lot(self, lots:deque, lot:list):
+        if self.method == 'average' and lots:
+            # Pool with the open lot at the average price
+            n_shares = lots[0][0] + lot[0]
+            lots[0][1] = (lots[0][0] * lots[0][1] + lot[0] * lot[1]) / n_shares
+            lots[0][0] = n_shares
+        else:
+            lots.append(lot)
+
+    def restore(self, realized:np.ndarray, lots:Dict):
+        """
+        Restore the state of a previous run over the first len(realized) rows of the same (sorted) ledger, so that run can resume from there.
+        """
+        self.realized, self.lots = realized, lots
+
+    def run(self, start_row:int=0) -> np.ndarray:
+        """
+        Walk the real transactions once.
+
+        Parameters:
+        - start_row (int): Resume from this ledger row with the restored state (see restore) instead of walking the whole ledger.
+
+        Returns:
+        - np.ndarray: Realized gains/losses of each ledger row (in base currency, 0 for buys that match nothing and non real transactions).
+        """
+        transactions = self.transactions_df
+        if start_row and self.lots is not None:
+            self.realized = np.concatenate([self.realized[:start_row], np.zeros(len(transactions) - start_row)])
+        else:
+            start_row = 0
+            self.realized = np.zeros(len(transactions))
+            self.lots = {}
+        real_rows = np.flatnonzero(transactions['transaction_action'].to_numpy()[start_row:] == 'real') + start_row
+        columns = zip(real_rows, transactions['ticker_symbol'].to_numpy()[real_rows], transactions['transaction_type'].to_numpy()[real_rows],
+                      transactions['n_shares'].to_numpy(dtype='float64')[real_rows], transactions['share_price_base_currency'].to_numpy(dtype='float64')[real_rows],
+                      transactions['date_hour'].to_numpy()[real_rows])
+        pop_index = -1 if self.method == 'lifo' else 0
+
+        for row, ticker, transaction_type, n_shares, price, date_hour in columns:
+            buys, sales = self.lots.setdefault(ticker, (deque(), deque()))
+            lots, matching = (buys, sales) if transaction_type == 'buy' else (sales, buys)
+            remaining = n_shares
+            while remaining > 0 and matching:
+                lot = matching[pop_index]
+                matched = min(remaining, lot[0])
+                buy_price, sale_price = (price, lot[1]) if transaction_type == 'buy' else (lot[1], price)
+                self.realized[row] += (sale_price - buy_price) * matched
+                lot[0] -= matched
+                remaining -= matched
+                if lot[0] <= 0:
+                    matching.pop() if pop_index == -1 else matching.popleft()
+            if remaining > 0:
+                self._add_lot(lots, [remaining, price, date_hour, row])
+        return self.realized
+
+    def open_lots(self) -> pd.DataFrame:
+        """
+        Get the lots still open after the last transaction.
+
+        Returns:
+        - DataFrame: One row per open lot with 'ticker_symbol', 'transaction_type' (buy, or sale for shares sold beyond the open buys),
+                     'date_hour' (of the transaction that opened the lot, the first one for a pooled average lot), 'n_shares' (remaining) and 'share_price_base_currency'.
+        """
+        if self.lots is None:
+            self.run()
+        rows = [(ticker, transaction_type, lot[2], lot[0], lot[1])
+                for ticker, (buys, sales) in self.lots.items()
+                for transaction_type, lots in (('buy', buys), ('sale', sales)) for lot in lots]
+        return pd.DataFrame(rows, columns=['ticker_symbol', 'transaction_type', 'date_hour', 'n_shares', 'share_price_base_currency'])
+
+    def cumulative_realized(self, dates) -> pd.DataFrame:
+        """
+        Get the cumulative realized gains/losses per ticker as of each date (transactions dated on or before the date).
+
+        Returns:
+        - DataFrame: dates x ticker_symbol.
+        """
+        if self.realized is None:
+            self.run()
+        dates = pd.DatetimeIndex(dates).sort_values()
+        tickers = list(self.transactions_df['ticker_symbol'].unique())
+        # Sum per (date, ticker) then accumulate over dates (the last bin holds transactions after the last date)
+        date_bins = np.searchsorted(dates.values, self.transactions_df['date_hour'].to_numpy(dtype='datetime64[ns]'), side='left')
+        ticker_codes = pd.Categorical(self.transactions_df['ticker_symbol'], categories=tickers).codes
+        deltas = np.zeros((len(dates) + 1, len(tickers)))
+        np.add.at(deltas, (date_bins, ticker_codes), self.realized)
+        return pd.DataFrame(np.cumsum(deltas[:-1], axis=0), index=dates, columns=tickers)
@@ -0,0 +1,76 @@
+from typing import Dict, Tuple
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from Invest_e_Gator.src.ticker import Ticker
+
+
+class MarketDataPlanner():
+    '''
+    Work out, from a transactions DataFrame, the minimal price history window needed per ticker
+    and fetch each of them once before computing metrics.
+
+    A ticker's window goes from its first transaction to its last transaction if the position is closed,
+    or to end_date (today by default) if it is still open.
+    '''
+    def __init__(self, transactions_df:pd.DataFrame, start_date:datetime=None, end_date:datetime=None,
+                 lookback_days:int=Ticker.closing_price_lookback_days, quantity_tolerance:float=1e-9):
+        self.transactions_df = transactions_df
+        self.start_date = pd.Timestamp(start_date).normalize() if start_date is not None else None
+        self.end_date = pd.Timestamp(end_date).normalize() if end_date is not None else None
+        # Days fetched before a window start so that it resolves to the previous close
+        self.lookback_days = lookback_days
+        # Remaining quantity under which a position is considered closed
+        self.quantity_tolerance = quantity_tolerance
+
+    def held_windows(self) -> pd.DataFrame:
+        """
+        Get the period each ticker was held.
+
+        Returns:
+        - DataFrame: indexed by ticker_symbol with 'first_held', 'last_held' (NaT if the position is still open) and 'open' columns.
+        """
+        transactions = self.transactions_df.sort_values(by='date_hour', kind='stable')
+        grouped = transactions.groupby('ticker_symbol', sort=False)
+        windows = pd.DataFrame({
+            'first_held': grouped['date_hour'].min(),
+            'last_transaction': grouped['date_hour'].max(),
+            'remaining_quantity': grouped['quantity'].sum()
+            })
+        windows['open'] = np.abs(windows['remaining_quantity']) > self.quantity_tolerance
+        windows['last_held'] = windows['last_transaction'].where(~windows['open'])
+        return windows[['first_held', 'last_held', 'open']]
+
+    def plan(self) -> Dict[str, Tuple]:
+        """
+        Compute the price history window to fetch per ticker, restricted to [start_date, end_date].
+
+        Returns:
+        - Dict[str, Tuple]: {ticker_symbol: (start, end)}, tickers not held within [start_date, end_date] are left out.
+        """
+        today = pd.Timestamp.now().normalize()
+        end_date = min(self.end_date, today) if self.end_date is not None else today
+
+        windows = {}
+        for ticker, row in self.held_windows().iterrows():
+            start = pd.Timestamp(row['first_held']).normalize()
+            end = end_date if row['open'] else min(pd.Timestamp(row['last_held']).normalize(), end_date)
+            if self.start_date is not None:
+                start = max(start, self.start_date)
+            if start > end:
+                continue
+            windows[ticker] = (start - pd.Timedelta(days=self.lookback_days), end)
+        return windows
+
+    def prefetch(self) -> Dict[str, Tuple]:
+        """
+        Fetch every planned window once (multi-ticker requests, only ranges missing in the local store).
+
+        Returns:
+        - Dict[str, Tuple]: The planned windows.
+        """
+        windows = self.plan()
+        Ticker.bulk_sync_price_history(windows, extend_to_today=False)
+        return windows
@@ -0,0 +1,244 @@
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from Invest_e_Gator.src.secondary_modules.currency_conversion import currency_conversion_column
+from Invest_e_Gator.src.ticker import Ticker
+from Invest_e_Gator.src.lot_engine import LotEngine
+
+
+class MetricsEngine():
+    '''
+    Compute the daily portfolio metrics of PortfolioMetrics for all dates in one pass.
+
+    The ledger is pivoted into date x ticker matrices of deltas (quantity, cost, invested amount, realized gains/losses),
+    each transaction being binned to the first date on or after it, and cumulative sums over dates give the positions at each date.
+    Position values are the held quantities multiplied by a date x ticker matrix of closing prices converted to the base currency.
+    '''
+    def __init__(self, transactions_df:pd.DataFrame, base_currency:str, dates, today:bool=False,
+                 ticker_currencies:Dict[str, str]=None, quantity_tolerance:float=1e-9, lot_method:str='fifo', n_workers:int=None):
+        self.transactions_df = transactions_df.sort_values(by='date_hour', kind='stable').reset_index(drop=True)
+        self.base_currency = base_currency
+        self.dates = pd.DatetimeIndex(dates).sort_values()
+        self.today = today
+        # ticker_symbol -> currency the ticker is quoted in (fetched through Ticker if not provided)
+        self.ticker_currencies = ticker_currencies if ticker_currencies else {}
+        # Remaining quantity under which a position is considered closed (float cumulative sums rarely get back to exactly 0)
+        self.quantity_tolerance = quantity_tolerance
+        # Matching of sales with buy lots for realized gains/losses ('fifo', 'lifo' or 'average')
+        self.lot_engine = LotEngine(self.transactions_df, method=lot_method)
+        # Ledger row the lot engine resumes from (its state over the previous rows being restored)
+        self.lot_start_row = 0
+        # Shard the per ticker computations across this many processes (None or 1 to compute them in this process)
+        self.n_workers = n_workers
+
+        # Tickers ordered by first transaction, so that the tickers traded up to any date are a prefix of this list
+        self.tickers = list(self.transactions_df['ticker_symbol'].unique())
+        self.matrices = None
+
+    ### Ledger -> date x ticker deltas
+
+    def _cumulative_matrix(self, date_bins:np.ndarray, ticker_codes:np.ndarray, values:np.ndarray) -> np.ndarray:
+        # Sum deltas per (date, ticker) then accumulate over dates
+        deltas = np.zeros((len(self.dates) + 1, len(self.tickers)))
+        np.add.at(deltas, (date_bins, ticker_codes), values)
+        # The last bin holds transactions after the last date
+        return np.cumsum(deltas[:-1], axis=0)
+
+    ### Prices
+
+    def _ticker_currency(self, ticker:str) -> str:
+        if ticker not in self.ticker_currencies:
+            self.ticker_currencies[ticker] = Ticker(ticker).currency.lower()
+        return self.ticker_currencies[ticker]
+
+    def _local_price_matrix(self, held:np.ndarray):
+        """
+        Closing prices (in each ticker's currency) as of each date for each ticker, only filled where the ticker is held.
+
+        Returns:
+        - Tuple[np.ndarray, np.ndarray]: dates x tickers prices (NaN where unknown) and the currency of each ticker.
+        """
+        prices = np.zeros((len(self.dates), len(self.tickers)))
+        currencies = np.full(len(self.tickers), self.base_currency, dtype=object)
+        for j, ticker in enumerate(self.tickers):
+            if not held[:, j].any():
+                continue
+            try:
+                currencies[j] = self._ticker_currency(ticker)
+                prices[:, j] = Ticker(ticker).closing_prices_asof(self.dates, sync=False)
+            except Exception as e:
+                print(e)
+                prices[:, j] = np.nan
+        return prices, currencies
+
+    def _to_base_currency(self, prices:np.ndarray, currencies:np.ndarray, held:np.ndarray) -> np.ndarray:
+        # All held cells converted at once, prices that couldn't be found or converted are valued 0,
+        # as are cells not held (their price may be missing, e.g. before listing or after delisting)
+        prices = np.where(held, prices, 0)
+        rows, columns = np.nonzero(held)
+        prices[rows, columns] = currency_conversion_column(prices[rows, columns], currencies[columns].astype(str), self.base_currency,
+                                                           self.dates.values[rows], today=self.today)
+        missing = held & np.isnan(prices)
+        for ticker in np.array(self.tickers, dtype=object)[missing.any(axis=0)]:
+            print(f'{ticker} might have been delisted.')
+        prices[missing] = 0
+        return prices
+
+    ### Per ticker matrices
+
+    def _ticker_matrices(self) -> Dict[str, np.ndarray]:
+        """
+        Compute the dates x tickers matrices that only depend on each ticker's own transactions and prices.
+
+        Returns:
+        - Dict[str, np.ndarray]: 'quantity', 'total_cost', 'invested', 'realized', 'traded' (bool) and 'prices' (in each ticker's currency)
+                                 dates x tickers matrices, and 'currencies' (one per ticker).
+        """
+        transactions = self.transactions_df
+        # Each transaction counts from the first date on or after it
+        date_bins = np.searchsorted(self.dates.values, transactions['date_hour'].to_numpy(dtype='datetime64[ns]'), side='left')
+        ticker_codes = pd.Categorical(transactions['ticker_symbol'], categories=self.tickers).codes
+        real = (transactions['transaction_action'] == 'real').to_numpy()
+        amounts = transactions['transact_amount_base_currency'].to_numpy(dtype='float64')
+
+        quantity = self._cumulative_matrix(date_bins, ticker_codes, transactions['quantity'].to_numpy(dtype='float64'))
+        quantity[np.abs(quantity) < self.quantity_tolerance] = 0
+        prices, currencies = self._local_price_matrix(held=quantity != 0)
+        return {
+            'quantity': quantity,
+            'total_cost': self._cumulative_matrix(date_bins, ticker_codes, amounts),
+            'invested': self._cumulative_matrix(date_bins, ticker_codes, np.where(real, amounts, 0)),
+            'realized': self._cumulative_matrix(date_bins, ticker_codes, self.lot_engine.run(start_row=self.lot_start_row)),
+            'traded': self._cumulative_matrix(date_bins, ticker_codes, np.ones(len(transactions))) > 0,
+            'prices': prices,
+            'currencies': currencies,
+        }
+
+    def _parallel_ticker_matrices(self, n_workers:int) -> Dict[str, np.ndarray]:
+        """
+        Compute _ticker_matrices with tickers sharded across a process pool, then gather the shards (and their lot engine states) back.
+        Workers read the price history from the memory-mapped store files, so price data is shared through the OS page cache.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        ticker_codes = pd.Categorical(self.transactions_df['ticker_symbol'], categories=self.tickers).codes
+        # Contiguous shards keep the tickers ordered by first transaction once concatenated
+        shards = [shard for shard in np.array_split(np.arange(len(self.tickers)), n_workers) if len(shard)]
+        shard_rows = [np.flatnonzero((ticker_codes >= shard[0]) & (ticker_codes <= shard[-1])) for shard in shards]
+        with ProcessPoolExecutor(max_workers=len(shards)) as executor:
+            futures = [executor.submit(_compute_ticker_shard, self.transactions_df.iloc[rows], self.base_currency, self.dates, self.today,
+                                       self.ticker_currencies, self.quantity_tolerance, self.lot_engine.method) for rows in shard_rows]
+            results = [future.result() for future in futures]
+
+        realized, lots = np.zeros(len(self.transactions_df)), {}
+        for rows, (_, shard_realized, shard_lots, ticker_currencies) in zip(shard_rows, results):
+            realized[rows] = shard_realized
+            # Lots refer to shard rows
+            for ticker, (buys, sales) in shard_lots.items():
+                for lot in list(buys) + list(sales):
+                    lot[3] = rows[lot[3]]
+            lots.update(shard_lots)
+            self.ticker_currencies.update(ticker_currencies)
+        self.lot_engine.restore(realized, lots)
+        return {key: np.concatenate([matrices[key] for matrices, _, _, _ in results], axis=-1) for key in results[0][0]}
+
+    ### Metrics
+
+    def compute(self) -> Dict[str, pd.DataFrame]:
+        """
+        Compute all metrics for all dates.
+
+        Returns:
+        - Dict[str, DataFrame]: position_* metrics as date x ticker DataFrames and total_* metrics as Series indexed by date.
+                                Cells of tickers not traded yet at a date are NaN.
+        """
+        parallel = self.n_workers is not None and self.n_workers > 1 and len(self.tickers) > 1 and not self.lot_start_row
+        matrices = self._parallel_ticker_matrices(self.n_workers) if parallel else self._ticker_matrices()
+        quantity, total_cost, invested, realized, traded = (matrices[key] for key in ['quantity', 'total_cost', 'invested', 'realized', 'traded'])
+
+        # Reduce into totals
+        values = quantity * self._to_base_currency(matrices['prices'], matrices['currencies'], held=quantity != 0)
+        total_value, total_invested, total_realized = values.sum(axis=1), invested.sum(axis=1), realized.sum(axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cost_average = np.where(quantity != 0, total_cost / quantity, 0)
+            ratio_pf_value = np.where(total_value[:, None] != 0, values / total_value[:, None], 0)
+            ratio_invested = np.where(total_invested[:, None] != 0, invested / total_invested[:, None], 0)
+            pl = (values + realized - invested) / invested
+            total_pl = (total_value + total_realized - total_invested) / total_invested
+
+        # Number of tickers traded up to each date
+        self._n_traded = traded.sum(axis=1)
+        to_frame = lambda matrix: pd.DataFrame(np.where(traded, matrix, np.nan), index=self.dates, columns=self.tickers)
+        self.matrices = {
+            'position_held': to_frame(quantity),
+            'position_values': to_frame(values),
+            'position_invested': to_frame(invested),
+            'position_cost_average': to_frame(cost_average),
+            'position_realized_gains_losses': to_frame(realized),
+            'position_pl': to_frame(pl),
+            'position_ratio_invested': to_frame(ratio_invested),
+            'position_ratio_pf_value': to_frame(ratio_pf_value),
+            'total_value': pd.Series(total_value, index=self.dates),
+            'total_invested': pd.Series(total_invested, index=self.dates),
+            'total_realized': pd.Series(total_realized, index=self.dates),
+            'total_pl': pd.Series(total_pl, index=self.dates),
+        }
+        return self.matrices
+
+    def to_positions_frame(self) -> pd.DataFrame:
+        """
+        Get the position_* metrics as a tidy frame: one row per (date, ticker_symbol) the ticker was traded by,
+        so that a ticker's history (.xs(ticker, level='ticker_symbol')) or a day's cross-section (.xs(date, level='date')) is a plain slice.
+
+        Returns:
+        - DataFrame: position_* columns (float64) indexed by a (date, ticker_symbol) MultiIndex, ticker_symbol being categorical.
+        """
+        matrices = self.matrices if self.matrices is not None else self.compute()
+        # Traded cells, ordered by date then ticker
+        rows, columns = np.nonzero(self._n_traded[:, None] > np.arange(len(self.tickers))[None, :])
+        index = pd.MultiIndex.from_arrays([self.dates[rows], pd.Categorical.from_codes(columns, categories=self.tickers)], names=['date', 'ticker_symbol'])
+        return pd.DataFrame({metric: matrix.to_numpy()[rows, columns] for metric, matrix in matrices.items() if metric.startswith('position_')}, index=index)
+
+    def to_totals_frame(self) -> pd.DataFrame:
+        """
+        Get the total_* metrics as a frame indexed by date.
+        """
+        matrices = self.matrices if self.matrices is not None else self.compute()
+        totals = pd.DataFrame({metric: series for metric, series in matrices.items() if metric.startswith('total_')})
+        totals.index.name = 'date'
+        return totals
+
+    def to_metrics_frame(self) -> pd.DataFrame:
+        """
+        Get the metrics in the PortfolioMetrics layout (see metrics_frame_from_tidy).
+        """
+        return metrics_frame_from_tidy(self.to_positions_frame(), self.to_totals_frame())
+
+
+def metrics_frame_from_tidy(positions:pd.DataFrame, totals:pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert tidy metrics (see MetricsEngine.to_positions_frame / to_totals_frame) to the PortfolioMetrics layout:
+    one row per date, position_* cells being {ticker: value} dicts over the tickers traded up to that date.
+    """
+    # Positions rows are ordered by date: bounds of each date's rows
+    date_positions = totals.index.get_indexer(positions.index.get_level_values('date'))
+    bounds = np.searchsorted(date_positions, np.arange(len(totals) + 1))
+    tickers = positions.index.get_level_values('ticker_symbol').astype(str).to_numpy()
+    columns = {}
+    for metric in positions.columns:
+        values = positions[metric].tolist()
+        columns[metric] = [dict(zip(tickers[start:end], values[start:end])) for start, end in zip(bounds[:-1], bounds[1:])]
+    for metric in totals.columns:
+        columns[metric] = totals[metric].to_numpy()
+    return pd.DataFrame(columns, index=totals.index.rename(None))
+
+
+def _compute_ticker_shard(transactions_df:pd.DataFrame, base_currency:str, dates, today:bool, ticker_currencies:Dict[str, str],
+                          quantity_tolerance:float, lot_method:str):
+    # Process pool worker: per ticker matrices of a shard of tickers, with the lot engine state and ticker currencies to send back
+    engine = MetricsEngine(transactions_df, base_currency, dates, today=today, ticker_currencies=ticker_currencies,
+                           quantity_tolerance=quantity_tolerance, lot_method=lot_method)
+    return engine._ticker_matrices(), engine.lot_engine.realized, engine.lot_engine.lots, engine.ticker_currencies
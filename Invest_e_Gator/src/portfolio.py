@@ -1,14 +1,23 @@
+import os
+import hashlib
 from datetime import datetime
-from typing import Dict, List, Union
+from typing import Dict, Iterable, List, Union
+from pathlib import Path
 import pandas as pd
 import numpy as np
 
-from Invest_e_Gator.src.secondary_modules.pydantic_valids import validate_load_csv, validate_tags_dict
-from Invest_e_Gator.src.secondary_modules.currency_conversion import currency_conversion
-from Invest_e_Gator.src.transactions import Transaction
+from Invest_e_Gator.src.secondary_modules.pydantic_valids import validate_tags_dict
+from Invest_e_Gator.src.transactions import Transaction, TransactionBatch
 from Invest_e_Gator.src.ticker import Ticker
+from Invest_e_Gator.src.holdings_index import HoldingsIndex
+from Invest_e_Gator.src.tag_weights import TagWeights
+from Invest_e_Gator.src.allocation_drift import AllocationDrift
+from Invest_e_Gator.src.risk_metrics import RiskMetrics, flow_adjusted_returns
+from Invest_e_Gator.src.returns_engine import ReturnsEngine
 from Invest_e_Gator.src.portfolio_metrics import PortfolioMetrics, plot_allocations
 from Invest_e_Gator.src.degiro_csv_processing import SQLiteManagment
+from Invest_e_Gator.src.secondary_modules.metrics_state import ledger_fingerprint
+from Invest_e_Gator.src.constants import results_path
 
 
 class Portfolio:
@@ -21,87 +30,101 @@ class Portfolio:
         #self.cash_position = cash_position
         self.base_currency = base_currency.lower()
         self.transactions_df = pd.DataFrame()
+        # SQLite table the ledger was loaded from
+        self.table_name = None
+        
+        self.positions_metrics = None
+        self.totals_metrics = None
+        # Risk metrics of the value history (see calculate_metrics)
+        self.risk_metrics = None
+        self.rolling_risk_metrics = None
+        self.risk_summary = None
+        # Time and money weighted returns (see compute_returns)
+        self.positions_returns = None
+        self.totals_returns = None
         
         self.ticker_full_names = {}
+        # Point-in-time holdings index, built on first query after each ledger change
+        self._holdings_index = None
 
-    def _get_ticker_tags(self, ticker:str, tags_dict:Dict[str, List]):
-        if not tags_dict:
-            return None
-        return tags_dict[ticker] if tags_dict.get(ticker) else None
-            
     def add_transaction(self, transaction: Transaction, tags_dict:Dict[str, List]=None):
         if not isinstance(transaction, Transaction): raise ValueError('In add_transaction, transaction parameters should be a Transaction object.')
+        # Merged in place in the sorted ledger
+        self.add_transactions([transaction], tags_dict)
+        
+    def _get_ticker_full_names(self, ticker_symbols:List[str]) -> Dict[str, str]:
+        # Get tickers' full names (fetched once per ticker)
+        for ticker_symbol in ticker_symbols:
+            if not self.ticker_full_names.get(ticker_symbol):
+                self.ticker_full_names[ticker_symbol] = Ticker(ticker_symbol=ticker_symbol).name
+        return {ticker_symbol: self.ticker_full_names[ticker_symbol] for ticker_symbol in ticker_symbols}
+    
+    def _merge_sorted_transactions(self, new_transactions:pd.DataFrame) -> pd.DataFrame:
+        # Insert a date sorted chunk into the date sorted ledger: binary search of each new row position, no full sort
+        # (new rows go after existing rows with the same date_hour, so insertion order is kept)
+        positions = np.searchsorted(self.transactions_df['date_hour'].values, new_transactions['date_hour'].values, side='right')
+        order = np.insert(np.arange(len(self.transactions_df)), positions, np.arange(len(self.transactions_df), len(self.transactions_df) + len(new_transactions)))
+        return pd.concat([self.transactions_df, new_transactions], ignore_index=True).take(order).reset_index(drop=True)
+        
+    def add_transactions(self, transactions:Union[TransactionBatch, pd.DataFrame, Iterable[Transaction]], tags_dict:Dict[str, List]=None, incremental:bool=True):
+        """
+        Add many transactions at once: rows are built as columns, then concatenated and sorted once.
+
+        Parameters:
+        - transactions (TransactionBatch, DataFrame or Iterable[Transaction]): Transactions to add (a DataFrame must hold the TransactionBatch columns).
+        - tags_dict (Dict[str, List]): Tags per ticker_symbol.
+        - incremental (bool): Merge the new (sorted) rows into the already sorted ledger instead of sorting the whole ledger again.
+        """
         validate_tags_dict(tags_dict=tags_dict)
+        if isinstance(transactions, pd.DataFrame):
+            transactions = TransactionBatch(transactions)
+        elif not isinstance(transactions, TransactionBatch):
+            transactions = list(transactions)
+            if not all(isinstance(transaction, Transaction) for transaction in transactions): raise ValueError('In add_transactions, transactions parameters should be a TransactionBatch, a DataFrame or Transaction objects.')
+            transactions = TransactionBatch.from_transactions(transactions)
+        if not len(transactions):
+            return
         
-        # Validate ticker_symbol and get long name
-        ticker_obj = Ticker(ticker_symbol=transaction.ticker_symbol)
-        # Get ticker's full name
-        if not self.ticker_full_names.get(transaction.ticker_symbol):
-            ticker_long_name = ticker_obj.name 
-            self.ticker_full_names[transaction.ticker_symbol] = ticker_long_name
+        # Build all rows at once (names, tags and currency conversions are columns)
+        ticker_names = self._get_ticker_full_names(transactions.df['ticker_symbol'].unique().tolist())
+        new_transactions = transactions.to_portfolio_frame(self.base_currency, ticker_names=ticker_names, ticker_tags=tags_dict)
+        new_transactions = new_transactions.sort_values(by='date_hour', ascending = True, kind='stable')
+        
+        self._holdings_index = None
+        if self.transactions_df.empty:
+            self.transactions_df = new_transactions.reset_index(drop=True)
+        elif incremental:
+            self.transactions_df = self._merge_sorted_transactions(new_transactions)
         else:
-            ticker_long_name = self.ticker_full_names[transaction.ticker_symbol]
-
-        # Get potential tags  
-        ticker_tags = self._get_ticker_tags(transaction.ticker_symbol, tags_dict)
-        
-        # Check if exepense currency == base currency, otherwise make conversion            
-        transact_amount_base_currency = currency_conversion(
-            amount=transaction.transaction_amount_transact_currency, 
-            date_obj=transaction.date_hour, 
-            currency=transaction.transact_currency, 
-            target_currency=self.base_currency
-        )
-        
-        # Add transaction in dataframe (convert currency + add name + add n_shares_price)
-        self.transactions_df = self.transactions_df._append({
-            'date_hour': transaction.date_hour,
-            'transaction_type': transaction.transaction_type,
-            'transaction_action': transaction.transaction_action,
-            'ticker_symbol': transaction.ticker_symbol,
-            'name': ticker_long_name,
-            'tags': ticker_tags,
-            'n_shares': transaction.n_shares, # n shares sold or bought (positive number)
-            'quantity': transaction.quantity, # actual number (negative or positive)
-            'share_price_base_currency': currency_conversion(
-                                            amount=transaction.share_price_transact_currency, 
-                                            date_obj=transaction.date_hour, 
-                                            currency=transaction.transact_currency, 
-                                            target_currency=self.base_currency
-                                        ),
-            'transact_currency': transaction.transact_currency,
-            'fee_transact_currency': transaction.fee,
-            'transact_amount_base_currency': transact_amount_base_currency if transact_amount_base_currency else transaction.transaction_amount_transact_currency
-        }, ignore_index=True)
-        
-        self.transactions_df.sort_values(by='date_hour', ascending = True, inplace = True)
+            # Concatenate and sort once
+            self.transactions_df = pd.concat([self.transactions_df, new_transactions], ignore_index=True)
+            self.transactions_df = self.transactions_df.sort_values(by='date_hour', ascending = True, kind='stable').reset_index(drop=True)
+        
+    @property
+    def holdings_index(self) -> HoldingsIndex:
+        if self._holdings_index is None:
+            self._holdings_index = HoldingsIndex(self.transactions_df)
+        return self._holdings_index
+        
+    def holdings_at(self, date, include_closed:bool=False) -> pd.DataFrame:
+        """
+        Get what was held at a date: 'quantity', 'cost' and 'cost_average' per ticker_symbol (see HoldingsIndex.holdings_at).
+        """
+        return self.holdings_index.holdings_at(date, include_closed=include_closed)
+        
+    def holdings_between(self, start, end, freq:str='D') -> pd.DataFrame:
+        """
+        Get the quantity held of each ticker at each date from start to end (see HoldingsIndex.holdings_between).
+        """
+        return self.holdings_index.holdings_between(start, end, freq=freq)
         
     def load_transactions_from_sqlite(self, table_name:str, tags_dict:Dict[str, List]=None):
 
         transactions_df = SQLiteManagment.retrieve_dataframe_from_sqlite(self.user_id, table_name)
-        
-        print(transactions_df)
-        print(transactions_df.columns)
-        
-        
-        transactions = [
-            Transaction(
-                date_hour=pd.to_datetime(row['date_hour']),
-                transaction_type=row['transaction_type'],
-                ticker_symbol=row['ticker_symbol'],
-                n_shares=row['n_shares'],
-                share_price=row['share_price'],
-                share_currency=row['share_currency'],
-                transact_currency=row['transact_currency'],
-                fee=row['fee'],
-                transaction_action=row['transaction_action']
-            )
-            for _, row in transactions_df.iterrows()
-        ]
-
-        for i, transaction in enumerate(transactions):
-            self.add_transaction(transaction, tags_dict)
-            print(f'Loaded {i+1} / {len(transactions)} transactions')
+        # Validate and convert the whole ledger as columns
+        self.add_transactions(TransactionBatch(transactions_df), tags_dict)
+        self.table_name = table_name
+        print(f'Loaded {len(transactions_df)} transactions')
 
     
     def tags_allocation(self, ticker_tags:Dict[str,Dict], alloc_tags:Dict, other_tags:Dict[str,Dict]=None):
@@ -122,48 +145,29 @@ class Portfolio:
         if not ticker_tags or not alloc_tags:
             return
         
-        cv_per_tag = {}         
-        
-        # GET CURRENT VALUES
-        total_value_pf = self.current_metrics['total_value']
-        position_values = self.current_metrics['position_values']
+        # Allocations per tag at the current date
+        main_allocations, sub_allocations = self.tags_allocation_history(ticker_tags)
+        main_allocations, sub_allocations = main_allocations.loc[self.closest_date], sub_allocations.loc[self.closest_date]
         
-        # Calculate actual allocations per tag
-        for ticker, tags in ticker_tags.items():
-            
-            for main_tag, mt_dict in tags.items():
-                
-                cv_per_tag[main_tag] = {'value': (cv_per_tag.get(main_tag, {}).get('value', 0) + mt_dict['weight'] * position_values[ticker]) / total_value_pf, 
-                                        'subtags': {}}
-
-                for subtag, weight in mt_dict['subtags'].items():
-                   cv_per_tag[main_tag]['subtags'][subtag] = (cv_per_tag.get(main_tag, {}).get('subtags', {}).get(subtag, 0) + weight * position_values[ticker]) / total_value_pf
-                    
-        
-        main_tags = list(cv_per_tag.keys())
+        main_tags = list(main_allocations.index)
         # Extracting main tags and their values
         main_tags_df = pd.DataFrame.from_dict(
             {
                 'MAIN_TAGS' : main_tags, 
-                'ALLOCATIONS': [cv_per_tag[tag]['value'] for tag in main_tags]
+                'ALLOCATIONS': main_allocations.to_list()
                 }
             ).sort_values(by='ALLOCATIONS')
         
         plot_allocations(f"main_tags_allocations", main_tags_df)
         
         # Extracting sub tags and their values
-        sub_tags_dict = {}
-        
         for main_tag in main_tags:
-            sub_tags_dict[main_tag] = {'subtags':[], 'allocations': []}
-            for sub_tag in cv_per_tag[main_tag]['subtags'].keys():
-                sub_tags_dict[main_tag]['subtags'].append(sub_tag)
-                sub_tags_dict[main_tag]['allocations'].append(cv_per_tag[main_tag]['subtags'][sub_tag])
+            main_tag_subtags = sub_allocations[sub_allocations.index.get_level_values('main_tag') == main_tag]
 
             sub_tags_df = pd.DataFrame.from_dict(
             {
-                'SUB_TAGS' : sub_tags_dict[main_tag]['subtags'], 
-                'ALLOCATIONS': sub_tags_dict[main_tag]['allocations']
+                'SUB_TAGS' : list(main_tag_subtags.index.get_level_values('subtag')), 
+                'ALLOCATIONS': main_tag_subtags.to_list()
                 }
             )
         
@@ -177,51 +181,163 @@ class Portfolio:
     
     
     
+    def tags_allocation_history(self, ticker_tags:Dict[str,Dict]):
+        """
+        Compute the allocation of each tag at every date of the computed metrics (see compute_portfolio_metrics).
+
+        Parameters:
+        - ticker_tags (Dict[str, Dict]): Tags of the tickers, see TagWeights.
+
+        Returns:
+        - Tuple[DataFrame, DataFrame]: dates x main tag and dates x (main_tag, subtag) allocations (fractions of the portfolio total value).
+        """
+        position_values = self.positions_metrics['position_values'].unstack('ticker_symbol', fill_value=0)
+        return TagWeights(ticker_tags).allocations(position_values, self.totals_metrics['total_value'])
+    
+    def tags_allocation_drift(self, ticker_tags:Dict[str,Dict], alloc_tags:Dict, threshold:float=0.05):
+        """
+        Compute the drift of the actual tag allocations from their targets at every date of the computed metrics.
+
+        Parameters:
+        - ticker_tags (Dict[str, Dict]): Tags of the tickers, see TagWeights.
+        - alloc_tags (Dict): Target allocations, see tags_allocation.
+        - threshold (float): Drift (fraction of the portfolio value) beyond which a tag is out of its target band.
+
+        Returns:
+        - Tuple[DataFrame, DataFrame, DataFrame]: dates x main tag drifts, dates x (main_tag, subtag) drifts and the threshold crossing events (see AllocationDrift.events).
+        """
+        drift_engine = AllocationDrift(alloc_tags, threshold=threshold)
+        main_drift, sub_drift = drift_engine.drift(*self.tags_allocation_history(ticker_tags))
+        return main_drift, sub_drift, drift_engine.events(main_drift, sub_drift)
+    
+    def metrics_state_key(self, today:bool, lot_method:str) -> str:
+        """
+        Get the key the metrics of this portfolio are persisted under between runs: a hash of the user, the ledger source,
+        the base currency, the lot method and today, so that no two distinct combinations share a key.
+        The ledger source is the SQLite table it was loaded from, or else the hash of its first transaction
+        (stable as transactions are added after it, edits being detected by the metrics state itself).
+        """
+        ledger_source = self.table_name
+        if ledger_source is None and not self.transactions_df.empty:
+            ledger_source = int(ledger_fingerprint(self.transactions_df.iloc[:1])[0])
+        return hashlib.sha256(repr((self.user_id, ledger_source, self.base_currency, lot_method, bool(today))).encode()).hexdigest()
+    
     def compute_portfolio_metrics(self, 
                                   #start_date:datetime=None, end_date:datetime=None, 
                                   today:bool=True, plot_current:bool=True,
-                                  ticker_tags=None, alloc_tags=None):
+                                  ticker_tags=None, alloc_tags=None, lot_method:str='fifo', incremental:bool=True, n_workers:int=None, use_cache:bool=True):
         
+        # Metrics of previous runs are reused (only dates after them or after an edited transaction are computed)
+        state_key = self.metrics_state_key(today=today, lot_method=lot_method) if incremental else None
         pf_metrics = PortfolioMetrics(self.transactions_df, self.base_currency, 
                                       #start_date=start_date, end_date=end_date, 
-                                      today=today)
+                                      today=today, lot_method=lot_method, state_key=state_key, n_workers=n_workers,
+                                      use_cache=use_cache, cache_owner=(self.user_id, self.table_name))
         
-        self.metrics = pf_metrics.compute_metrics()
+        # (date, ticker_symbol) position metrics and date indexed total metrics
+        self.positions_metrics, self.totals_metrics = pf_metrics.compute_metrics(tidy=True)
         # Identify the closest key to today's date
         today = pd.Timestamp.now()
-        self.closest_date = self.metrics.index[np.abs(self.metrics.index - today).argmin()]
-        # Access the element at column 'pl_value' for the identified closest date
-        self.current_metrics = self.metrics.loc[self.closest_date]
+        self.closest_date = self.totals_metrics.index[np.abs(self.totals_metrics.index - today).argmin()]
+        # Cross-sections at the identified closest date
+        self.current_positions = self.positions_metrics.xs(self.closest_date, level='date')
+        self.current_positions.index = self.current_positions.index.astype(str)
+        self.current_totals = self.totals_metrics.loc[self.closest_date]
+        
+        # Drift history of the tag allocations from their targets
+        if ticker_tags and alloc_tags:
+            self.tags_drift, self.subtags_drift, self.drift_events = self.tags_allocation_drift(ticker_tags, alloc_tags)
         
         
         if plot_current:
-            pf_metrics._plot_current_metrics(self.metrics)
+            pf_metrics._plot_current_metrics(self.positions_metrics, self.totals_metrics)
             self.tags_allocation(ticker_tags, alloc_tags)
             
-        return self.metrics
+        return self.positions_metrics, self.totals_metrics
 
 
-    def calculate_metrics(self, benchmark_ticker: str = '^GSPC'):
-        # This method will calculate all the requested metrics and plot them
-        # Placeholder for now; full implementation will follow with each specific calculation
-        pass
+    def _metrics_history(self):
+        # Daily metrics history up to today: the computed metrics if they are a history, not only today's metrics
+        if self.totals_metrics is not None and len(self.totals_metrics) > 1:
+            return self.positions_metrics, self.totals_metrics
+        start_date = self.transactions_df['date_hour'].min().normalize() + pd.Timedelta(days=1)
+        return PortfolioMetrics(self.transactions_df, self.base_currency, start_date=start_date, end_date=pd.Timestamp.now().normalize(),
+                                state_key=self.metrics_state_key(today=False, lot_method='fifo'),
+                                use_cache=True, cache_owner=(self.user_id, self.table_name)).compute_metrics(tidy=True)
+
+    def compute_returns(self):
+        """
+        Compute the time weighted (TWR) and money weighted (XIRR) returns of every position and of the portfolio at each date (see ReturnsEngine).
+
+        Returns:
+        - Tuple[DataFrame, DataFrame]: 'position_twr' and 'position_xirr' indexed by (date, ticker_symbol), 'total_twr' and 'total_xirr' indexed by date.
+        """
+        self.positions_returns, self.totals_returns = ReturnsEngine(*self._metrics_history()).compute()
+        return self.positions_returns, self.totals_returns
+
+    def calculate_metrics(self, benchmark_ticker: str = '^GSPC', windows:List[int]=None, risk_free_rate:float=0.0):
+        """
+        Compute the risk metrics of the portfolio daily value history against a benchmark.
+
+        Parameters:
+        - benchmark_ticker (str): Ticker of the benchmark (None for no benchmark metrics), its prices come from the local price history store.
+        - windows (List[int]): Rolling windows in business days, see RiskMetrics.rolling.
+        - risk_free_rate (float): Annual risk free rate.
+
+        Returns:
+        - Tuple[DataFrame, Series]: The rolling metrics and the metrics over the whole history (see RiskMetrics).
+        """
+        _, totals = self._metrics_history()
+        returns = flow_adjusted_returns(totals)
+        
+        benchmark_returns = None
+        if benchmark_ticker and len(returns):
+            benchmark = Ticker(benchmark_ticker)
+            # Prices as of the day before the first return too
+            dates = totals.index[totals.index.dayofweek < 5]
+            dates = dates[dates >= dates[dates < returns.index[0]].max()]
+            benchmark.sync_price_history(start=dates[0] - pd.Timedelta(days=Ticker.closing_price_lookback_days), end=dates[-1], extend_to_today=False)
+            benchmark_prices = pd.Series(benchmark.closing_prices_asof(dates, sync=False), index=dates)
+            benchmark_returns = benchmark_prices.pct_change(fill_method=None).reindex(returns.index)
+        
+        self.risk_metrics = RiskMetrics(returns, benchmark_returns, risk_free_rate=risk_free_rate)
+        self.rolling_risk_metrics = self.risk_metrics.rolling(windows)
+        self.risk_summary = self.risk_metrics.summary()
+        return self.rolling_risk_metrics, self.risk_summary
 
     def plot_metrics(self):
-        # This method will generate the required plots
-        # Placeholder for now; full implementation will follow with each specific plot
-        pass
+        # matplotlib is only imported when plotting
+        import matplotlib.pyplot as plt
+        
+        if self.rolling_risk_metrics is None:
+            self.calculate_metrics()
+        
+        metrics = list(self.rolling_risk_metrics.columns.get_level_values('metric').unique())
+        fig, axes = plt.subplots(len(metrics) + 1, 1, figsize=(25, 5 * (len(metrics) + 1)))
+        fig.set_facecolor('#f3f0ed')
+        
+        for ax, metric in zip(axes, metrics):
+            for window, values in self.rolling_risk_metrics[metric].items():
+                ax.plot(values.index, values.values, label=f'{window} days')
+            ax.set_title(f'Rolling {metric}', fontsize=20, color='black')
+            ax.grid(axis='y', color='black', linestyle='--', alpha=0.5)
+            ax.legend()
+        
+        drawdown = self.risk_metrics.drawdown()
+        axes[-1].fill_between(drawdown.index, drawdown.values, 0, color='#5e0000', alpha=0.7)
+        axes[-1].set_title(f"Drawdown (max {self.risk_summary['max_drawdown']*100:.1f}%)", fontsize=20, color='black')
+        axes[-1].grid(axis='y', color='black', linestyle='--', alpha=0.5)
+        
+        fig.subplots_adjust(hspace=0.5, top=0.95, bottom=0.05, left=0.05, right=0.95)
+        
+        # Create the directory if it does not exist
+        directory_path = Path(os.path.join(results_path, 'metrics'))
+        directory_path.mkdir(parents=True, exist_ok=True)
+        plt.savefig(directory_path / 'risk_metrics_plot.png')
+        plt.close(fig)
 
         
 if __name__ == "__main__":
-    import matplotlib
-    #%matplotlib inline
-    import quantstats as qs
-
-    # extend pandas functionality with metrics, etc.
-    qs.extend_pandas()
-    
-    
-    
     portfolio = Portfolio(user_id='Valola')
     portfolio.load_transactions_from_sqlite(table_name='Valola_cleaned_transactions')
 #
@@ -283,50 +399,22 @@ if __name__ == "__main__":
                                 },
                     }
     
-    metrics = portfolio.compute_portfolio_metrics(today=True, ticker_tags=ticker_tags, alloc_tags=alloc_tags)
+    positions_metrics, totals_metrics = portfolio.compute_portfolio_metrics(today=True, ticker_tags=ticker_tags, alloc_tags=alloc_tags)
     
 
             
 
-    print(metrics)
+    print(totals_metrics)
     
-    for i, col in enumerate(metrics.columns):
+    for col in positions_metrics.columns:
         print(col.upper())
-        
-        element = metrics.iat[0, i]
-        
-        if isinstance(element, Dict):
-            for key, value in sorted(element.items(), key=lambda x:x[1]):
-                print(f'{key} : {value}')
-        else:
-            print(element)
+        print(portfolio.current_positions[col].sort_values())
         print('\n\n\n')
     
 
-   # pf = []
-#
-   # # Get today's date normalized to midnight (00:00:00)
-   # today = pd.Timestamp.now().normalize()
-#
-   # # Filter rows where the date part of the index matches today's date
-   # metrics = metrics[metrics.index.normalize() == today]
-#
-   # print(metrics)
-#
-   # for key, value in sorted(metrics.iat[0, 7].items(), key=lambda x:x[1]):
-   #     print(f'{key.upper()} : {value}')
-   #     if key not in ['pltr', 'nvda', 'tsla', 'crwd']: continue
-   #     try:
-   #         stock = qs.utils.download_returns(key.upper())
-#
-   #         pf.append(value * stock)
-   #     except Exception as e:
-   #         print(f'COULDNT DO {key},    {e}')
-   #         continue
-
-    #pf = sum(pf)
-    ## show sharpe ratio
-    #qs.stats.sharpe(pf)
-    #pf_plot = qs.plots.snapshot(pf, title='Test Performance', show=True, savefig='pf')
-    #test = qs.reports.html(pf, "SPY", output=True)
-    #test = qs.reports.full(pf, title='Test Performance', show=True, savefig='stock1')
\ No newline at end of file
+    positions_returns, totals_returns = portfolio.compute_returns()
+    print(totals_returns.tail())
+    
+    rolling_risk_metrics, risk_summary = portfolio.calculate_metrics(benchmark_ticker='^GSPC')
+    print(risk_summary)
+    portfolio.plot_metrics()
@@ -1,42 +1,63 @@
-from typing import List, Dict, Union
+from typing import List, Tuple
 from datetime import datetime
 
 import os
 import numpy as np
 import pandas as pd
-import copy
 from pathlib import Path
 
-import matplotlib.pyplot as plt
-import matplotlib.cm as cm
-from matplotlib.patches import PathPatch
-import matplotlib.path as mpath
-import matplotlib.ticker as mtick
-
-from Invest_e_Gator.src.secondary_modules.currency_conversion import currency_conversion
 from Invest_e_Gator.src.ticker import Ticker
+from Invest_e_Gator.src.market_data_planner import MarketDataPlanner
+from Invest_e_Gator.src.metrics_engine import MetricsEngine, metrics_frame_from_tidy
+from Invest_e_Gator.src.secondary_modules.metrics_state import MetricsState, ledger_fingerprint, first_changed_row
+from Invest_e_Gator.src.secondary_modules.metrics_cache import metrics_cache
+from Invest_e_Gator.src.secondary_modules.price_history_store import price_history_store
 from Invest_e_Gator.src.constants import available_metrics, results_path
 
 class PortfolioMetrics():
-    def __init__(self, transactions_df:pd.DataFrame, base_currency:str, start_date:datetime=None, end_date:datetime=None, today:bool=False):
+    def __init__(self, transactions_df:pd.DataFrame, base_currency:str, start_date:datetime=None, end_date:datetime=None, today:bool=False, lot_method:str='fifo', state_key:str=None, n_workers:int=None,
+                 use_cache:bool=False, cache_owner:Tuple[str, str]=None):
         self.transactions_df = transactions_df
         self.base_currency = base_currency   
         self.today = today        
+        # Matching of sales with buy lots for realized gains/losses ('fifo', 'lifo' or 'average')
+        self.lot_method = lot_method
+        # Key the computed metrics are persisted under so that later runs only compute new dates (None to always compute all dates)
+        self.state_key = state_key
+        # Processes the per ticker computations are sharded across (None to compute them in this process)
+        self.n_workers = n_workers
+        # Answer identical requests from the metrics cache, entries being attached to cache_owner (user_id, table_name) for invalidation
+        self.use_cache = use_cache
+        self.cache_owner = cache_owner
         # Get days range from start to end
         self.all_dates = self._get_all_dates(start_date, end_date) if not self.today else [datetime.now()]
 
         self.df_metrics = None
+        self.positions_metrics = None
+        self.totals_metrics = None
+        self.engine = None
         
     def _get_all_dates(self, start_date:datetime, end_date:datetime):
         if start_date and end_date:
-            return pd.date_range(start_date, start_date)
+            return pd.date_range(start_date, end_date)
         else:
             # Create a date range from the first to the last transaction date
             start_d = self.transactions_df['date_hour'].min().date() + pd.Timedelta(days=1)
             end_d = self.transactions_df['date_hour'].max().date() + pd.Timedelta(days=1)
             return pd.date_range(start_d, end_d) 
         
-    def compute_metrics(self, advanced_metrics:List=None):
+    def compute_metrics(self, advanced_metrics:List=None, tidy:bool=False):
+        """
+        Compute the daily portfolio metrics.
+
+        Parameters:
+        - advanced_metrics (List): Metrics to compute among available_metrics.
+        - tidy (bool): Return (positions, totals) frames instead of one row per date with {ticker: value} dict cells:
+                       positions indexed by (date, ticker_symbol) with a column per position_* metric, totals indexed by date with a column per total_* metric.
+
+        Returns:
+        - DataFrame or Tuple[DataFrame, DataFrame]: The metrics.
+        """
                 
         # Dict metric : bool_value
         metrics_activation = {}
@@ -51,163 +72,104 @@ class PortfolioMetrics():
 
 
                 
-        self.df_metrics = self._compute_general_metrics()
+        cache_key = self._cache_key() if self.use_cache else None
+        cached = metrics_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            self.positions_metrics, self.totals_metrics = cached
+        else:
+            self.positions_metrics, self.totals_metrics = self._compute_general_metrics() if self.state_key is None else self._compute_incremental_metrics()
+            if cache_key:
+                user_id, table_name = self.cache_owner if self.cache_owner else (None, None)
+                metrics_cache.put(cache_key, self.positions_metrics, self.totals_metrics, user_id=user_id, table_name=table_name)
+        if tidy:
+            return self.positions_metrics, self.totals_metrics
+        self.df_metrics = metrics_frame_from_tidy(self.positions_metrics, self.totals_metrics)
         return self.df_metrics
         
-    def _compute_ticker_realized_loss(self, buys:pd.DataFrame, sales:pd.DataFrame):
-        
-        df_buys, df_sales = copy.deepcopy(buys), copy.deepcopy(sales)
-
-        df_buys = df_buys[df_buys['transaction_action'] == 'real']
-        df_sales = df_sales[df_sales['transaction_action'] == 'real']
+    def _cache_key(self) -> str:
+        # Prices must be up to date in the local store before its version is taken
+        self._prefetch_price_history(self.all_dates)
+        dates = pd.DatetimeIndex(self.all_dates)
+        # Metrics as of today are keyed by day
+        dates = dates.normalize() if self.today else dates
+        price_version = price_history_store.version(self.transactions_df['ticker_symbol'].unique())
+        return metrics_cache.key(self.transactions_df, self.base_currency, price_version, lot_method=self.lot_method, today=self.today,
+                                 first_date=dates.min(), last_date=dates.max(), n_dates=len(dates))
         
-        df_buys['remaining_shares'] = df_buys['n_shares']
-
-        realized_gains_losses = []
-
-        for _, sale in df_sales.iterrows():
-            shares_sold = sale['n_shares']
-            sale_price = sale['share_price_base_currency']
-
-            remaining_shares_sold = shares_sold
-
-            while remaining_shares_sold > 0 and not df_buys[df_buys['remaining_shares'] > 0].empty:
-                # Find the oldest buy with remaining quantity
-                for idx, buy in df_buys[df_buys['remaining_shares'] > 0].iterrows():
-                    shares_bought = buy['remaining_shares']
-                    buy_price = buy['share_price_base_currency']
-
-                    if remaining_shares_sold <= shares_bought:
-                        # All of the remaining sale quantity can be matched with this buy
-                        realized = (sale_price - buy_price) * remaining_shares_sold
-                        realized_gains_losses.append(realized)
-                        df_buys.at[idx, 'remaining_shares'] -= remaining_shares_sold
-                        remaining_shares_sold = 0
-                    else:
-                        # Only part of the sale quantity can be matched with this buy
-                        realized = (sale_price - buy_price) * shares_bought
-                        realized_gains_losses.append(realized)
-                        df_buys.at[idx, 'remaining_shares'] = 0
-                        remaining_shares_sold -= shares_bought
-
-        return sum(realized_gains_losses)
-
-
-    def _compute_returns(self, value, realized, invested):
-        #print(f'({value} + {realized} - {invested}) / {invested} = {(value + realized - invested) / invested}')
-        return (value + realized - invested) / invested
+    def _prefetch_price_history(self, dates):
+        # Fetch once, before computing metrics, the price history window each ticker was held in over the metrics date range
+        MarketDataPlanner(self.transactions_df, start_date=min(dates), end_date=max(dates)).prefetch()
             
     def _compute_general_metrics(self):
-        # Initialize a dict to store daily metrics
-        daily_metrics = {}
+        # Fetch all needed price data at once
+        self._prefetch_price_history(self.all_dates)
+        # All dates computed in one pass over date x ticker matrices
+        self.engine = MetricsEngine(self.transactions_df, self.base_currency, self.all_dates, today=self.today, lot_method=self.lot_method, n_workers=self.n_workers)
+        return self.engine.to_positions_frame(), self.engine.to_totals_frame()
+
+    def _compute_incremental_metrics(self):
+        """
+        Compute only the dates that were not computed by the last run under self.state_key (or that follow the earliest transaction
+        changed since), reuse the others, then persist the new state.
+        """
+        metrics_state = MetricsState(self.state_key)
+        state = metrics_state.load()
+        transactions = self.transactions_df.sort_values(by='date_hour', kind='stable').reset_index(drop=True)
+        fingerprint = ledger_fingerprint(transactions)
+        all_dates = pd.DatetimeIndex(self.all_dates)
+        kept_dates = all_dates[:0]
         
-        # Iterate over each date
-        for selected_date in self.all_dates:
-            # Filter out transaction after selected_date
-            selected_transactions = self.transactions_df[self.transactions_df['date_hour'] <= selected_date]
-            # Initialize dictionaries to store daily metrics
-            position_held = {}                  # n financial object helg (exemple: n of shares held)
-            position_values = {}                # Daily ticker position value
-            position_total_invested = {}        # Daily ticker position invested
-            position_realizeds_losses = {}      # Daily ticker realized gains/losses
-            position_cost_average = {}          # Daily ticker cost average per share
-            position_pl = {}                    # Daily position P/L
-            position_ratio_invested = {}        # Daily ticker invested relative to total amount invested
-            position_ratio_pf_value = {}        # Daily ticker position value relative to total pf value
-
-            total_value = 0
-            total_invested = 0
-            total_realized = 0
-            
-            # Calculate total value and individual stock metrics
-            for ticker in selected_transactions['ticker'].unique():
-                # Get transactions corresponding to ticker
-                ticker_transactions = selected_transactions[selected_transactions['ticker'] == ticker]
-                # Get buys and sales transactions
-                buys = ticker_transactions[ticker_transactions['transaction_type'] == 'buy']
-                sales = ticker_transactions[ticker_transactions['transaction_type'] == 'sale']
-                
-                # Total share held at day
-                quantity = ticker_transactions['quantity'].sum()
-                # Total amount investment at day
-                total_cost_base_currency = ticker_transactions['transact_amount_base_currency'].sum()
-                # Create Ticker object
-                ticker_obj = Ticker(ticker)
-                
-                # Total invested (check if real transaction)
-                invested = ticker_transactions[ticker_transactions['transaction_action'] == 'real']['transact_amount_base_currency'].sum()
-                #invested = ticker_transactions['transact_amount_base_currency'].sum()
-                # Cost average per share
-                cost_average = total_cost_base_currency / quantity if quantity else 0
-                # Calculate realized gains/losses
-                realized = self._compute_ticker_realized_loss(buys, sales)
-                # Get day value in base currency
-                
-                try:
-                    day_value_base_currency = currency_conversion(
-                        amount=ticker_obj.get_closing_price(selected_date), 
-                        date_obj=selected_date, 
-                        currency=ticker_obj.currency.lower(), 
-                        target_currency=self.base_currency,
-                        today=self.today
-                    )
-                    # Calculate day position value
-                    position_value_base_currency = quantity * day_value_base_currency
-                except Exception as e:
-                    print(e)
-                    print(f'{ticker} might have been delisted.')
-                    position_value_base_currency = 0
-                
-                
-                # Update dictionnaries
-                position_held[ticker] = quantity
-                position_values[ticker] = position_value_base_currency
-                position_total_invested[ticker] = invested
-                position_cost_average[ticker] = cost_average
-                position_realizeds_losses[ticker] = realized
-                # Update total_value, total_invested and total_realized
-                total_value += position_value_base_currency
-                total_invested += invested
-                total_realized += realized
-
-            # Calculate percentage portfolio value and percentage invested
-            for ticker in position_values:
-                #print(f'\n{ticker}')
-                position_ratio_pf_value[ticker] = position_values[ticker] / total_value if total_value != 0 else 0
-                position_ratio_invested[ticker] = position_total_invested[ticker] / total_invested if total_invested != 0 else 0
-                position_pl[ticker] = self._compute_returns(position_values[ticker], position_realizeds_losses[ticker], position_total_invested[ticker])
-
-
-            daily_metrics[selected_date] = {
-                'position_held': position_held, 
-                'position_values': position_values, 
-                'position_invested': position_total_invested,
-                'position_cost_average': position_cost_average, 
-                'position_realized_gains_losses': position_realizeds_losses, 
-                'position_pl': position_pl,
-                'position_ratio_invested': position_ratio_invested, 
-                'position_ratio_pf_value': position_ratio_pf_value, 
-                'total_value': total_value,
-                'total_invested': total_invested, 
-                'total_realized': total_realized,
-                'total_pl': self._compute_returns(total_value, total_realized, total_invested)
-                }
-            
+        if state is not None:
+            changed_row = first_changed_row(state['fingerprint'], fingerprint)
+            # Earliest date the ledger changed at, the last computed date being computed again (its prices may have been updated since)
+            changed_dates = [dates[changed_row] for dates in (state['dates'], transactions['date_hour'].to_numpy()) if changed_row < len(dates)]
+            first_date = min(changed_dates + list(state['totals'].index[-1:]))
+            kept_dates = all_dates[all_dates.isin(state['totals'].index) & (all_dates < first_date)]
         
-        df = pd.DataFrame.from_dict(daily_metrics, orient='index')
-        # Convert index to DateTimeIndex (if not already)
-        df.index = pd.to_datetime(df.index)
-        return df
-
-    def _plot_current_metrics(self, metrics: pd.DataFrame):
-        def get_current_metrics_as_series(df):
-            df.index = pd.to_datetime(df.index)
-            today = datetime.now()
-            df['diff'] = np.abs(df.index - today)
-            closest_date_index = df['diff'].idxmin()
-            df = df.drop(columns=['diff'])
-            closest_row = df.loc[closest_date_index]
-            return closest_row
+        dates_to_compute = all_dates[~all_dates.isin(kept_dates)]
+        self.engine = MetricsEngine(transactions, self.base_currency, dates_to_compute, today=self.today, lot_method=self.lot_method,
+                                    ticker_currencies=state['ticker_currencies'] if state is not None else None, n_workers=self.n_workers)
+        if state is not None and changed_row == len(state['fingerprint']):
+            # Only new transactions: the lots resume from the last run
+            self.engine.lot_engine.restore(state['realized'], state['lots'])
+            self.engine.lot_start_row = changed_row
+        if len(dates_to_compute):
+            self._prefetch_price_history(dates_to_compute)
+        
+        positions, totals = self.engine.to_positions_frame(), self.engine.to_totals_frame()
+        if len(kept_dates):
+            positions = pd.concat([state['positions'][state['positions'].index.get_level_values('date').isin(kept_dates)], positions])
+            # Tickers traded since the last run extend the categories
+            positions.index = pd.MultiIndex.from_arrays([positions.index.get_level_values('date'), 
+                                                         pd.Categorical(positions.index.get_level_values('ticker_symbol').astype(str), categories=self.engine.tickers)],
+                                                        names=['date', 'ticker_symbol'])
+            totals = pd.concat([state['totals'].loc[kept_dates], totals]).rename_axis('date')
+        print(f'Computed metrics of {len(dates_to_compute)} dates ({len(kept_dates)} reused)')
+        
+        metrics_state.save({
+            'fingerprint': fingerprint,
+            'dates': transactions['date_hour'].to_numpy(),
+            'realized': self.engine.lot_engine.realized,
+            'lots': self.engine.lot_engine.lots,
+            'positions': positions,
+            'totals': totals,
+            'ticker_currencies': self.engine.ticker_currencies,
+        })
+        return positions, totals
+
+    def _plot_current_metrics(self, positions: pd.DataFrame, totals: pd.DataFrame):
+        # matplotlib is only imported when plotting
+        import matplotlib.pyplot as plt
+        from matplotlib.patches import PathPatch
+        import matplotlib.path as mpath
+        import matplotlib.ticker as mtick
+        
+        def get_current_metrics(positions, totals):
+            # Cross-section of the date closest to now
+            closest_date = totals.index[np.abs(totals.index - datetime.now()).argmin()]
+            current_positions = positions.xs(closest_date, level='date')
+            current_positions.index = current_positions.index.astype(str)
+            return current_positions, totals.loc[closest_date]
 
         def create_gradient_bar(ax, x, y, width, height, cmap, norm):
             verts = [(x, 0), (x, height), (x + width, height), (x + width, 0), (x, 0)]
@@ -219,7 +181,7 @@ class PortfolioMetrics():
             ax.imshow(np.atleast_2d(gradient).T, extent=(x, x + width, 0, height), origin='lower', aspect='auto', cmap=cmap)
 
         def bar_plot(ax, title, keys, values):
-            cmap = cm.get_cmap('viridis')
+            cmap = plt.get_cmap('viridis')
             norm = plt.Normalize(min(values), max(values))
             for i, key in enumerate(keys):
                 create_gradient_bar(ax, i - 0.4, 0, 0.8, values[i], cmap, norm)
@@ -294,7 +256,7 @@ class PortfolioMetrics():
 
 
 
-        metrics = get_current_metrics_as_series(metrics)
+        current_positions, current_totals = get_current_metrics(positions, totals)
         fig, axes = plt.subplots(7, 1, figsize=(25, 35))
         
         fig.set_facecolor('#f3f0ed')
@@ -312,42 +274,27 @@ class PortfolioMetrics():
             'total_pl': [axes[6], 'Portfolio P/L', text_plot],
         }
 
-        single_text_plot = ['total_value', 'total_invested', 'total_realized', 'total_pl']
         to_text_plot = {}
 
-        for metric in metrics.index:
-            if metric not in plot_instructions.keys():
-                continue
-            # Get metric value
-            metric_value = metrics.at[metric]
-            
-            # If value is dict, sort it
-            if isinstance(metric_value, Dict):
-                metric_value = dict(sorted(metric_value.items(), key=lambda x: x[1]))
+        for metric, (ax, title, plot_function) in plot_instructions.items():
+            # Totals are just text to plot, save the metric value for now
+            if metric in current_totals.index:
+                to_text_plot[title] = current_totals[metric]
                 
-            # If metric is average cost per share: sort dict based on metric position_values
-            if metric == 'position_cost_average':
-                sorting = dict(sorted(metrics.at['position_values'].items(), key=lambda x: x[1]))
-                metric_value = dict(sorted(metric_value.items(), key=lambda item: sorting[item[0]]))
+            # If metric is average cost per share: sort based on metric position_values
+            elif metric == 'position_cost_average':
+                order = current_positions['position_values'].sort_values(kind='stable').index
+                metric_value = current_positions.loc[order, metric]
                 # Get positions current prices to plot them to compare with the average cost per share
-                current_prices = {ticker: Ticker(ticker).get_closing_price(datetime.now()) for ticker in list(metric_value.keys())}
-                current_prices = {key: (value if value is not None else 0) for key, value in current_prices.items()}
-                current_prices = dict(sorted(current_prices.items(), key=lambda item: sorting[item[0]]))
+                latest_closes = Ticker.bulk_history(list(order), start=datetime.now() - pd.Timedelta(days=Ticker.closing_price_lookback_days)).iloc[-1]
+                current_prices = latest_closes.reindex(order).fillna(0)
                 # Make stacked plot
-                stacked_bars_plot(plot_instructions[metric][0], plot_instructions[metric][1], list(metric_value.keys()), list(metric_value.values()), list(current_prices.values()))
-                
-            # If its just text to plot, save the metric value for now
-            elif metric in single_text_plot:
-                to_text_plot[plot_instructions[metric][1]] = metric_value
+                stacked_bars_plot(ax, title, list(order), metric_value.tolist(), current_prices.tolist())
                 
-            # Else plot following plot_instructions
-            else:
-                plot_instructions[metric][2](
-                    ax=plot_instructions[metric][0],
-                    title=plot_instructions[metric][1],
-                    keys=list(metric_value.keys()),
-                    values=list(metric_value.values())
-                )
+            # Else plot the metric sorted by value following plot_instructions
+            elif metric in current_positions.columns:
+                metric_value = current_positions[metric].sort_values(kind='stable')
+                plot_function(ax=ax, title=title, keys=list(metric_value.index), values=metric_value.tolist())
                 
         # Plot the text metrics at the end
         text_plot(axes[6], to_text_plot)
@@ -366,6 +313,8 @@ class PortfolioMetrics():
 
 
 def plot_allocations(title, m_tags_df, tag_col_name='MAIN_TAGS', alloc_col_name='ALLOCATIONS'):
+    # matplotlib is only imported when plotting
+    import matplotlib.pyplot as plt
     
     
     # Get key properties for colours and labels
@@ -1,4 +1,5 @@
 from typing import List, Dict 
+from datetime import datetime, timedelta
 import pandas as pd
 import copy
 
@@ -79,7 +80,14 @@ class PurchaseOptimizer():
         #self._validate_tickers_exist_and_gather_yf_objects(ticker_list_priority)
         
     def get_current_prices(self):
-        return {ticker:Ticker(ticker).current_price for ticker in self.ticker_priority_order}
+        # Live quotes (yfinance info 'currentPrice', cached config['yfinance_INFO_TTL_SECONDS']['price'] seconds)
+        prices = {ticker:Ticker(ticker).current_price for ticker in self.ticker_priority_order}
+        # Tickers without a live quote get their last close, fetched through multi-ticker requests
+        missing = [ticker for ticker, price in prices.items() if not price]
+        if missing:
+            latest_closes = Ticker.bulk_history(missing, start=datetime.now() - timedelta(days=Ticker.closing_price_lookback_days)).iloc[-1]
+            prices.update({ticker:latest_closes[ticker] for ticker in missing})
+        return prices
     
 
     ##########             ##########
@@ -0,0 +1,228 @@
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# Bracket of the solved log(1 + rate): rates from -99.9999% to about 5e8 (annualized)
+xirr_log_bounds = (np.log(1e-6), 20.0)
+# Points of the bracket searched for sign changes when its bounds have the same sign:
+# coarse over the whole bracket and fine over the usual rates (about -63% to +172%), where close roots come in pairs
+xirr_grid = np.unique(np.concatenate([np.linspace(*xirr_log_bounds, 65), np.linspace(-1, 1, 201)]))
+# Bisection steps locating an NPV extremum between two grid points
+xirr_extremum_iterations = 60
+
+
+def _grid_brackets(npv, rows:np.ndarray):
+    """
+    Bracket a root of each series on xirr_grid, keeping the root closest to a 0% rate.
+
+    Grid intervals where the NPV changes sign hold a root. Intervals where it doesn't but its derivative does hold an
+    extremum, located by bisection: if the NPV changes sign there, the interval holds two roots closer than the grid step.
+
+    Returns:
+    - Tuple[np.ndarray, ...]: Positions in rows of the series with a root, with the (lo, hi) bracket and the NPV sign at lo.
+    """
+    points = [npv(rows, np.full(len(rows), point)) for point in xirr_grid]
+    signs = np.sign(np.column_stack([value for value, _ in points]))
+    derivative_signs = np.sign(np.column_stack([derivative for _, derivative in points]))
+
+    # Candidate brackets: (position in rows, lo, hi, sign at lo)
+    positions, grid_index = np.nonzero(signs[:, :-1] * signs[:, 1:] < 0)
+    candidates = [(positions, xirr_grid[grid_index], xirr_grid[grid_index + 1], signs[positions, grid_index])]
+    positions, grid_index = np.nonzero((signs[:, :-1] == signs[:, 1:]) & (signs[:, :-1] != 0) & (derivative_signs[:, :-1] * derivative_signs[:, 1:] < 0))
+    if len(positions):
+        lo, hi, sign_lo = xirr_grid[grid_index], xirr_grid[grid_index + 1], derivative_signs[positions, grid_index]
+        for _ in range(xirr_extremum_iterations):
+            middle = (lo + hi) / 2
+            before = np.sign(npv(rows[positions], middle)[1]) == sign_lo
+            lo, hi = np.where(before, middle, lo), np.where(before, hi, middle)
+        extremum = (lo + hi) / 2
+        extremum_signs = np.sign(npv(rows[positions], extremum)[0])
+        crossing = extremum_signs * signs[positions, grid_index] < 0
+        positions, grid_index, extremum, extremum_signs = positions[crossing], grid_index[crossing], extremum[crossing], extremum_signs[crossing]
+        candidates.append((positions, xirr_grid[grid_index], extremum, signs[positions, grid_index]))
+        candidates.append((positions, extremum, xirr_grid[grid_index + 1], extremum_signs))
+
+    positions, lo, hi, sign_lo = (np.concatenate(arrays) for arrays in zip(*candidates))
+    # First candidate of each series once sorted by distance to a 0% rate
+    order = np.lexsort((np.abs(lo + hi), positions))
+    found, first = np.unique(positions[order], return_index=True)
+    closest = order[first]
+    return found, lo[closest], hi[closest], sign_lo[closest]
+
+
+def xirr(amounts:np.ndarray, years:np.ndarray, tolerance:float=1e-10, max_iterations:int=100) -> np.ndarray:
+    """
+    Solve the internal rate of return of many cash flow series at once: the annual rate r such that sum(amount / (1 + r) ** years) = 0.
+
+    Newton steps on x = log(1 + r) are safeguarded by a bracket kept per series (bisection whenever a step leaves it),
+    and converged series drop out of the following iterations.
+
+    Parameters:
+    - amounts (np.ndarray): series x flows amounts (negative when money is put in, positive when taken out, 0 for padding).
+    - years (np.ndarray): series x flows times in years from any origin (the rate doesn't depend on it).
+
+    Returns:
+    - np.ndarray: One annual rate per series (the root closest to 0% if there are several), NaN if the flows have no root in the bracket (e.g. flows all of the same sign).
+    """
+    amounts, years = np.atleast_2d(np.asarray(amounts, dtype='float64')), np.atleast_2d(np.asarray(years, dtype='float64'))
+
+    def npv(rows, x):
+        discount = np.exp(np.clip(-years[rows] * x[:, None], -700, 700))
+        flows = amounts[rows] * discount
+        return flows.sum(axis=1), -(flows * years[rows]).sum(axis=1)
+
+    n_series = len(amounts)
+    all_rows = np.arange(n_series)
+    lo, hi = np.full(n_series, xirr_log_bounds[0]), np.full(n_series, xirr_log_bounds[1])
+    sign_lo, sign_hi = np.sign(npv(all_rows, lo)[0]), np.sign(npv(all_rows, hi)[0])
+    solved = sign_lo * sign_hi < 0
+    # Flows changing sign more than once can have an even number of roots in the bracket:
+    # look for them on a grid and keep the one closest to a 0% rate
+    unbracketed = np.flatnonzero(~solved & np.any(amounts != 0, axis=1))
+    if len(unbracketed):
+        found, found_lo, found_hi, found_sign = _grid_brackets(npv, unbracketed)
+        rows = unbracketed[found]
+        lo[rows], hi[rows], sign_lo[rows] = found_lo, found_hi, found_sign
+        solved[rows] = True
+    # Start from the simple return annualized over the money weighted holding time
+    paid_in, paid_out = np.maximum(-amounts, 0), np.maximum(amounts, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        held_years = (paid_out * years).sum(axis=1) / paid_out.sum(axis=1) - (paid_in * years).sum(axis=1) / paid_in.sum(axis=1)
+        x = np.log(paid_out.sum(axis=1) / paid_in.sum(axis=1)) / held_years
+    x = np.where(np.isfinite(x), np.clip(x, lo, hi), 0)
+
+    active = np.flatnonzero(solved)
+    for _ in range(max_iterations):
+        if not len(active):
+            break
+        value, derivative = npv(active, x[active])
+        # Shrink the bracket around the root
+        below = np.sign(value) == sign_lo[active]
+        lo[active] = np.where(below, x[active], lo[active])
+        hi[active] = np.where(below, hi[active], x[active])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = x[active] - value / derivative
+        in_bracket = np.isfinite(newton) & (newton > lo[active]) & (newton < hi[active])
+        step = np.where(in_bracket, newton, (lo[active] + hi[active]) / 2)
+        converged = (np.abs(step - x[active]) < tolerance) | (value == 0)
+        x[active] = np.where(value == 0, x[active], step)
+        active = active[~converged]
+
+    return np.where(solved, np.expm1(x), np.nan)
+
+
+def _sub_period_returns(values:np.ndarray, invested:np.ndarray) -> np.ndarray:
+    # Daily returns net of the money put in (at the start of the day) or taken out (at the end of the day)
+    previous = np.vstack([np.zeros((1,) + values.shape[1:]), values[:-1]])
+    flows = np.diff(invested, axis=0, prepend=np.zeros((1,) + invested.shape[1:]))
+    base = previous + np.maximum(flows, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(base > 0, (values - previous - flows) / base, 0)
+
+
+class ReturnsEngine():
+    '''
+    Time weighted (TWR) and money weighted (MWR, XIRR) returns of every position and of the portfolio, as of each date,
+    from the metrics computed by PortfolioMetrics.compute_metrics(tidy=True).
+
+    Cash flows are the daily changes of the amount invested (real buys and sales), dated on the metrics date they count from.
+    - TWR chain-links the daily returns net of flows, so it measures the investments regardless of when money was put in.
+    - XIRR is the annual rate discounting every flow up to a date and the value at that date to 0, so it weighs returns by the money at stake.
+      All (date, position) series are solved together in a few batched calls of xirr.
+    '''
+    def __init__(self, positions:pd.DataFrame, totals:pd.DataFrame, max_batch_cells:int=4_000_000):
+        self.dates = totals.index
+        # dates x ticker_symbol matrices (NaN before a ticker is traded)
+        self.position_values = positions['position_values'].unstack('ticker_symbol').reindex(self.dates)
+        self.position_invested = positions['position_invested'].unstack('ticker_symbol').reindex(self.dates)
+        self.position_values.columns = self.position_values.columns.astype(str)
+        self.position_invested.columns = self.position_invested.columns.astype(str)
+        self.totals = totals
+        # Max series x flows cells solved per xirr call (bounds memory)
+        self.max_batch_cells = max_batch_cells
+
+    def _matrices(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Positions then portfolio columns: values, invested and traded mask
+        values = np.column_stack([self.position_values.to_numpy(dtype='float64'), self.totals['total_value'].to_numpy(dtype='float64')])
+        invested = np.column_stack([self.position_invested.to_numpy(dtype='float64'), self.totals['total_invested'].to_numpy(dtype='float64')])
+        traded = ~np.isnan(invested)
+        return np.nan_to_num(values), np.nan_to_num(invested), traded
+
+    def _to_frames(self, matrix:np.ndarray, traded:np.ndarray) -> Tuple[pd.DataFrame, pd.Series]:
+        matrix = np.where(traded, matrix, np.nan)
+        return (pd.DataFrame(matrix[:, :-1], index=self.dates, columns=self.position_values.columns),
+                pd.Series(matrix[:, -1], index=self.dates))
+
+    def time_weighted(self) -> Tuple[pd.DataFrame, pd.Series]:
+        """
+        Compute the cumulative time weighted returns.
+
+        Returns:
+        - Tuple[DataFrame, Series]: dates x ticker_symbol and portfolio TWR since the first transaction.
+        """
+        values, invested, traded = self._matrices()
+        twr = np.cumprod(1 + _sub_period_returns(values, invested), axis=0) - 1
+        return self._to_frames(twr, traded)
+
+    def money_weighted(self) -> Tuple[pd.DataFrame, pd.Series]:
+        """
+        Compute the money weighted returns (XIRR, annualized) as of each date.
+
+        Returns:
+        - Tuple[DataFrame, Series]: dates x ticker_symbol and portfolio XIRR (NaN where undefined, e.g. on the first day of a position).
+        """
+        values, invested, traded = self._matrices()
+        # Money put in is a negative flow for the investor
+        flows = -np.diff(invested, axis=0, prepend=np.zeros((1, invested.shape[1])))
+        years = (self.dates.values - self.dates.values[0]) / np.timedelta64(1, 'D') / 365.25
+
+        # Each column's flow dates: a series (date, column) holds the column's flows up to that date, then the value at that date
+        flow_rows = [np.flatnonzero(flows[:, column]) for column in range(flows.shape[1])]
+        series_rows, series_columns = np.nonzero(traded)
+        n_flows = np.zeros(len(series_rows), dtype='int64')
+        for column in range(flows.shape[1]):
+            in_column = series_columns == column
+            n_flows[in_column] = np.searchsorted(flow_rows[column], series_rows[in_column], side='right')
+        # Series solved by batches of similar numbers of flows, so that padding stays small
+        order = np.argsort(n_flows, kind='stable')
+        series_rows, series_columns, n_flows = series_rows[order], series_columns[order], n_flows[order]
+
+        rates = np.full(values.shape, np.nan)
+        start = 0
+        while start < len(series_rows):
+            # Largest batch fitting in max_batch_cells at the width of its last (largest) series
+            cells = np.arange(1, len(series_rows) - start + 1) * (n_flows[start:] + 1)
+            stop = start + max(1, int(np.searchsorted(cells, self.max_batch_cells, side='right')))
+            rows, columns, counts = series_rows[start:stop], series_columns[start:stop], n_flows[start:stop]
+            width = counts[-1] + 1
+            amounts, times = np.zeros((len(rows), width)), np.zeros((len(rows), width))
+            for column in np.unique(columns):
+                in_column = np.flatnonzero(columns == column)
+                column_flow_rows = flow_rows[column][:width - 1]
+                kept = np.arange(len(column_flow_rows))[None, :] < counts[in_column, None]
+                amounts[in_column, :len(column_flow_rows)] = np.where(kept, flows[column_flow_rows, column], 0)
+                times[in_column, :len(column_flow_rows)] = years[column_flow_rows]
+            amounts[:, -1] = values[rows, columns]
+            times[:, -1] = years[rows]
+            rates[rows, columns] = xirr(amounts, times)
+            start = stop
+        return self._to_frames(rates, traded)
+
+    def compute(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Compute TWR and XIRR in the tidy metrics layout.
+
+        Returns:
+        - Tuple[DataFrame, DataFrame]: 'position_twr' and 'position_xirr' indexed by (date, ticker_symbol) traded cells,
+                                       'total_twr' and 'total_xirr' indexed by date.
+        """
+        position_twr, total_twr = self.time_weighted()
+        position_xirr, total_xirr = self.money_weighted()
+        # Traded cells, ordered by date then ticker as the metrics positions
+        rows, columns = np.nonzero(~np.isnan(position_twr.to_numpy()))
+        index = pd.MultiIndex.from_arrays([self.dates[rows], pd.Categorical.from_codes(columns, categories=position_twr.columns)], names=['date', 'ticker_symbol'])
+        positions = pd.DataFrame({'position_twr': position_twr.to_numpy()[rows, columns], 'position_xirr': position_xirr.to_numpy()[rows, columns]}, index=index)
+        totals = pd.DataFrame({'total_twr': total_twr, 'total_xirr': total_xirr}, index=self.dates)
+        return positions, totals
@@ -0,0 +1,146 @@
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+
+def flow_adjusted_returns(totals:pd.DataFrame, business_days:bool=True) -> pd.Series:
+    """
+    Compute the daily returns of the portfolio value, net of the money put in or taken out (buys and sales change
+    total_invested as much as total_value, so they are not returns).
+
+    Parameters:
+    - totals (DataFrame): Date indexed 'total_value' and 'total_invested' (see PortfolioMetrics.compute_metrics(tidy=True)).
+    - business_days (bool): Keep business days only (prices don't move on weekends, which would dilute volatility).
+
+    Returns:
+    - Series: Date indexed returns (the first date, and dates without portfolio value, are dropped).
+    """
+    totals = totals[totals.index.dayofweek < 5] if business_days else totals
+    value = totals['total_value'].to_numpy(dtype='float64')
+    flows = np.diff(totals['total_invested'].to_numpy(dtype='float64'))
+    previous_value = value[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = (value[1:] - previous_value - flows) / previous_value
+    returns = pd.Series(returns, index=totals.index[1:], name='returns')
+    return returns[previous_value > 0]
+
+def _rolling_sums(values:np.ndarray, window:int) -> np.ndarray:
+    # Sum over the trailing window of each row in O(n) through cumulative sums (NaN until a full window is available)
+    cumulative = np.concatenate([np.zeros((1,) + values.shape[1:]), np.cumsum(values, axis=0)])
+    sums = np.full(values.shape, np.nan)
+    if window <= len(values):
+        sums[window - 1:] = cumulative[window:] - cumulative[:-window]
+    return sums
+
+
+class RiskMetrics():
+    '''
+    Risk metrics of a daily returns series, optionally against a benchmark returns series.
+
+    Rolling metrics come from cumulative sums of the returns (and of their squares and cross products) computed once,
+    each window then being a difference of shifted cumulative sums, so any number of windows is O(n) each.
+    Returns are centered on their mean before being summed so that variances don't lose precision.
+    '''
+    def __init__(self, returns:pd.Series, benchmark_returns:pd.Series=None, risk_free_rate:float=0.0, periods_per_year:int=252):
+        self.returns = returns.dropna()
+        self.benchmark_returns = benchmark_returns.reindex(self.returns.index).fillna(0) if benchmark_returns is not None else None
+        # Annual risk free rate, and number of returns per year to annualize
+        self.risk_free_rate = risk_free_rate
+        self.periods_per_year = periods_per_year
+
+    @property
+    def period_risk_free_rate(self) -> float:
+        return self.risk_free_rate / self.periods_per_year
+
+    @staticmethod
+    def _centered(values:np.ndarray):
+        mean = np.nanmean(values, axis=0) if len(values) else 0
+        return values - mean, mean
+
+    def rolling(self, windows:List[int]=None) -> pd.DataFrame:
+        """
+        Compute the rolling metrics over each window.
+
+        Parameters:
+        - windows (List[int]): Window lengths (in returns), about a month, a quarter and a year of business days by default.
+
+        Returns:
+        - DataFrame: Date indexed, (metric, window) columns with metrics 'volatility', 'sharpe', 'sortino' (annualized)
+                     and 'beta', 'alpha' (annualized), 'correlation' if there is a benchmark. NaN until a window is full.
+        """
+        windows = windows if windows else [21, 63, 252]
+        returns = self.returns.to_numpy(dtype='float64')
+        centered, mean = self._centered(returns)
+        excess = returns - self.period_risk_free_rate
+        downside = np.minimum(excess, 0) ** 2
+        sums = {'returns': centered, 'squares': centered ** 2, 'downside': downside}
+        if self.benchmark_returns is not None:
+            benchmark = self.benchmark_returns.to_numpy(dtype='float64')
+            benchmark_centered, benchmark_mean = self._centered(benchmark)
+            sums.update({'benchmark': benchmark_centered, 'benchmark_squares': benchmark_centered ** 2, 'cross': centered * benchmark_centered})
+        # All the series are summed together as one n x series array
+        names = list(sums)
+        values = np.column_stack([sums[name] for name in names])
+
+        metrics = {}
+        annualize = np.sqrt(self.periods_per_year)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for window in windows:
+                window_sums = dict(zip(names, _rolling_sums(values, window).T))
+                window_mean = window_sums['returns'] / window
+                variance = np.maximum(window_sums['squares'] - window * window_mean ** 2, 0) / (window - 1)
+                mean_excess = window_mean + mean - self.period_risk_free_rate
+                metrics[('volatility', window)] = np.sqrt(variance) * annualize
+                metrics[('sharpe', window)] = mean_excess / np.sqrt(variance) * annualize
+                metrics[('sortino', window)] = mean_excess / np.sqrt(window_sums['downside'] / window) * annualize
+                if self.benchmark_returns is not None:
+                    benchmark_window_mean = window_sums['benchmark'] / window
+                    benchmark_variance = np.maximum(window_sums['benchmark_squares'] - window * benchmark_window_mean ** 2, 0) / (window - 1)
+                    covariance = (window_sums['cross'] - window * window_mean * benchmark_window_mean) / (window - 1)
+                    beta = covariance / benchmark_variance
+                    metrics[('beta', window)] = beta
+                    metrics[('alpha', window)] = (mean_excess - beta * (benchmark_window_mean + benchmark_mean - self.period_risk_free_rate)) * self.periods_per_year
+                    metrics[('correlation', window)] = covariance / np.sqrt(variance * benchmark_variance)
+
+        rolling = pd.DataFrame(metrics, index=self.returns.index)
+        rolling.columns = rolling.columns.set_names(['metric', 'window'])
+        # Flat windows (no variance) have no ratio
+        return rolling.replace([np.inf, -np.inf], np.nan)
+
+    def rolling_correlations(self, returns_frame:pd.DataFrame, window:int=63) -> pd.DataFrame:
+        """
+        Compute the rolling correlation of the portfolio returns with each column of a returns frame (e.g. per ticker returns), all columns at once.
+
+        Returns:
+        - DataFrame: Date indexed, one column per returns_frame column.
+        """
+        returns_frame = returns_frame.reindex(self.returns.index).fillna(0)
+        x, _ = self._centered(self.returns.to_numpy(dtype='float64')[:, None])
+        y, _ = self._centered(returns_frame.to_numpy(dtype='float64'))
+        sum_x, sum_xx = _rolling_sums(x, window), _rolling_sums(x ** 2, window)
+        sum_y, sum_yy, sum_xy = _rolling_sums(y, window), _rolling_sums(y ** 2, window), _rolling_sums(x * y, window)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            covariance = sum_xy - sum_x * sum_y / window
+            correlation = covariance / np.sqrt(np.maximum(sum_xx - sum_x ** 2 / window, 0) * np.maximum(sum_yy - sum_y ** 2 / window, 0))
+        return pd.DataFrame(correlation, index=returns_frame.index, columns=returns_frame.columns).replace([np.inf, -np.inf], np.nan)
+
+    def drawdown(self) -> pd.Series:
+        """
+        Get the drawdown at each date (loss from the highest past value of the compounded returns, 0 at a new high).
+        """
+        wealth = np.cumprod(1 + self.returns.to_numpy(dtype='float64'))
+        return pd.Series(wealth / np.maximum.accumulate(np.maximum(wealth, 1)) - 1, index=self.returns.index, name='drawdown')
+
+    def summary(self) -> pd.Series:
+        """
+        Compute the metrics over the whole returns series.
+
+        Returns:
+        - Series: 'annual_return', 'volatility', 'sharpe', 'sortino', 'max_drawdown' and 'beta', 'alpha', 'correlation' if there is a benchmark.
+        """
+        full_window = self.rolling([len(self.returns)]).iloc[-1] if len(self.returns) > 1 else pd.Series(dtype='float64')
+        summary = {'annual_return': np.prod(1 + self.returns.to_numpy(dtype='float64')) ** (self.periods_per_year / max(len(self.returns), 1)) - 1}
+        summary.update({metric: value for (metric, _), value in full_window.items()})
+        summary['max_drawdown'] = self.drawdown().min() if len(self.returns) else np.nan
+        return pd.Series(summary, dtype='float64')
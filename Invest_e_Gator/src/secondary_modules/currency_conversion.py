@@ -1,25 +1,333 @@
-from forex_python.converter import CurrencyRates, RatesNotAvailableError
-from currency_converter import CurrencyConverter
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Union
+from collections import OrderedDict
+from contextlib import contextmanager
 
-forex_python = CurrencyRates()
-currency_convert = CurrencyConverter(fallback_on_missing_rate=True)
+import numpy as np
+import pandas as pd
 
-def currency_conversion(amount, currency, target_currency, date_obj, today:bool=False):
-    if amount is None:
-        return None 
-    
-    if currency.lower() == target_currency.lower():
-        return amount
-    
+from Invest_e_Gator.src.secondary_modules.yfinance_cache import get_config
+from Invest_e_Gator.src.constants import available_currencies, fx_rate_cache_path
+
+# Providers are created on first use: CurrencyConverter parses the whole ECB history file
+_forex_python = None
+_currency_convert = None
+
+
+def get_forex_python():
+    global _forex_python
+    if _forex_python is None:
+        from forex_python.converter import CurrencyRates
+        _forex_python = CurrencyRates()
+    return _forex_python
+
+
+def get_currency_converter():
+    global _currency_convert
+    if _currency_convert is None:
+        from currency_converter import CurrencyConverter
+        _currency_convert = CurrencyConverter(fallback_on_missing_rate=True)
+    return _currency_convert
+
+
+def _to_datetime64_days(dates) -> np.ndarray:
+    # Normalize date-like scalars/arrays to a datetime64[D] array (tz-aware dates taken at their local wall time)
+    dates = pd.DatetimeIndex(pd.to_datetime(np.atleast_1d(dates), format='mixed'))
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    return dates.values.astype('datetime64[D]')
+
+
+class FxRateMatrix():
+    '''
+    (date x currency) matrix of ECB reference rates (units of currency per 1 EUR) loaded once from currency_converter's
+    local ECB history, so that whole columns of amounts are converted with indexed numpy operations.
+
+    Dates are looked up as-of (last ECB business day before or on the date) within the ECB file bounds.
+    '''
+    def __init__(self, converter=None, currencies:List[str]=available_currencies):
+        self.converter = converter
+        self.currencies = [currency.lower() for currency in currencies]
+        self.dates = None
+        self.rates = None
+        self._currency_index = pd.Index(self.currencies)
+
+    def load(self):
+        # Build the matrix on first use (parsing the ECB history is not free)
+        if self.rates is not None:
+            return
+        ecb_rates = (self.converter if self.converter else get_currency_converter())._rates
+        frame = pd.DataFrame({currency: pd.Series(ecb_rates[currency.upper()], dtype='float64')
+                              for currency in self.currencies if currency.upper() in ecb_rates})
+        frame.index = pd.to_datetime(frame.index)
+        # Fill the ECB holidays only: a discontinued currency has no rate after its last quote (the fallback providers are used)
+        frame = frame.sort_index().ffill(limit_area='inside').reindex(columns=self.currencies)
+        # ECB rates are quoted against the euro
+        frame['eur'] = 1.0
+        self.dates = frame.index.values.astype('datetime64[D]')
+        self.rates = frame.to_numpy(dtype='float64')
+
+    def covers(self, dates) -> np.ndarray:
+        """
+        Check which dates are within the ECB history bounds (dates after the last ECB rate need another provider).
+        """
+        self.load()
+        dates = _to_datetime64_days(dates)
+        return (dates >= self.dates[0]) & (dates <= self.dates[-1])
+
+    def _rows(self, dates) -> np.ndarray:
+        # As-of row of every date, -1 if before the first ECB rate
+        return np.searchsorted(self.dates, _to_datetime64_days(dates), side='right') - 1
+
+    def convert(self, amounts, currencies, target_currencies, dates) -> np.ndarray:
+        """
+        Convert a column of amounts to target currencies.
+
+        Parameters:
+        - amounts (array-like): Amounts to convert.
+        - currencies (str or array-like): Currency of each amount (or one currency for all of them).
+        - target_currencies (str or array-like): Currency to convert each amount to (or one currency for all of them).
+        - dates (date-like or array-like): Date of each amount (or one date for all of them).
+
+        Returns:
+        - np.ndarray: Converted amounts, NaN where no rate is known.
+        """
+        self.load()
+        amounts = np.atleast_1d(np.asarray(amounts, dtype='float64'))
+        currencies = np.broadcast_to(np.char.lower(np.asarray(currencies, dtype=str)), amounts.shape)
+        target_currencies = np.broadcast_to(np.char.lower(np.asarray(target_currencies, dtype=str)), amounts.shape)
+        rows = np.broadcast_to(self._rows(dates), amounts.shape)
+        from_columns = self._currency_index.get_indexer(currencies.ravel()).reshape(amounts.shape)
+        to_columns = self._currency_index.get_indexer(target_currencies.ravel()).reshape(amounts.shape)
+
+        valid = (rows >= 0) & (from_columns >= 0) & (to_columns >= 0)
+        safe_rows = np.where(valid, rows, 0)
+        safe_from_columns, safe_to_columns = np.where(valid, from_columns, 0), np.where(valid, to_columns, 0)
+        # Cross rate through the euro: (target per EUR) / (currency per EUR)
+        converted = amounts * self.rates[safe_rows, safe_to_columns] / self.rates[safe_rows, safe_from_columns]
+        converted = np.where(valid, converted, np.nan)
+        # Same currency amounts are returned untouched
+        return np.where(currencies == target_currencies, amounts, converted)
+
+
+fx_rate_matrix = FxRateMatrix()
+
+
+class FxRateCache():
+    '''
+    Cache of historical FX rates keyed by (currency, target_currency, business date):
+    an in-memory LRU layer (config['FX_RATE_CACHE_MAX_SIZE'] entries) on top of an SQLite table,
+    so that each historical rate is fetched once per deployment. Hits and misses are counted.
+
+    Rates the providers don't have are cached too (as NaN, NULL in SQLite) so that they are not fetched again either.
+    '''
+    def __init__(self, database_path:str=fx_rate_cache_path, max_size:int=None):
+        self.database_path = database_path
+        self._max_size = max_size
+        self._rates = OrderedDict()
+        self._lock = threading.Lock()
+        self._table_created = False
+        self.hits = 0
+        self.misses = 0
+
+    @contextmanager
+    def get_db_connection(self):
+        """Get a connection to the SQLite cache and close it when context ends."""
+        os.makedirs(os.path.dirname(self.database_path), exist_ok=True)
+        conn = sqlite3.connect(self.database_path)
+        try:
+            if not self._table_created:
+                conn.execute("""CREATE TABLE IF NOT EXISTS fx_rates (
+                                    currency TEXT, target_currency TEXT, business_date TEXT, rate REAL,
+                                    PRIMARY KEY (currency, target_currency, business_date))""")
+                self._table_created = True
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size if self._max_size else get_config()['FX_RATE_CACHE_MAX_SIZE']
+
+    @staticmethod
+    def business_date(date_obj) -> str:
+        # Rates are published on business days: weekends resolve to the previous friday
+        return str(np.busday_offset(_to_datetime64_days(date_obj)[0], 0, roll='backward'))
+
+    def _remember(self, key, rate):
+        with self._lock:
+            self._rates[key] = rate
+            self._rates.move_to_end(key)
+            if len(self._rates) > self.max_size:
+                self._rates.popitem(last=False)
+
+    def get(self, currency:str, target_currency:str, date_obj) -> Union[float, None]:
+        """
+        Get a cached rate: None if it is not cached, NaN if it is cached as missing.
+        """
+        key = (currency.lower(), target_currency.lower(), self.business_date(date_obj))
+        with self._lock:
+            rate = self._rates.get(key)
+            if rate is not None:
+                self._rates.move_to_end(key)
+                self.hits += 1
+                return rate
+        with self.get_db_connection() as conn:
+            row = conn.execute("SELECT rate FROM fx_rates WHERE currency = ? AND target_currency = ? AND business_date = ?", key).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        rate = row[0] if row[0] is not None else np.nan
+        self._remember(key, rate)
+        return rate
+
+    def put(self, currency:str, target_currency:str, date_obj, rate:float):
+        self.put_many(currency, {target_currency: rate}, date_obj)
+
+    def put_many(self, currency:str, rates:Dict[str, float], date_obj):
+        # Store the rates from one currency to several target currencies at once (None or NaN caching a missing rate)
+        business_date = self.business_date(date_obj)
+        keys_rates = [((currency.lower(), target_currency.lower(), business_date), np.nan if rate is None else rate) for target_currency, rate in rates.items()]
+        with self.get_db_connection() as conn:
+            conn.executemany("INSERT OR REPLACE INTO fx_rates VALUES (?, ?, ?, ?)", [key + (None if np.isnan(rate) else rate,) for key, rate in keys_rates])
+        for key, rate in keys_rates:
+            self._remember(key, rate)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'in_memory': len(self._rates)}
+
+
+fx_rate_cache = FxRateCache()
+
+
+# All rates are triangulated through the currency ECB publishes its reference rates against
+pivot_currency = 'eur'
+# Latest pivot rates fetched by this process, per day
+_latest_pivot_rates = {}
+
+
+def _fetch_pivot_rates(date_obj, today:bool=False) -> Dict[str, float]:
+    # One provider call returns the rates of every currency against the pivot currency
     try:
-        # Get rate for the date or last rate available if today = True
-        rate = forex_python.get_rate(currency, target_currency, date_obj) if not today else forex_python.get_rate(currency, target_currency)
-        return amount * rate
+        rates = get_forex_python().get_rates(pivot_currency.upper(), date_obj) if not today else get_forex_python().get_rates(pivot_currency.upper())
+        rates = {currency.lower(): rate for currency, rate in rates.items() if currency.lower() in available_currencies}
     except Exception as e:
+        print(f"Error fetching {pivot_currency.upper()} rates with forex_python, falling back to currency_converter.\nforex_python error: {e}\n")
+        rates = {}
+    rates[pivot_currency] = 1.0
 
+    # Currencies forex_python didn't provide are completed with currency_converter
+    for currency in available_currencies:
+        if currency in rates:
+            continue
         try:
-            # Get converted amount for the date or compute with last rate available if today = True
             # currency_converter need currency in uppercase
-            return currency_convert.convert(amount, currency.upper(), target_currency.upper(), date_obj) if not today else currency_convert.convert(amount, currency.upper(), target_currency.upper())
-        except Exception as ex:
-            print(f"Error fetching currency conversion rate with forex_python nor currency_converter.\nforex_python error: {e}\ncurrency_converter error: {ex}\n")
+            rates[currency] = get_currency_converter().convert(1, pivot_currency.upper(), currency.upper(), date_obj) if not today else get_currency_converter().convert(1, pivot_currency.upper(), currency.upper())
+        except Exception:
+            pass
+    return rates
+
+
+def get_pivot_rates(date_obj, today:bool=False) -> Dict[str, float]:
+    """
+    Get the rates of every currency in available_currencies against the pivot currency at date_obj (latest rates if today=True).
+    Historical rates are fetched once per business date and then served from the FX rate cache,
+    including the currencies the providers don't have (left out of the returned rates).
+    """
+    if today:
+        today_key = str(datetime.now().date())
+        if today_key not in _latest_pivot_rates:
+            _latest_pivot_rates.clear()
+            _latest_pivot_rates[today_key] = _fetch_pivot_rates(None, today=True)
+        return _latest_pivot_rates[today_key]
+
+    business_date = pd.Timestamp(fx_rate_cache.business_date(date_obj)).to_pydatetime()
+    cached = {currency: fx_rate_cache.get(pivot_currency, currency, business_date) for currency in available_currencies if currency != pivot_currency}
+    if all(rate is not None for rate in cached.values()):
+        return {pivot_currency: 1.0, **{currency: rate for currency, rate in cached.items() if not np.isnan(rate)}}
+
+    rates = _fetch_pivot_rates(business_date)
+    # Only rates of past days are final, missing ones too if the providers answered (not if they were unreachable)
+    if business_date.date() < datetime.now().date():
+        missing = {currency: None for currency in cached if currency not in rates} if len(rates) > 1 else {}
+        fx_rate_cache.put_many(pivot_currency, {**rates, **missing}, business_date)
+    return rates
+
+
+def _get_pivot_rate(currency, date_obj, today:bool=False):
+    if currency == pivot_currency:
+        return 1.0
+    rate = fx_rate_cache.get(pivot_currency, currency, date_obj) if not today else None
+    if rate is None:
+        rate = get_pivot_rates(date_obj, today=today).get(currency)
+    # Cached as missing
+    return None if rate is None or np.isnan(rate) else rate
+
+
+def get_rate(currency, target_currency, date_obj, today:bool=False):
+    """
+    Get the rate converting currency to target_currency at date_obj (latest rate if today=True),
+    as the cross rate of both currencies against the pivot currency (two cached lookups).
+    """
+    rate_currency = _get_pivot_rate(currency.lower(), date_obj, today=today)
+    rate_target_currency = _get_pivot_rate(target_currency.lower(), date_obj, today=today)
+    if rate_currency is None or rate_target_currency is None:
+        print(f"Error fetching currency conversion rate from {currency} to {target_currency} on {date_obj} with forex_python nor currency_converter.")
+        return None
+    return rate_target_currency / rate_currency
+
+
+def currency_conversion(amount, currency, target_currency, date_obj, today:bool=False):
+    if amount is None:
+        return None
+
+    if currency.lower() == target_currency.lower():
+        return amount
+
+    # Historical rates are read from the local ECB rate matrix
+    if not today and {currency.lower(), target_currency.lower()} <= set(fx_rate_matrix.currencies) and fx_rate_matrix.covers(date_obj)[0]:
+        converted = fx_rate_matrix.convert(amount, currency, target_currency, date_obj)[0]
+        if not np.isnan(converted):
+            return converted
+
+    rate = get_rate(currency, target_currency, date_obj, today=today)
+    return amount * rate if rate is not None else None
+
+
+def currency_conversion_column(amounts, currencies, target_currencies, dates, today:bool=False) -> np.ndarray:
+    """
+    Convert a column of amounts to target currencies (one for all amounts or one per amount).
+    Amounts dated within the local ECB history are converted at once through the rate matrix,
+    the others (e.g. after the last ECB rate or today=True) fall back to get_rate once per (currency, target currency, date).
+
+    Returns:
+    - np.ndarray: Converted amounts (NaN where no rate could be found).
+    """
+    amounts = np.atleast_1d(np.asarray(amounts, dtype='float64'))
+    currencies = np.broadcast_to(np.char.lower(np.asarray(currencies, dtype=str)), amounts.shape)
+    target_currencies = np.broadcast_to(np.char.lower(np.asarray(target_currencies, dtype=str)), amounts.shape)
+    dates = np.broadcast_to(_to_datetime64_days(dates), amounts.shape)
+
+    if today:
+        # Latest rates, whatever the dates
+        dates = np.broadcast_to(np.datetime64('today', 'D'), amounts.shape)
+        converted = np.where(currencies == target_currencies, amounts, np.nan)
+    else:
+        converted = fx_rate_matrix.convert(amounts, currencies, target_currencies, dates)
+        # Dates after the last ECB rate need another provider
+        converted = np.where(fx_rate_matrix.covers(dates) | (currencies == target_currencies), converted, np.nan)
+    remaining = np.isnan(converted) & ~np.isnan(amounts)
+
+    # Fallback: one rate request per distinct (currency, target currency, date)
+    for currency, target_currency, date in set(zip(currencies[remaining], target_currencies[remaining], dates[remaining])):
+        rate = get_rate(currency, target_currency, pd.Timestamp(date).to_pydatetime(), today=today)
+        rows = remaining & (currencies == currency) & (target_currencies == target_currency) & (dates == date)
+        converted[rows] = amounts[rows] * (rate if rate is not None else np.nan)
+    return converted
@@ -0,0 +1,88 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, Union
+from contextlib import contextmanager
+
+from Invest_e_Gator.src.secondary_modules.yfinance_cache import get_config
+from Invest_e_Gator.src.constants import info_cache_path, yfinance_info_field_groups
+
+
+class InfoCache():
+    '''
+    Snapshots of yfinance.Ticker.info persisted in SQLite, split by field group (static, price, default),
+    each group expiring after its own time to live (config['yfinance_INFO_TTL_SECONDS']).
+    '''
+    def __init__(self, database_path:str=info_cache_path, ttls:Dict[str, float]=None):
+        self.database_path = database_path
+        self._ttls = ttls
+        # info key -> field group
+        self._key_groups = {key: group for group, keys in yfinance_info_field_groups.items() for key in keys}
+        # In-memory layer: (symbol, group) -> (fetched_at, snapshot)
+        self._snapshots = {}
+        self._lock = threading.Lock()
+        self._table_created = False
+
+    @contextmanager
+    def get_db_connection(self):
+        """Get a connection to the SQLite cache and close it when context ends."""
+        os.makedirs(os.path.dirname(self.database_path), exist_ok=True)
+        conn = sqlite3.connect(self.database_path)
+        try:
+            if not self._table_created:
+                conn.execute("""CREATE TABLE IF NOT EXISTS info_snapshots (
+                                    symbol TEXT, field_group TEXT, fetched_at REAL, snapshot TEXT,
+                                    PRIMARY KEY (symbol, field_group))""")
+                self._table_created = True
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    @property
+    def ttls(self) -> Dict[str, float]:
+        return self._ttls if self._ttls else get_config()['yfinance_INFO_TTL_SECONDS']
+
+    def field_group(self, info_key:str) -> str:
+        return self._key_groups.get(info_key, 'default')
+
+    def _is_fresh(self, group:str, fetched_at:float) -> bool:
+        return time.time() - fetched_at <= self.ttls.get(group, self.ttls['default'])
+
+    def get(self, symbol:str, group:str) -> Union[dict, None]:
+        """
+        Get the cached snapshot of a field group for a ticker, None if missing or expired.
+        """
+        key = (symbol.upper(), group)
+        with self._lock:
+            cached = self._snapshots.get(key)
+        if cached is None:
+            with self.get_db_connection() as conn:
+                row = conn.execute("SELECT fetched_at, snapshot FROM info_snapshots WHERE symbol = ? AND field_group = ?", key).fetchone()
+            if row is None:
+                return None
+            cached = (row[0], json.loads(row[1]))
+            with self._lock:
+                self._snapshots[key] = cached
+        return cached[1] if self._is_fresh(group, cached[0]) else None
+
+    def put(self, symbol:str, info:dict):
+        """
+        Store a freshly fetched info dict, split by field group.
+        """
+        fetched_at = time.time()
+        snapshots = {group: {} for group in list(yfinance_info_field_groups.keys()) + ['default']}
+        for info_key, value in info.items():
+            snapshots[self.field_group(info_key)][info_key] = value
+
+        rows = [(symbol.upper(), group, fetched_at, json.dumps(snapshot, default=str)) for group, snapshot in snapshots.items()]
+        with self.get_db_connection() as conn:
+            conn.executemany("INSERT OR REPLACE INTO info_snapshots VALUES (?, ?, ?, ?)", rows)
+        with self._lock:
+            for group, snapshot in snapshots.items():
+                self._snapshots[(symbol.upper(), group)] = (fetched_at, snapshot)
+
+
+info_cache = InfoCache()
@@ -0,0 +1,98 @@
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+from typing import Tuple, Union
+from contextlib import contextmanager
+
+import pandas as pd
+
+from Invest_e_Gator.src.constants import metrics_cache_path
+from Invest_e_Gator.src.secondary_modules.metrics_state import ledger_fingerprint
+
+
+class MetricsCache():
+    '''
+    Computed metrics frames persisted in SQLite, content addressed: the key is a hash of the ledger, the base currency,
+    the price data version and the computation parameters, so an identical request is answered without computing anything
+    and any change to its inputs misses the cache.
+
+    Entries also record the (user_id, table_name) they were computed for, so that rewriting a ledger table purges them.
+    '''
+    def __init__(self, database_path:str=metrics_cache_path):
+        self.database_path = database_path
+        self._table_created = False
+
+    @contextmanager
+    def get_db_connection(self):
+        """Get a connection to the SQLite cache and close it when context ends."""
+        os.makedirs(os.path.dirname(self.database_path), exist_ok=True)
+        conn = sqlite3.connect(self.database_path)
+        try:
+            if not self._table_created:
+                conn.execute("""CREATE TABLE IF NOT EXISTS metrics_cache (
+                                    key TEXT PRIMARY KEY, user_id TEXT, table_name TEXT, created_at REAL,
+                                    positions BLOB, totals BLOB)""")
+                self._table_created = True
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def key(transactions_df:pd.DataFrame, base_currency:str, price_version:str, **params) -> str:
+        """
+        Compute the cache key of a metrics computation.
+
+        Parameters:
+        - transactions_df (DataFrame): The ledger (hashed row by row once date sorted, see ledger_fingerprint).
+        - base_currency (str): Currency of the metrics.
+        - price_version (str): Version of the price data used (see PriceHistoryStore.version).
+        - params: Any other parameter the metrics depend on (dates, lot method...).
+
+        Returns:
+        - str: Hex digest.
+        """
+        digest = hashlib.sha256()
+        digest.update(ledger_fingerprint(transactions_df.sort_values(by='date_hour', kind='stable')).tobytes())
+        digest.update(f'{base_currency.lower()}|{price_version}'.encode())
+        for name in sorted(params):
+            digest.update(f'|{name}={params[name]}'.encode())
+        return digest.hexdigest()
+
+    def get(self, key:str) -> Union[Tuple[pd.DataFrame, pd.DataFrame], None]:
+        """
+        Get the (positions, totals) metrics stored under a key, None if missing.
+        """
+        with self.get_db_connection() as conn:
+            row = conn.execute("SELECT positions, totals FROM metrics_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        try:
+            return pickle.loads(row[0]), pickle.loads(row[1])
+        except Exception as e:
+            # An entry that can't be read is recomputed
+            print(f'Could not load cached metrics {key}: {e}')
+            return None
+
+    def put(self, key:str, positions:pd.DataFrame, totals:pd.DataFrame, user_id:str=None, table_name:str=None):
+        with self.get_db_connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO metrics_cache VALUES (?, ?, ?, ?, ?, ?)",
+                         (key, user_id, table_name, time.time(),
+                          pickle.dumps(positions, protocol=pickle.HIGHEST_PROTOCOL), pickle.dumps(totals, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    def invalidate(self, user_id:str, table_name:str=None) -> int:
+        """
+        Delete the entries computed from a user's ledger table (all of the user's tables if table_name is None).
+
+        Returns:
+        - int: Number of deleted entries.
+        """
+        with self.get_db_connection() as conn:
+            if table_name is None:
+                return conn.execute("DELETE FROM metrics_cache WHERE user_id = ?", (user_id,)).rowcount
+            return conn.execute("DELETE FROM metrics_cache WHERE user_id = ? AND table_name = ?", (user_id, table_name)).rowcount
+
+
+metrics_cache = MetricsCache()
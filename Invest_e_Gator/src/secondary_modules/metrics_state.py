@@ -0,0 +1,81 @@
+import os
+import re
+import pickle
+import tempfile
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+from Invest_e_Gator.src.constants import metrics_state_path
+
+
+# Ledger columns the metrics depend on
+fingerprint_columns = ['date_hour', 'transaction_type', 'transaction_action', 'ticker_symbol', 'n_shares', 'quantity',
+                       'share_price_base_currency', 'transact_amount_base_currency']
+
+
+def ledger_fingerprint(transactions_df:pd.DataFrame) -> np.ndarray:
+    """
+    Hash each row of a (date sorted) ledger on the columns the metrics depend on.
+
+    Returns:
+    - np.ndarray: One uint64 hash per row.
+    """
+    return pd.util.hash_pandas_object(transactions_df[fingerprint_columns], index=False).to_numpy()
+
+def first_changed_row(previous_fingerprint:np.ndarray, fingerprint:np.ndarray) -> int:
+    """
+    Get the first row from which two ledger fingerprints differ (the length of the shortest one if one extends the other).
+    """
+    n_rows = min(len(previous_fingerprint), len(fingerprint))
+    changed = np.flatnonzero(previous_fingerprint[:n_rows] != fingerprint[:n_rows])
+    return int(changed[0]) if len(changed) else n_rows
+
+
+class MetricsState():
+    '''
+    Last computed metrics of a ledger persisted on disk (one pickle file per key), so that a later run only computes
+    the dates after it, or the dates from the earliest changed transaction if the ledger was edited.
+
+    The state is a dict holding:
+    - 'fingerprint' (np.ndarray) and 'dates' (np.ndarray): Row hashes and date_hour of the sorted ledger it was computed from.
+    - 'realized' (np.ndarray) and 'lots' (dict): LotEngine state after the last ledger row.
+    - 'positions' and 'totals' (DataFrame): Metrics computed so far (see MetricsEngine.to_positions_frame / to_totals_frame).
+    - 'ticker_currencies' (dict): Currency of each ticker.
+    '''
+    def __init__(self, key:str, state_path:str=metrics_state_path):
+        self.key = key
+        self.state_path = state_path
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.state_path, f"{re.sub(r'[^A-Za-z0-9._-]', '_', self.key)}.pkl")
+
+    def load(self) -> Union[dict, None]:
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'rb') as state_file:
+                return pickle.load(state_file)
+        except Exception as e:
+            # A state that can't be read is recomputed
+            print(f'Could not load metrics state {self.path}: {e}')
+            return None
+
+    def save(self, state:dict):
+        os.makedirs(self.state_path, exist_ok=True)
+        # Write to a temporary file first so that a crash never leaves a truncated state behind
+        # (a unique one per writer so that concurrent saves of a key never write the same file)
+        tmp_fd, tmp_path = tempfile.mkstemp(dir=self.state_path, prefix=os.path.basename(self.path), suffix='.tmp')
+        try:
+            with os.fdopen(tmp_fd, 'wb') as tmp_file:
+                pickle.dump(state, tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,233 @@
+import os
+import re
+import json
+import hashlib
+from typing import Callable, List, Tuple, Union
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from Invest_e_Gator.src.constants import price_history_path
+
+
+ohlcv_columns = ['Open', 'High', 'Low', 'Close', 'Volume']
+# One record per daily bar, stored as a structured .npy file so it can be memory-mapped
+bars_dtype = np.dtype([('Date', 'datetime64[ns]')] + [(column, 'float64') for column in ohlcv_columns])
+
+
+def _to_day(date) -> Union[pd.Timestamp, None]:
+    # Normalize any date-like input to a tz-naive midnight timestamp (None means unbounded)
+    if date is None:
+        return None
+    date = pd.Timestamp(date)
+    if date.tzinfo is not None:
+        date = date.tz_localize(None)
+    return date.normalize()
+
+
+class PriceHistoryStore():
+    '''
+    Persistent on-disk store of daily OHLCV bars.
+
+    Each ticker owns two files in store_path:
+    - <SYMBOL>.npy: sorted structured array of daily bars (memory-mapped when read).
+    - <SYMBOL>.json: the date range already fetched ({'start': 'YYYY-MM-DD' or None for the whole history, 'end': 'YYYY-MM-DD'}).
+
+    Bars are indexed by the exchange local trading day (tz-naive), so a bar dated D is the close of day D.
+    Only the ranges that are not covered yet are fetched, all other lookups are answered locally.
+    '''
+    def __init__(self, store_path:str=price_history_path, mmap_mode:Union[str, None]='r'):
+        self.store_path = store_path
+        self.mmap_mode = mmap_mode
+        # In-process caches: symbol key -> bars array / history DataFrame / (index, closes) arrays / coverage dict
+        self._bars = {}
+        self._frames = {}
+        self._closes = {}
+        self._coverage = {}
+
+    ### Paths and keys
+
+    def _symbol_key(self, symbol:str) -> str:
+        # yfinance symbols are case insensitive, keep file names filesystem safe
+        return re.sub(r'[^A-Z0-9.^=-]', '_', symbol.upper())
+
+    def _bars_path(self, symbol:str) -> str:
+        return os.path.join(self.store_path, f'{self._symbol_key(symbol)}.npy')
+
+    def _coverage_path(self, symbol:str) -> str:
+        return os.path.join(self.store_path, f'{self._symbol_key(symbol)}.json')
+
+    ### Read
+
+    def get_bars(self, symbol:str) -> np.ndarray:
+        key = self._symbol_key(symbol)
+        if key not in self._bars:
+            path = self._bars_path(symbol)
+            self._bars[key] = np.load(path, mmap_mode=self.mmap_mode) if os.path.exists(path) else np.empty(0, dtype=bars_dtype)
+        return self._bars[key]
+
+    def get_close_arrays(self, symbol:str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the sorted trading days (datetime64[ns]) and closing prices of a ticker as contiguous arrays, cached until the next update.
+        """
+        key = self._symbol_key(symbol)
+        if key not in self._closes:
+            bars = self.get_bars(symbol)
+            self._closes[key] = (np.ascontiguousarray(bars['Date']), np.ascontiguousarray(bars['Close']))
+        return self._closes[key]
+
+    def get_coverage(self, symbol:str) -> Union[dict, None]:
+        key = self._symbol_key(symbol)
+        if key not in self._coverage:
+            path = self._coverage_path(symbol)
+            if not os.path.exists(path):
+                return None
+            with open(path, 'r') as coverage_file:
+                self._coverage[key] = json.load(coverage_file)
+        return self._coverage[key]
+
+    def history(self, symbol:str, start=None, end=None) -> pd.DataFrame:
+        """
+        Get stored daily bars of a ticker between start and end (both included, None meaning unbounded).
+
+        Returns:
+        - DataFrame: OHLCV columns indexed by trading day.
+        """
+        key = self._symbol_key(symbol)
+        if key not in self._frames:
+            bars = self.get_bars(symbol)
+            self._frames[key] = pd.DataFrame({column: np.asarray(bars[column]) for column in ohlcv_columns},
+                                             index=pd.DatetimeIndex(np.asarray(bars['Date']), name='Date'))
+        return self._frames[key].loc[_to_day(start):_to_day(end)]
+
+    def version(self, symbols:List[str]) -> str:
+        """
+        Get a token that changes whenever the stored bars of any of the symbols change (file size and modification time).
+        """
+        stamps = []
+        for symbol in sorted(set(self._symbol_key(symbol) for symbol in symbols)):
+            path = os.path.join(self.store_path, f'{symbol}.npy')
+            stat = os.stat(path) if os.path.exists(path) else None
+            stamps.append(f'{symbol}:{stat.st_size}:{stat.st_mtime_ns}' if stat else f'{symbol}:-')
+        return hashlib.sha256('|'.join(stamps).encode()).hexdigest()
+
+    ### Coverage
+
+    def missing_ranges(self, symbol:str, start=None, end=None, extend_to_today:bool=True) -> List[Tuple]:
+        """
+        Compute the date ranges that must be fetched so that [start, end] is covered.
+
+        Parameters:
+        - start: First day needed (None means the whole history).
+        - end: Last day needed (None means today).
+        - extend_to_today (bool): Fetch a missing tail up to today rather than only up to end, so later days are covered too.
+
+        Returns:
+        - List[Tuple]: (start, end) ranges to fetch, start being None for the whole history.
+        """
+        today = _to_day(datetime.now())
+        start = _to_day(start)
+        end = today if end is None else min(_to_day(end), today)
+        tail_end = today if extend_to_today else end
+
+        coverage = self.get_coverage(symbol)
+        if coverage is None:
+            return [(start, tail_end)]
+
+        ranges = []
+        covered_start = _to_day(coverage['start'])
+        covered_end = _to_day(coverage['end'])
+        # Missing head
+        if covered_start is not None and (start is None or start < covered_start):
+            ranges.append((start, covered_start - pd.Timedelta(days=1)))
+        # Missing tail: restart from the last stored bar since it may have been fetched intraday
+        if end > covered_end:
+            bars = self.get_bars(symbol)
+            last_bar = _to_day(bars['Date'][-1]) if len(bars) else covered_end
+            ranges.append((min(last_bar, covered_end), tail_end))
+        return ranges
+
+    ### Write
+
+    def _frame_to_bars(self, df:pd.DataFrame) -> np.ndarray:
+        bars = np.empty(len(df), dtype=bars_dtype)
+        if df.empty:
+            return bars
+        index = pd.DatetimeIndex(df.index)
+        if index.tz is not None:
+            # Keep the exchange local trading day
+            index = index.tz_localize(None)
+        bars['Date'] = index.normalize().values
+        for column in ohlcv_columns:
+            bars[column] = df[column].to_numpy(dtype='float64') if column in df.columns else np.nan
+        return bars
+
+    def update(self, symbol:str, df:pd.DataFrame, start=None, end=None):
+        """
+        Merge freshly fetched bars covering [start, end] into the store (fetched bars replace stored ones on that range).
+
+        Parameters:
+        - df (DataFrame or None): Fetched bars. None if the download failed: the store is left untouched so that the range is fetched again.
+                                  An empty frame (no trading day in the range, e.g. a weekend, before the listing or after a delisting) still covers the range.
+        """
+        if df is None:
+            return
+        start, end = _to_day(start), _to_day(end)
+        new_bars = self._frame_to_bars(df)
+        merged = np.asarray(self.get_bars(symbol))
+
+        if len(new_bars):
+            # Drop stored bars overlapping the fetched range, then merge
+            overlap = (merged['Date'] <= np.datetime64(end)) if end is not None else np.ones(len(merged), dtype=bool)
+            if start is not None:
+                overlap &= merged['Date'] >= np.datetime64(start)
+            merged = np.concatenate([merged[~overlap], new_bars])
+            merged = merged[np.argsort(merged['Date'], kind='stable')]
+            # Keep the freshest bar if a day appears twice
+            keep = np.ones(len(merged), dtype=bool)
+            keep[:-1] = merged['Date'][1:] != merged['Date'][:-1]
+            merged = merged[keep]
+
+        coverage = self.get_coverage(symbol)
+        if coverage is None:
+            coverage = {'start': None if start is None else str(start.date()), 'end': str(end.date())}
+        else:
+            covered_start = _to_day(coverage['start'])
+            coverage = {
+                'start': None if start is None or covered_start is None else str(min(start, covered_start).date()),
+                'end': str(max(end, _to_day(coverage['end'])).date())
+                }
+        self._save(symbol, merged, coverage)
+
+    def _save(self, symbol:str, bars:np.ndarray, coverage:dict):
+        key = self._symbol_key(symbol)
+        os.makedirs(self.store_path, exist_ok=True)
+        # Release cached (memory-mapped) views before replacing the files
+        self._bars.pop(key, None)
+        self._frames.pop(key, None)
+        self._closes.pop(key, None)
+        # Write to a temporary file first so that a crash never leaves a truncated history behind
+        tmp_path = self._bars_path(symbol) + '.tmp'
+        with open(tmp_path, 'wb') as tmp_file:
+            np.save(tmp_file, bars)
+        os.replace(tmp_path, self._bars_path(symbol))
+        with open(self._coverage_path(symbol), 'w') as coverage_file:
+            json.dump(coverage, coverage_file)
+        self._coverage[key] = coverage
+
+    def sync(self, symbol:str, fetch:Callable, start=None, end=None, extend_to_today:bool=True):
+        """
+        Make sure [start, end] is covered in the store, fetching only the missing ranges.
+
+        Parameters:
+        - symbol (str): Ticker symbol.
+        - fetch (Callable): fetch(start, end) -> OHLCV DataFrame of daily bars between start and end (both included, start None meaning the whole history),
+                            None if the download failed.
+        - start, end, extend_to_today: See missing_ranges.
+        """
+        for range_start, range_end in self.missing_ranges(symbol, start=start, end=end, extend_to_today=extend_to_today):
+            self.update(symbol, fetch(range_start, range_end), start=range_start, end=range_end)
+
+
+price_history_store = PriceHistoryStore()
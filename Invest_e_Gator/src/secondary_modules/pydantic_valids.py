@@ -1,6 +1,8 @@
 from typing import Union, Any, Literal, Dict, List
 from datetime import datetime
 import re
+import numpy as np
+import pandas as pd
 from pydantic import BaseModel, field_validator, ValidationInfo, ValidationError
 
 from Invest_e_Gator.src.constants import available_currencies, yfinance_history_interval_period_choices
@@ -9,16 +11,16 @@ from Invest_e_Gator.src.constants import available_currencies, yfinance_history_
 
 
 def _verify_date_str_format(field_name, value, regex_pattern:str, common_date_format:str, datetime_format, return_as_datetime=False):
-    # Check if the date_str matches the pattern
+    # Check if the date_str matches the pattern (re caches compiled patterns)
     if not re.match(regex_pattern, value):
         raise ValueError(f"Input {field_name} -- {value} -- should follow the {common_date_format}.")
     # Try to parse the date_str to a datetime object to check if it is a valid date
     try:
-        datetime.strptime(value, datetime_format)
+        parsed = datetime.strptime(value, datetime_format)
     except ValueError:
         raise ValueError(f"Input {field_name} -- {value} -- is not a valid date.")
         
-    return value if not return_as_datetime else datetime.strptime(value, datetime_format)
+    return value if not return_as_datetime else parsed
 
 def _verify_datetime_format(dt_obj:datetime, expected_format:str = '%Y-%m-%d %H:%M:%S') -> bool:
     try:
@@ -32,18 +34,71 @@ def _verify_datetime_format(dt_obj:datetime, expected_format:str = '%Y-%m-%d %H:
         return False
     
     
-def _check_tags_dict(tags_dict, info):    
-    if not isinstance(tags_dict, Dict):
-        raise ValueError(f"Input {info.field_name} -- {tags_dict} -- is not an instance of {Dict}.")
+# Date formats checked by the validators: format -> (regex pattern, common date format, resolution a datetime must be rounded to)
+date_formats = {
+    '%Y-%m-%d': (r'^\d{4}-\d{2}-\d{2}$', 'YYYY-MM-DD', 'D'),
+    '%Y-%m-%d %H:%M:%S': (r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$', 'YYYY-MM-DD HH:MM:SS', 's'),
+}
     
-    if not all([isinstance(key, str) for key in tags_dict.keys()]):
-        raise ValueError(f"Input {info.field_name} -- {tags_dict} -- all keys should be of type {str}.")
+error_report_columns = ['row', 'field', 'value', 'error']
     
-    if not all([isinstance(value, List) for value in tags_dict.values()]):
-        raise ValueError(f"Input {info.field_name} -- {tags_dict} -- all values should be of type {List}.")
     
-    if not all([isinstance(tag, str) for value in tags_dict.values() for tag in value]):
-        raise ValueError(f"Input {info.field_name} -- {tags_dict} -- all elements in List (Dict values) should be of type {str}.")
+def _is_instance_column(values:pd.Series, types) -> pd.Series:
+    # isinstance check of every element of an object column
+    return values.map(lambda value: isinstance(value, types)).astype(bool)
+
+def _parse_date_column(values:pd.Series, datetime_format:str, allow_none:bool=False):
+    """
+    Parse a column of dates (str following datetime_format, datetime objects or datetime64 values) at once.
+
+    Returns:
+    - Tuple[Series, Series]: Parsed datetime64 column (NaT where invalid or None) and the mask of invalid rows.
+    """
+    regex_pattern, _, resolution = date_formats[datetime_format]
+    missing = values.isna()
+    
+    if pd.api.types.is_datetime64_any_dtype(values):
+        parsed = values.dt.tz_localize(None) if values.dt.tz is not None else values
+    else:
+        is_str = _is_instance_column(values, str)
+        # Strings must match the format exactly (same check as _verify_date_str_format)
+        str_values = values.where(is_str)
+        valid_str = is_str & str_values.str.fullmatch(regex_pattern, na=False).astype(bool)
+        parsed = pd.to_datetime(str_values.where(valid_str), format=datetime_format, errors='coerce')
+        # Datetime objects are kept as they are
+        is_datetime = _is_instance_column(values, datetime)
+        if is_datetime.any():
+            parsed = parsed.where(~is_datetime, pd.to_datetime(values.where(is_datetime), utc=False, errors='coerce', format='mixed'))
+    
+    # Datetimes must carry nothing finer than the format (same check as _verify_datetime_format)
+    invalid = parsed.isna() | (parsed != parsed.dt.floor(resolution))
+    invalid = invalid & ~missing if allow_none else invalid | missing
+    return parsed, invalid
+
+def _error_report(values:pd.DataFrame, invalid_rows:Dict[str, pd.Series], errors:Dict[str, str]) -> pd.DataFrame:
+    """
+    Turn per-column masks of invalid rows into a per-row error report.
+
+    Returns:
+    - DataFrame: One line per invalid (row, field) with columns 'row', 'field', 'value' and 'error', ordered by row.
+    """
+    reports = [pd.DataFrame({'position': np.flatnonzero(invalid.to_numpy()), 'row': values.index[invalid.to_numpy()], 'field': field, 
+                             'value': values[field][invalid.to_numpy()].to_numpy(), 'error': errors[field]}) 
+               for field, invalid in invalid_rows.items() if invalid.any()]
+    if not reports:
+        return pd.DataFrame(columns=error_report_columns)
+    # Ordered by row position (row labels may not be comparable)
+    report = pd.concat(reports, ignore_index=True).sort_values(by='position', kind='stable')
+    return report[error_report_columns].reset_index(drop=True)
+
+def _raise_error_report(report:pd.DataFrame, context:str, max_rows:int=20):
+    # Raise a ValueError listing the first invalid rows of an error report
+    if report.empty:
+        return
+    lines = [f"Row {row} -- input {field} -- {value} -- {error}" for row, field, value, error in report.head(max_rows).itertuples(index=False)]
+    if len(report) > max_rows:
+        lines.append(f"... {len(report) - max_rows} more errors.")
+    raise ValueError(f'Invalid {context} parameters:\n' + '\n'.join(lines))
     
     
     
@@ -111,6 +166,43 @@ def validate_data_history(**kwargs):
         raise ValueError(f'Invalid data_history parameters:\n{e}')
 
 
+data_history_batch_columns = ['interval', 'period', 'start', 'end', 'include_divs_splits', 'repair', 'keepna']
+
+def data_history_batch_errors(df:pd.DataFrame) -> pd.DataFrame:
+    """
+    Validate many data_history parameter sets (one per row) at once, with the same constraints as DataHistoryPydantic.
+
+    Returns:
+    - DataFrame: Per-row error report (empty if all rows are valid).
+    """
+    missing_columns = [column for column in data_history_batch_columns if column not in df.columns]
+    if missing_columns:
+        raise ValueError(f'Invalid data_history parameters: missing columns {missing_columns}.')
+    
+    invalid_rows = {
+        'interval': ~df['interval'].isin(yfinance_history_interval_period_choices['interval']),
+        # None is a valid period (isin does not match None against NaN)
+        'period': ~(df['period'].isin(yfinance_history_interval_period_choices['period']) | df['period'].isna()),
+        'start': _parse_date_column(df['start'], '%Y-%m-%d', allow_none=True)[1],
+        'end': _parse_date_column(df['end'], '%Y-%m-%d', allow_none=True)[1],
+    }
+    invalid_rows.update({column: ~_is_instance_column(df[column], (bool, np.bool_)) for column in ['include_divs_splits', 'repair', 'keepna']})
+    errors = {
+        'interval': f"is not a valid interval. It should be one of {yfinance_history_interval_period_choices['interval']}.",
+        'period': f"is not a valid period. It should be one of {yfinance_history_interval_period_choices['period']}.",
+        'start': "should be None, a 'YYYY-MM-DD' string or a datetime without time.",
+        'end': "should be None, a 'YYYY-MM-DD' string or a datetime without time.",
+        'include_divs_splits': f"should be of type {bool}.",
+        'repair': f"should be of type {bool}.",
+        'keepna': f"should be of type {bool}.",
+    }
+    return _error_report(df, invalid_rows, errors)
+
+def validate_data_history_batch(df:pd.DataFrame):
+    # Validate many data_history parameter sets at once (one row each)
+    _raise_error_report(data_history_batch_errors(df), 'data_history')
+
+
 
 
 
@@ -184,6 +276,66 @@ def validate_transaction(**kwargs):
     
     
 
+############# TransactionBatch: validate all rows at once #############
+
+transaction_batch_columns = ['date_hour', 'transaction_type', 'ticker_symbol', 'n_shares', 'share_price', 
+                             'share_currency', 'transact_currency', 'fee', 'transaction_action']
+
+transaction_batch_errors_messages = {
+    'date_hour': "should be a 'YYYY-MM-DD HH:MM:SS' string or a datetime without sub-second part.",
+    'transaction_type': "should be one of ['buy', 'sale'].",
+    'ticker_symbol': f"should be of type {str}.",
+    'n_shares': "should be a number.",
+    'share_price': "should be a number.",
+    'share_currency': f"should be one of {available_currencies}.",
+    'transact_currency': f"should be one of {available_currencies}.",
+    'fee': "should be a number or None.",
+    'transaction_action': "should be one of ['real', 'non_real'].",
+}
+
+def _transaction_batch_check(df:pd.DataFrame):
+    # Validate the same constraints as TransactionPydantic, column by column over the whole batch
+    missing_columns = [column for column in transaction_batch_columns if column not in df.columns]
+    if missing_columns:
+        raise ValueError(f'Invalid TransactionBatch parameters: missing columns {missing_columns}.')
+    
+    date_hour, invalid_date_hour = _parse_date_column(df['date_hour'], '%Y-%m-%d %H:%M:%S')
+    invalid_rows = {
+        'date_hour': invalid_date_hour,
+        'transaction_type': ~df['transaction_type'].isin(['buy', 'sale']),
+        'ticker_symbol': ~_is_instance_column(df['ticker_symbol'], str),
+        'n_shares': pd.to_numeric(df['n_shares'], errors='coerce').isna(),
+        'share_price': pd.to_numeric(df['share_price'], errors='coerce').isna(),
+        'share_currency': ~df['share_currency'].isin(available_currencies),
+        'transact_currency': ~df['transact_currency'].isin(available_currencies),
+        'fee': pd.to_numeric(df['fee'], errors='coerce').isna() & df['fee'].notna(),
+        'transaction_action': ~df['transaction_action'].isin(['real', 'non_real']),
+    }
+    return _error_report(df, invalid_rows, transaction_batch_errors_messages), date_hour
+
+def transaction_batch_errors(df:pd.DataFrame) -> pd.DataFrame:
+    """
+    Validate many transactions (one per row) at once, with the same constraints as TransactionPydantic.
+
+    Returns:
+    - DataFrame: Per-row error report (empty if all rows are valid).
+    """
+    return _transaction_batch_check(df)[0]
+
+def validate_transaction_batch(df:pd.DataFrame) -> pd.Series:
+    """
+    Validate many transactions at once, raising a ValueError listing the invalid rows.
+
+    Returns:
+    - Series: The parsed date_hour column (datetime64).
+    """
+    report, date_hour = _transaction_batch_check(df)
+    _raise_error_report(report, 'TransactionBatch')
+    return date_hour
+    
+    
+    
+
 ############# Portfolio: load_transactions_from_csv #############
 
 class PortfolioLoadCsvPydantic(BaseModel):
@@ -206,22 +358,23 @@ def validate_load_csv(**kwargs):
     
 ############# Portfolio: add_transaction #############
 
-class PortfolioTagsDictPydantic(BaseModel):
-    #transaction: Transaction
-    tags_dict: Union[Dict[str, List], None]
-        
-    @field_validator('tags_dict')
-    @classmethod
-    def validate_tags_dict(cls, value, info: ValidationInfo):
-        if value is None:
-            return value 
-        _check_tags_dict(value, info)
-        return value
+def tags_dict_errors(tags_dict) -> pd.DataFrame:
+    """
+    Validate a tags_dict ({ticker_symbol: [tags]}) key by key.
+
+    Returns:
+    - DataFrame: Per-key error report (empty if tags_dict is valid), 'row' being the dict key.
+    """
+    if tags_dict is None:
+        return pd.DataFrame(columns=error_report_columns)
+    if not isinstance(tags_dict, Dict):
+        return pd.DataFrame([[None, 'tags_dict', tags_dict, f"is not an instance of {Dict}."]], columns=error_report_columns)
     
-def validate_tags_dict(**kwargs):  
-    # Validate data_history parameters input through pydantic model
-    try:
-        PortfolioTagsDictPydantic(**kwargs)
-    except ValidationError as e:
-        raise ValueError(f'Invalid add_transaction parameters:\n{e}')
-    
\ No newline at end of file
+    values = pd.DataFrame({'tags_dict': pd.Series(list(tags_dict.values()), index=list(tags_dict.keys()), dtype=object)})
+    invalid_rows = {'tags_dict': ~pd.Series([isinstance(key, str) for key in tags_dict.keys()], index=values.index) 
+                                 | ~values['tags_dict'].map(lambda tags: isinstance(tags, List) and all(isinstance(tag, str) for tag in tags)).astype(bool)}
+    return _error_report(values, invalid_rows, {'tags_dict': f"keys should be of type {str} and values Lists of {str}."})
+    
+def validate_tags_dict(tags_dict=None):  
+    # Validate tags_dict without building a pydantic model per call
+    _raise_error_report(tags_dict_errors(tags_dict), 'add_transaction')
@@ -0,0 +1,92 @@
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+
+class TagWeights():
+    '''
+    Ticker tags compiled once into sparse ticker x tag weight matrices, so that tag allocations over time are a single
+    (sparse) product with the dates x ticker position values matrix.
+
+    ticker_tags should be as {
+                                'ticker_1': {
+                                            'main_tag_1': {
+                                                        'weight': 0.7,
+                                                        'subtags': {
+                                                            'subtag_1': weight,
+                                                            ...
+                                                            }
+                                                        }
+                                            ...
+                                            }
+                                ...
+                            }
+    A ticker counts for weight x its value in a main tag, and for weight x subtag weight x its value in a subtag
+    (so that the subtags of a main tag add up to it when their weights add up to 1).
+
+    The matrices are kept in coordinate form (ticker row, tag column, weight) sorted by tag column.
+    '''
+    def __init__(self, ticker_tags:Dict[str, Dict]):
+        main_entries, sub_entries = [], []
+        for ticker, tags in ticker_tags.items():
+            for main_tag, mt_dict in tags.items():
+                main_entries.append((ticker.lower(), main_tag, mt_dict['weight']))
+                for subtag, weight in mt_dict.get('subtags', {}).items():
+                    sub_entries.append((ticker.lower(), (main_tag, subtag), mt_dict['weight'] * weight))
+
+        self.tickers = pd.Index(list(dict.fromkeys(entry[0] for entry in main_entries)), name='ticker_symbol')
+        self.main_tags, self.main_matrix = self._compile(main_entries, pd.Index)
+        self.subtags, self.sub_matrix = self._compile(sub_entries, lambda tags: pd.MultiIndex.from_tuples(tags, names=['main_tag', 'subtag']))
+
+    def _compile(self, entries:list, index_from):
+        # (tag index, (ticker rows, tag columns, weights)) with duplicated (ticker, tag) entries summed
+        if not entries:
+            return index_from([]), (np.array([], dtype='int64'), np.array([], dtype='int64'), np.array([]))
+        tickers, tags, weights = zip(*entries)
+        tag_codes, tag_index = pd.factorize(pd.Series(list(tags), dtype='object'))
+        tag_index = index_from(list(tag_index))
+        coo = pd.DataFrame({'row': self.tickers.get_indexer(tickers), 'column': tag_codes, 'weight': np.asarray(weights, dtype='float64')})
+        coo = coo.groupby(['column', 'row'], sort=True)['weight'].sum().reset_index()
+        return tag_index, (coo['row'].to_numpy(), coo['column'].to_numpy(), coo['weight'].to_numpy())
+
+    @staticmethod
+    def _sparse_product(values:np.ndarray, matrix:tuple, n_tags:int) -> np.ndarray:
+        # values (dates x tickers) @ matrix (tickers x tags) touching the non zero weights only
+        rows, columns, weights = matrix
+        product = np.zeros((values.shape[0], n_tags))
+        if not len(weights):
+            return product
+        contributions = values[:, rows] * weights
+        # Entries are sorted by column: sum each column's run of contributions
+        starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+        product[:, columns[starts]] = np.add.reduceat(contributions, starts, axis=1)
+        return product
+
+    def allocations(self, position_values:pd.DataFrame, total_value:pd.Series=None):
+        """
+        Compute the allocation of each main tag and subtag at each date.
+
+        Parameters:
+        - position_values (DataFrame): dates x ticker_symbol position values (tickers absent from the tags are ignored, tagged tickers absent from it count as 0).
+        - total_value (Series): Portfolio value per date, allocations are fractions of it (values in base currency if None).
+
+        Returns:
+        - Tuple[DataFrame, DataFrame]: dates x main tag and dates x (main_tag, subtag) allocations.
+        """
+        columns = position_values.columns.astype(str).str.lower()
+        codes = self.tickers.get_indexer(columns)
+        values = np.zeros((len(position_values), len(self.tickers)))
+        known = codes >= 0
+        values[:, codes[known]] = position_values.to_numpy(dtype='float64')[:, known]
+        values = np.nan_to_num(values)
+
+        main = self._sparse_product(values, self.main_matrix, len(self.main_tags))
+        sub = self._sparse_product(values, self.sub_matrix, len(self.subtags))
+        if total_value is not None:
+            total = total_value.reindex(position_values.index).to_numpy(dtype='float64')[:, None]
+            # A date without value has no allocation
+            main = np.divide(main, total, out=np.zeros_like(main), where=total != 0)
+            sub = np.divide(sub, total, out=np.zeros_like(sub), where=total != 0)
+        return (pd.DataFrame(main, index=position_values.index, columns=self.main_tags),
+                pd.DataFrame(sub, index=position_values.index, columns=self.subtags))
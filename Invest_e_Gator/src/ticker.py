@@ -1,21 +1,65 @@
-import yfinance as yf
+from typing import Dict, List, Tuple
+import threading
+from collections import OrderedDict
 import pandas as pd
+import numpy as np
 from datetime import datetime
 from datetime import timedelta
 
-from Invest_e_Gator.src.secondary_modules.yfinance_cache import session
-from Invest_e_Gator.src.secondary_modules.pydantic_valids import validate_data_history, validate_financials
-from Invest_e_Gator.src.constants import yfinance_info_attributes
+from Invest_e_Gator.src.secondary_modules.yfinance_cache import get_session, get_config
+from Invest_e_Gator.src.secondary_modules.price_history_store import price_history_store
+from Invest_e_Gator.src.secondary_modules.info_cache import info_cache
+from Invest_e_Gator.src.secondary_modules.pydantic_valids import validate_data_history, validate_data_history_batch, validate_financials
+from Invest_e_Gator.src.constants import yfinance_info_attributes, yfinance_info_field_groups
+
+
+def _window_day(date):
+    # Datetimes (e.g. datetime.now() - timedelta(days=7)) are taken at their day since bars are daily, strings are left to the validation
+    if not isinstance(date, (datetime, np.datetime64)):
+        return date
+    date = pd.Timestamp(date)
+    return (date.tz_localize(None) if date.tzinfo is not None else date).normalize()
+
 
 class Ticker():
+    # Days fetched before a requested date so that weekends and holidays still resolve to the previous close
+    closing_price_lookback_days = 7
+    
+    # Process-wide registry: one shared Ticker per symbol, least recently used ones evicted
+    # once there are more than config['yfinance_TICKER_REGISTRY_MAX_SIZE'] of them
+    _registry = OrderedDict()
+    _registry_lock = threading.Lock()
+    
+    def __new__(cls, ticker_symbol):
+        key = ticker_symbol.upper()
+        with cls._registry_lock:
+            instance = cls._registry.get(key)
+            if instance is not None:
+                cls._registry.move_to_end(key)
+                return instance
+            instance = super().__new__(cls)
+            cls._registry[key] = instance
+            if len(cls._registry) > get_config()['yfinance_TICKER_REGISTRY_MAX_SIZE']:
+                cls._registry.popitem(last=False)
+        return instance
+    
     def __init__(self, ticker_symbol):
+        # Shared instances returned by __new__ are already initialized
+        if getattr(self, '_initialized', False):
+            return
         self.ticker_symbol = ticker_symbol 
-        self.session = session
+        self.session = get_session()
         self._ticker = self.get_yfinance_ticker()
-        # Create property methods to easily access yfinance.Ticker.info values
-        self.create_property_info_methods()
+        self._initialized = True
+        
+    @classmethod
+    def clear_registry(cls):
+        with cls._registry_lock:
+            cls._registry.clear()
         
     def get_yfinance_ticker(self):
+        # yfinance is only imported when a ticker is actually needed
+        import yfinance as yf
         try:
             return yf.Ticker(self.ticker_symbol, session=self.session)
         except Exception as e:
@@ -24,26 +68,42 @@ class Ticker():
 
     ### Create property methods corresponding to elements yfinance.Ticker.info dict.
     ### Relevant elements considered are gathered in 'yfinance_info_attributes'.
+    def _fetch_info(self) -> dict:
+        # Fetch a fresh info dict (a new yfinance.Ticker since it keeps its first info fetched) and cache it
+        info = self.get_yfinance_ticker().info
+        info_cache.put(self.ticker_symbol, info)
+        return info
+    
     def _get_info_value(self, key):
-        return self._ticker.info.get(key, None)
+        # Served from the info cache while the key's field group is fresh
+        snapshot = info_cache.get(self.ticker_symbol, info_cache.field_group(key))
+        if snapshot is None:
+            return self._fetch_info().get(key, None)
+        return snapshot.get(key, None)
     
-    def _create_property_method(self, info_key):
+    @staticmethod
+    def _create_property_method(info_key):
         # Function to create the dynamic property methods
         def property_method(self):
             return self._get_info_value(info_key)
         # Wraps method with property
         return property(property_method)
     
-    def create_property_info_methods(self):
-        # Dynamically create methods and add them to the class
+    @classmethod
+    def create_property_info_methods(cls):
+        # Dynamically create methods and add them to the class (done once, right after the class definition)
         for attr_name, info_key in yfinance_info_attributes.items():
-            setattr(self.__class__, attr_name, self._create_property_method(info_key))
+            setattr(cls, attr_name, cls._create_property_method(info_key))
             
     @property
     def info(self):
-        return self._ticker.info
+        # Merge the cached field groups if all of them are fresh, otherwise fetch
+        snapshots = [info_cache.get(self.ticker_symbol, group) for group in list(yfinance_info_field_groups.keys()) + ['default']]
+        if any(snapshot is None for snapshot in snapshots):
+            return self._fetch_info()
+        return {key: value for snapshot in snapshots for key, value in snapshot.items()}
     
-    def data_history(self, interval:str='1d', period='max', start=None, end=None, repair=True, keepna=False, include_divs_splits=False, history_metadata=False):
+    def data_history(self, interval:str='1d', period='max', start=None, end=None, repair=True, keepna=False, include_divs_splits=False, history_metadata=False, raise_errors=False):
         """
         Fetch historical market data for the ticker.
 
@@ -56,6 +116,7 @@ class Ticker():
         - keepna (bool): Whether to keep NaN values in the data.
         - include_divs_splits (bool): Whether to include dividends and stock splits.
         - history_metadata (bool): Whether to include history metadata.
+        - raise_errors (bool): Raise download errors rather than returning an empty DataFrame.
 
         Returns:
         - DataFrame or Tuple[DataFrame, dict]: Historical data and optionally history_metadata.
@@ -65,63 +126,152 @@ class Ticker():
                               repair=repair, keepna=keepna, include_divs_splits=include_divs_splits)
         # Call yfinance.Ticker.history method
         history_df = self._ticker.history(interval=interval, period=period, start=start, end=end, 
-                                          repair=repair, keepna=keepna, actions=include_divs_splits)
+                                          repair=repair, keepna=keepna, actions=include_divs_splits, raise_errors=raise_errors)
         # Return df or tuple(df, metadata)
         return history_df if not history_metadata else (history_df, self._ticker.history_metadata) 
 
-    def categorize_date_for_fetching_data_history(self, date):
-        date = pd.to_datetime(date)
-        # Current datetime
-        now = datetime.now()
-        # Calculate date ranges
-        five_days_ago = now - timedelta(days=5)
-        one_month_ago = now - timedelta(days=30)
-        three_months_ago = now - timedelta(days=90)
-        six_months_ago = now - timedelta(days=180)
-        one_year_ago = now - timedelta(days=365)
-        two_years_ago = now - timedelta(days=730)
-
-        if date > five_days_ago:
-            return '5d'
-        elif date > one_month_ago:
-            return '1mo'
-        elif date > three_months_ago:
-            return '3mo'
-        elif date > six_months_ago:
-            return '6mo'
-        elif date > one_year_ago:
-            return '1y'
-        elif date > two_years_ago:
-            return '2y'
-        else:
-            return 'max'
-
-    def find_closest_inferior_date(self, df, target_date):
-        # Ensure the target_date is in datetime format
-        target_date = pd.to_datetime(target_date)
-        target_date = target_date.tz_localize('America/New_York')
-        # Ensure the index is in datetime format
-        df.index = pd.to_datetime(df.index)
-        # Filter out dates greater than the target date
-        inferior_dates = df[df.index <= target_date]
-        if inferior_dates.empty:
-            raise ValueError("No dates found that are less than or equal to the target date.")
-        # Find the maximum date from the remaining dates
-        return inferior_dates.index.max()
+    def _fetch_daily_bars(self, start, end):
+        # Fetch daily bars between start and end (both included), start=None meaning the whole history.
+        # None if the download failed, an empty frame if it succeeded without any bar (see PriceHistoryStore.update)
+        from yfinance.exceptions import YFPricesMissingError
+        try:
+            return self.data_history(interval='1d', period='max' if start is None else None,
+                                     start=None if start is None else start.strftime('%Y-%m-%d'), 
+                                     end=(end + timedelta(days=1)).strftime('%Y-%m-%d'), raise_errors=True)
+        except YFPricesMissingError:
+            return pd.DataFrame()
+        except Exception as e:
+            print(f"Couldn't download '{self.ticker_symbol}' price history: {e}")
+            return None
+
+    def sync_price_history(self, start=None, end=None, extend_to_today:bool=True):
+        """
+        Make sure daily bars between start and end are stored locally, only fetching the ranges not stored yet.
+
+        Parameters:
+        - start (str or datetime): First day needed (None for the whole history).
+        - end (str or datetime): Last day needed (None for today).
+        - extend_to_today (bool): Fetch a missing tail up to today so that later lookups are answered locally.
+        """
+        price_history_store.sync(self.ticker_symbol, self._fetch_daily_bars, start=start, end=end, extend_to_today=extend_to_today)
+
+    def price_history(self, start=None, end=None) -> pd.DataFrame:
+        """
+        Get daily OHLCV bars between start and end from the local price history store (fetching missing ranges first).
+        """
+        self.sync_price_history(start=start, end=end)
+        return price_history_store.history(self.ticker_symbol, start=start, end=end)
+
+    def closing_prices_asof(self, dates, sync:bool=True) -> np.ndarray:
+        """
+        Get the closing price as of each date (close of the last trading day before or on the date).
+
+        Parameters:
+        - dates (list-like of str or datetime): Dates to price (any order, tz-aware dates are taken at their local wall time).
+        - sync (bool): Fetch the ranges missing in the local price history store first.
+
+        Returns:
+        - np.ndarray: One closing price per date, NaN where no price is known yet.
+        """
+        dates = pd.DatetimeIndex(pd.to_datetime(dates, format='mixed'))
+        if dates.tz is not None:
+            dates = dates.tz_localize(None)
+        if sync and len(dates):
+            self.sync_price_history(start=dates.min() - timedelta(days=self.closing_price_lookback_days), end=dates.max())
+        
+        # Binary search of every date in the cached sorted trading days
+        index, closes = price_history_store.get_close_arrays(self.ticker_symbol)
+        positions = np.searchsorted(index, dates.values, side='right') - 1
+        prices = closes[np.maximum(positions, 0)] if len(closes) else np.full(len(dates), np.nan)
+        prices[positions < 0] = np.nan
+        return prices
 
-    
     def get_closing_price(self, date:datetime):
-        # Get period to fetch relative to date of transaction
-        period = self.categorize_date_for_fetching_data_history(date)
-        # Fetched data
-        data = self.data_history(period=period)
         try:
-            # Get closest closing price
-            closest_inferior_date = self.find_closest_inferior_date(data, date)
-            return data.at[closest_inferior_date, 'Close']
+            # Get closest closing price (only the missing tail is fetched)
+            price = self.closing_prices_asof([date])[0]
+            return None if np.isnan(price) else price
         except:
             return None
 
+    @staticmethod
+    def _download_daily_bars(symbols:List[str], start, end) -> Dict[str, pd.DataFrame]:
+        # Download daily bars of several symbols between start and end (both included) through one yfinance.download call.
+        # A symbol's bars are None if its download failed, an empty frame if it succeeded without any bar (see PriceHistoryStore.update)
+        import yfinance as yf
+        from yfinance import shared as yf_shared
+        kwargs = {'period': 'max'} if start is None else {'start': start.strftime('%Y-%m-%d')}
+        try:
+            data = yf.download([symbol.upper() for symbol in symbols], interval='1d', end=(end + timedelta(days=1)).strftime('%Y-%m-%d'),
+                               group_by='ticker', auto_adjust=True, repair=True, keepna=False, progress=False, session=get_session(), **kwargs)
+        except Exception as e:
+            print(f"Couldn't download {symbols} price history: {e}")
+            return {symbol: None for symbol in symbols}
+        # Symbols that failed (network error, unknown symbol...) are not stored so that they get fetched again later,
+        # unlike symbols without any bar in the range (YFPricesMissingError)
+        errors = dict(yf_shared._ERRORS)
+        
+        results = {}
+        for symbol in symbols:
+            error = errors.get(symbol.upper())
+            if error is not None and 'no price data found' not in str(error):
+                print(f"Couldn't download '{symbol}' price history: {error}")
+                results[symbol] = None
+                continue
+            if isinstance(data.columns, pd.MultiIndex):
+                bars = data[symbol.upper()] if symbol.upper() in data.columns.get_level_values(0) else pd.DataFrame()
+            else:
+                bars = data
+            results[symbol] = bars.dropna(how='all')
+        return results
+
+    @staticmethod
+    def bulk_sync_price_history(windows:Dict[str, Tuple], extend_to_today:bool=True):
+        """
+        Make sure the local price history store covers a date window per ticker, using multi-ticker downloads.
+
+        Symbols missing the same date range (typically the tail since the last run) are grouped and downloaded together,
+        by chunks of config['yfinance_BULK_DOWNLOAD_CHUNK_SIZE'] symbols.
+
+        Parameters:
+        - windows (Dict[str, Tuple]): {ticker_symbol: (start, end)} ('YYYY-MM-DD' strings or datetimes, taken at their day) with start=None for the whole history and end=None for today.
+        - extend_to_today (bool): Fetch missing tails up to today (see Ticker.sync_price_history).
+        """
+        windows = {symbol: (_window_day(start), _window_day(end)) for symbol, (start, end) in windows.items()}
+        # Validate all windows at once rather than one data_history call per ticker
+        validate_data_history_batch(pd.DataFrame({'interval': '1d', 'period': None, 
+                                                  'start': pd.Series([start for start, _ in windows.values()], dtype=object), 
+                                                  'end': pd.Series([end for _, end in windows.values()], dtype=object),
+                                                  'include_divs_splits': False, 'repair': True, 'keepna': False}))
+        ranges_to_fetch = {}
+        for symbol, (start, end) in windows.items():
+            for missing_range in price_history_store.missing_ranges(symbol, start=start, end=end, extend_to_today=extend_to_today):
+                ranges_to_fetch.setdefault(missing_range, []).append(symbol)
+
+        chunk_size = get_config()['yfinance_BULK_DOWNLOAD_CHUNK_SIZE']
+        for (start, end), symbols in ranges_to_fetch.items():
+            for i in range(0, len(symbols), chunk_size):
+                for symbol, bars in Ticker._download_daily_bars(symbols[i:i + chunk_size], start, end).items():
+                    price_history_store.update(symbol, bars, start=start, end=end)
+
+    @staticmethod
+    def bulk_history(symbols:List[str], start=None, end=None) -> pd.DataFrame:
+        """
+        Get daily closing prices of several tickers as one aligned frame.
+
+        Parameters:
+        - symbols (List[str]): Ticker symbols.
+        - start (str or datetime): First day (None for the whole history).
+        - end (str or datetime): Last day (None for today).
+
+        Returns:
+        - DataFrame: Closing prices indexed by trading day (union of all tickers' trading days) with one column per symbol,
+                     forward filled so that each row holds the last known close of every ticker.
+        """
+        Ticker.bulk_sync_price_history({symbol: (start, end) for symbol in symbols})
+        closes = {symbol: price_history_store.history(symbol, start=start, end=end)['Close'] for symbol in symbols}
+        return pd.DataFrame(closes, columns=symbols).sort_index().ffill()
+
     def financials(self, income_stmt:bool=True, balance_sheet:bool=False, cash_flow:bool=False, quarterly:bool=False, pretty:bool=False):
         """
         Fetch financial statements for the ticker.
@@ -146,6 +296,11 @@ class Ticker():
         if cash_flow: results['cash_flow'] = self._ticker.get_cash_flow(**params)
         return results
     
+
+# Create property methods to easily access yfinance.Ticker.info values
+Ticker.create_property_info_methods()
+
+    
 if __name__ == "__main__":
     
     msft_obj = Ticker('MSFT')
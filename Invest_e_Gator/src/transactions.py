@@ -1,8 +1,12 @@
-from typing import Literal, Union
+from typing import Dict, Iterable, List, Literal, Union
 from datetime import datetime
+from functools import cached_property
 
-from Invest_e_Gator.src.secondary_modules.pydantic_valids import validate_transaction
-from Invest_e_Gator.src.secondary_modules.currency_conversion import currency_conversion
+import numpy as np
+import pandas as pd
+
+from Invest_e_Gator.src.secondary_modules.pydantic_valids import validate_transaction, validate_transaction_batch, transaction_batch_columns
+from Invest_e_Gator.src.secondary_modules.currency_conversion import currency_conversion, currency_conversion_column
 
 class Transaction():    
     def __init__(self, 
@@ -60,4 +64,95 @@ class Transaction():
                 date_obj=self.date_hour, 
                 currency=self.share_currency, 
                 target_currency=self.transact_currency
-            )
\ No newline at end of file
+            )
+
+
+
+class TransactionBatch():
+    '''
+    Columnar counterpart of Transaction: many transactions held as pandas/numpy columns, 
+    validated in one pass, with direction, quantity and converted amounts computed as vectorized columns.
+    '''
+    def __init__(self, transactions_df:pd.DataFrame):
+        df = transactions_df.reindex(columns=transaction_batch_columns)
+        # Same normalization as Transaction (non str values are left for the validation to report)
+        for column in ['transaction_type', 'ticker_symbol', 'share_currency', 'transact_currency']:
+            df[column] = df[column].map(lambda value: value.lower() if isinstance(value, str) else value)
+        
+        # Validated column by column (invalid rows reported with their index in transactions_df), date_hour is parsed on the way
+        df['date_hour'] = validate_transaction_batch(df)
+        df = df.reset_index(drop=True)
+        
+        df['n_shares'] = df['n_shares'].astype('float64')
+        df['share_price'] = df['share_price'].astype('float64')
+        df['fee'] = pd.to_numeric(df['fee']).astype('float64')
+        self.df = df
+        
+    @classmethod
+    def from_transactions(cls, transactions:Iterable[Transaction]) -> 'TransactionBatch':
+        return cls(pd.DataFrame([{column: getattr(transaction, column) for column in transaction_batch_columns} 
+                                 for transaction in transactions], columns=transaction_batch_columns))
+        
+    def __len__(self):
+        return len(self.df)
+    
+    @cached_property
+    def transaction_direction(self) -> np.ndarray:
+        return np.where(self.df['transaction_type'].to_numpy() == 'buy', 1, -1)
+
+    @cached_property
+    def quantity(self) -> np.ndarray:
+        return self.transaction_direction * self.df['n_shares'].to_numpy()
+
+    @cached_property
+    def share_price_transact_currency(self) -> np.ndarray:
+        return currency_conversion_column(
+                amounts=self.df['share_price'].to_numpy(), 
+                currencies=self.df['share_currency'].to_numpy(dtype=str), 
+                target_currencies=self.df['transact_currency'].to_numpy(dtype=str), 
+                dates=self.df['date_hour'].to_numpy()
+            )
+
+    @cached_property
+    def transaction_amount_transact_currency(self) -> np.ndarray:
+        # Same currency amounts are returned untouched by the conversion
+        return currency_conversion_column(
+                amounts=self.quantity * self.df['share_price'].to_numpy(), 
+                currencies=self.df['share_currency'].to_numpy(dtype=str), 
+                target_currencies=self.df['transact_currency'].to_numpy(dtype=str), 
+                dates=self.df['date_hour'].to_numpy()
+            )
+    
+    def to_portfolio_frame(self, base_currency:str, ticker_names:Dict[str, str]=None, ticker_tags:Dict[str, List]=None) -> pd.DataFrame:
+        """
+        Build the rows Portfolio stores for these transactions (same columns as Portfolio.add_transaction).
+
+        Parameters:
+        - base_currency (str): Portfolio base currency.
+        - ticker_names (Dict[str, str]): ticker_symbol -> long name.
+        - ticker_tags (Dict[str, List]): ticker_symbol -> tags.
+
+        Returns:
+        - DataFrame: One row per transaction.
+        """
+        dates = self.df['date_hour'].to_numpy()
+        transact_currencies = self.df['transact_currency'].to_numpy(dtype=str)
+        transact_amount_base_currency = currency_conversion_column(self.transaction_amount_transact_currency, transact_currencies, base_currency, dates)
+        ticker_names, ticker_tags = ticker_names if ticker_names else {}, ticker_tags if ticker_tags else {}
+        
+        return pd.DataFrame({
+            'date_hour': self.df['date_hour'],
+            'transaction_type': self.df['transaction_type'],
+            'transaction_action': self.df['transaction_action'],
+            'ticker_symbol': self.df['ticker_symbol'],
+            'name': self.df['ticker_symbol'].map(ticker_names),
+            'tags': self.df['ticker_symbol'].map(lambda ticker: ticker_tags.get(ticker)),
+            'n_shares': self.df['n_shares'], # n shares sold or bought (positive number)
+            'quantity': self.quantity, # actual number (negative or positive)
+            'share_price_base_currency': currency_conversion_column(self.share_price_transact_currency, transact_currencies, base_currency, dates),
+            'transact_currency': self.df['transact_currency'],
+            'fee_transact_currency': self.df['fee'],
+            # Keep the transact currency amount if it couldn't be converted
+            'transact_amount_base_currency': np.where(np.isnan(transact_amount_base_currency), self.transaction_amount_transact_currency, transact_amount_base_currency)
+        })
+
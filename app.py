@@ -21,6 +21,7 @@ optimizer = None
 # Define data nodes
 transactions_data = pd.DataFrame()
 portfolio_metrics = pd.DataFrame()
+portfolio_totals = pd.DataFrame()
 optimization_results = pd.DataFrame()
 
 # Pages variables
@@ -42,8 +43,10 @@ def on_load_transactions(state):
 def on_compute_metrics(state):
     try:
         portfolio.base_currency = state.base_currency
-        metrics = portfolio.compute_portfolio_metrics(today=True)
-        state.portfolio_metrics = metrics
+        portfolio.compute_portfolio_metrics(today=True)
+        # Current metrics: one row per position and the portfolio totals
+        state.portfolio_metrics = portfolio.current_positions.reset_index()
+        state.portfolio_totals = portfolio.current_totals.to_frame().T
         notify(state, "success", "Portfolio metrics computed successfully!")
     except Exception as e:
         notify(state, "error", f"Error computing metrics: {str(e)}")
@@ -98,6 +101,8 @@ with tgb.Page() as portfolio_page:
         tgb.text('## Results', mode="md")
     with tgb.layout("1"):
         tgb.table("{portfolio_metrics}", label='Portfolio Metrics')
+    with tgb.layout("1"):
+        tgb.table("{portfolio_totals}", label='Portfolio Totals')
         
 # Purchase Optimization Page
 with tgb.Page() as optimization_page:
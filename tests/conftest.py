@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Import the package as Invest_e_Gator.src... from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Plots are only saved to files
+os.environ.setdefault('MPLBACKEND', 'Agg')
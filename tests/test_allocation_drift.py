@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from Invest_e_Gator.src.allocation_drift import AllocationDrift
+
+
+alloc_tags = {'equity': {'weight': 0.6, 'subtags': {'us': 0.5, 'europe': 0.5}}, 'bond': {'weight': 0.4}}
+
+
+def test_drift():
+    dates = pd.date_range('2024-01-01', periods=2)
+    # Untargeted tags are ignored, targeted tags without allocation count as 0
+    main = pd.DataFrame({'equity': [0.7, 0.5], 'gold': [0.3, 0.5]}, index=dates)
+    sub = pd.DataFrame({('equity', 'us'): [0.4, 0.5]}, index=dates)
+    sub.columns = pd.MultiIndex.from_tuples(sub.columns, names=['main_tag', 'subtag'])
+    main_drift, sub_drift = AllocationDrift(alloc_tags).drift(main, sub)
+    assert np.allclose(main_drift['equity'], [0.1, -0.1])
+    assert np.allclose(main_drift['bond'], [-0.4, -0.4])
+    assert np.allclose(sub_drift[('equity', 'us')], [0.1, 0.2])
+    assert np.allclose(sub_drift[('equity', 'europe')], [-0.3, -0.3])
+
+
+def test_threshold_crossings():
+    dates = pd.date_range('2024-01-01', periods=7)
+    # equity crosses over its band, comes back, crosses under it and comes back; bond stays within
+    equity = [0.62, 0.7, 0.66, 0.6, 0.5, 0.56, 0.6]
+    main = pd.DataFrame({'equity': equity, 'bond': [0.4] * 7}, index=dates)
+    sub = pd.DataFrame({('equity', 'us'): [0.3] * 7, ('equity', 'europe'): [0.3] * 7}, index=dates)
+    sub.columns = pd.MultiIndex.from_tuples(sub.columns, names=['main_tag', 'subtag'])
+    drift_engine = AllocationDrift(alloc_tags, threshold=0.05)
+    events = drift_engine.events(*drift_engine.drift(main, sub))
+    assert events['date'].tolist() == list(dates[[1, 3, 4, 5]])
+    assert events['state'].tolist() == ['over', 'within', 'under', 'within']
+    assert (events['main_tag'] == 'equity').all() and events['subtag'].isna().all()
+    assert np.allclose(events['drift'], [0.1, 0, -0.1, -0.04])
+
+
+def test_out_of_band_at_first_date():
+    dates = pd.date_range('2024-01-01', periods=2)
+    main = pd.DataFrame({'equity': [0.6, 0.6], 'bond': [0.4, 0.4]}, index=dates)
+    sub = pd.DataFrame({('equity', 'us'): [0.6, 0.3], ('equity', 'europe'): [0.0, 0.3]}, index=dates)
+    sub.columns = pd.MultiIndex.from_tuples(sub.columns, names=['main_tag', 'subtag'])
+    drift_engine = AllocationDrift(alloc_tags, threshold=0.05)
+    events = drift_engine.events(*drift_engine.drift(main, sub))
+    assert list(zip(events['date'], events['subtag'], events['state'])) == [(dates[0], 'us', 'over'), (dates[0], 'europe', 'under'),
+                                                                           (dates[1], 'us', 'within'), (dates[1], 'europe', 'within')]
@@ -0,0 +1,73 @@
+import os
+import functools
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Invest_e_Gator.src import ticker as ticker_module
+from Invest_e_Gator.src import portfolio_metrics as portfolio_metrics_module
+from Invest_e_Gator.src import degiro_csv_processing
+from Invest_e_Gator.src.ticker import Ticker
+from Invest_e_Gator.src.portfolio import Portfolio
+from Invest_e_Gator.src.portfolio_metrics import PortfolioMetrics
+from Invest_e_Gator.src.batch_runner import BatchMetricsRunner
+from Invest_e_Gator.src.degiro_csv_processing import SQLiteManagment
+from Invest_e_Gator.src.secondary_modules.metrics_state import MetricsState
+from Invest_e_Gator.src.secondary_modules.price_history_store import PriceHistoryStore
+
+
+tickers = ['aaa', 'bbb', 'ccc']
+
+
+def _ledger(seed:int, n_transactions:int) -> pd.DataFrame:
+    # TransactionBatch layout, as stored in SQLite
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp('2023-01-02 10:00:00') + pd.to_timedelta(np.sort(rng.integers(0, 300, n_transactions)), unit='D')
+    return pd.DataFrame({'date_hour': dates.strftime('%Y-%m-%d %H:%M:%S'), 'transaction_type': 'buy', 'ticker_symbol': rng.choice(tickers, n_transactions),
+                         'n_shares': rng.integers(1, 10, n_transactions).astype('float64'), 'share_price': rng.uniform(10, 100, n_transactions),
+                         'share_currency': 'usd', 'transact_currency': 'usd', 'fee': 0.0, 'transaction_action': 'real'})
+
+
+@pytest.fixture
+def ledgers(tmp_path, monkeypatch):
+    # Prices stored up to today (nothing to download), ledgers and metrics states in temporary files
+    store = PriceHistoryStore(store_path=str(tmp_path / 'price_history'))
+    days = pd.bdate_range('2022-12-01', datetime.now())
+    for i, symbol in enumerate(tickers):
+        store.update(symbol, pd.DataFrame({'Close': 20.0 * (i + 1) + np.arange(len(days)) / 10}, index=days), start=None, end=datetime.now())
+    monkeypatch.setattr(ticker_module, 'price_history_store', store)
+    monkeypatch.setattr(portfolio_metrics_module, 'price_history_store', store)
+    monkeypatch.setattr(Ticker, 'currency', property(lambda self: 'USD'))
+    monkeypatch.setattr(Portfolio, '_get_ticker_full_names', lambda self, symbols: {symbol: symbol.upper() for symbol in symbols})
+    monkeypatch.setattr(degiro_csv_processing, 'SQLITE_DATABASE_PATH', str(tmp_path / 'data_sqlite.db'))
+    monkeypatch.setattr(portfolio_metrics_module, 'MetricsState', functools.partial(MetricsState, state_path=str(tmp_path / 'metrics_state')))
+
+    # Two ledger tables of one user, and one of another user
+    ledgers = {('alice', 'degiro'): _ledger(0, 40), ('alice', 'ibkr'): _ledger(1, 30), ('bob', 'degiro'): _ledger(2, 20)}
+    with SQLiteManagment.get_db_connection() as conn:
+        for (user_id, table_name), ledger in ledgers.items():
+            ledger.assign(user_id=user_id).to_sql(table_name, conn, if_exists='append', index=False)
+    return ledgers
+
+
+@pytest.mark.parametrize('n_workers', [None, 2])
+def test_runner_tables_of_one_user(ledgers, tmp_path, n_workers):
+    for run in range(2):
+        runner = BatchMetricsRunner(list(ledgers), n_workers=n_workers, use_cache=False)
+        results = runner.run()
+        assert set(results) == set(ledgers)
+        for key, portfolio in runner.loaded.items():
+            positions, totals = PortfolioMetrics(portfolio.transactions_df, 'usd').compute_metrics(tidy=True)
+            pd.testing.assert_frame_equal(results[key][0], positions)
+            pd.testing.assert_frame_equal(results[key][1], totals)
+
+    # One metrics state per (user_id, table_name), none left half written
+    state_files = sorted(os.listdir(tmp_path / 'metrics_state'))
+    assert len(state_files) == len(ledgers)
+    assert not [state_file for state_file in state_files if state_file.endswith('.tmp')]
+
+    with SQLiteManagment.get_db_connection() as conn:
+        counts = pd.read_sql_query('SELECT user_id, COUNT(*) AS n FROM degiro_totals_metrics GROUP BY user_id', conn).set_index('user_id')['n']
+    assert counts.to_dict() == {'alice': len(results[('alice', 'degiro')][1]), 'bob': len(results[('bob', 'degiro')][1])}
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from Invest_e_Gator.src.secondary_modules import currency_conversion
+from Invest_e_Gator.src.secondary_modules.currency_conversion import FxRateMatrix, FxRateCache, get_rate, get_pivot_rates
+
+
+class _Converter():
+    # currency_converter's ECB history: {currency: {date: units per EUR}}
+    _rates = {
+        'USD': {datetime(2022, 2, 28).date(): 1.1, datetime(2022, 3, 2).date(): 1.2, datetime(2022, 3, 4).date(): 1.3},
+        'RUB': {datetime(2022, 2, 28).date(): 100.0},
+        }
+
+
+def test_discontinued_currency_is_not_forward_filled():
+    matrix = FxRateMatrix(converter=_Converter(), currencies=['usd', 'rub', 'eur'])
+    dates = [datetime(2022, 2, 28), datetime(2022, 3, 1), datetime(2022, 3, 3), datetime(2022, 3, 4)]
+    # Holidays within a currency's history are filled with the previous rate
+    assert np.allclose(matrix.convert(np.ones(4), 'eur', 'usd', dates), [1.1, 1.1, 1.2, 1.3])
+    # No rate after the last quote of a discontinued currency
+    assert np.allclose(matrix.convert(np.ones(2), 'eur', 'rub', dates[:2]), [100.0, 100.0])
+    assert np.isnan(matrix.convert(np.ones(2), 'eur', 'rub', dates[2:])).all()
+
+
+@pytest.fixture
+def pivot_rates(tmp_path, monkeypatch):
+    # FX rate cache in a temporary file and providers knowing the USD rates only
+    monkeypatch.setattr(currency_conversion, 'fx_rate_cache', FxRateCache(database_path=str(tmp_path / 'fx_rates.db'), max_size=1000))
+    fetched = []
+    answers = {'reachable': True}
+
+    def fetch_pivot_rates(date_obj, today=False):
+        fetched.append(date_obj)
+        return {'usd': 1.1, 'eur': 1.0} if answers['reachable'] else {'eur': 1.0}
+
+    monkeypatch.setattr(currency_conversion, '_fetch_pivot_rates', fetch_pivot_rates)
+    return fetched, answers
+
+
+def test_missing_pivot_rate_is_cached(pivot_rates, tmp_path):
+    fetched, _ = pivot_rates
+    date = datetime(2024, 3, 5)
+    assert get_rate('eur', 'usd', date) == pytest.approx(1.1)
+    # A currency the providers don't have is fetched once
+    for _ in range(3):
+        assert get_rate('eur', 'gbp', date) is None
+        assert get_pivot_rates(date) == {'eur': 1.0, 'usd': 1.1}
+    assert len(fetched) == 1
+    # Also cached on disk
+    assert np.isnan(FxRateCache(database_path=str(tmp_path / 'fx_rates.db')).get('eur', 'gbp', date))
+
+
+def test_unreachable_providers_are_not_cached(pivot_rates):
+    fetched, answers = pivot_rates
+    date = datetime(2024, 3, 5)
+    answers['reachable'] = False
+    assert get_rate('eur', 'usd', date) is None
+    answers['reachable'] = True
+    assert get_rate('eur', 'usd', date) == pytest.approx(1.1)
+    assert len(fetched) == 2
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Invest_e_Gator.src.holdings_index import HoldingsIndex
+
+
+@pytest.fixture
+def ledger() -> pd.DataFrame:
+    # 50 transactions of 3 tickers, every 7 hours, with sales (some closing positions)
+    rng = np.random.default_rng(0)
+    quantity = rng.integers(1, 10, 50).astype('float64')
+    quantity[rng.random(50) < 0.3] *= -1
+    return pd.DataFrame({'date_hour': pd.date_range('2024-01-01 10:00', periods=50, freq='7h'),
+                         'ticker_symbol': rng.choice(['aaa', 'bbb', 'ccc'], 50),
+                         'quantity': quantity,
+                         'transact_amount_base_currency': quantity * rng.uniform(10, 20, 50)})
+
+
+def _recompute(ledger:pd.DataFrame, date) -> pd.DataFrame:
+    # Aggregate the whole ledger up to the date
+    upto = ledger[ledger['date_hour'] <= pd.Timestamp(date)]
+    held = upto.groupby('ticker_symbol', sort=False)[['quantity', 'transact_amount_base_currency']].sum()
+    return held.rename(columns={'transact_amount_base_currency': 'cost'})
+
+
+def test_holdings_at_matches_recompute(ledger):
+    index = HoldingsIndex(ledger, snapshot_every=8)
+    # Before the first transaction, at transactions (some on snapshot boundaries), between snapshots and after the last transaction
+    dates = [ledger['date_hour'].iloc[0] - pd.Timedelta(hours=1)] + list(ledger['date_hour'].iloc[[0, 7, 8, 16, 31, 49]])
+    dates += list(ledger['date_hour'].iloc[[3, 12, 20, 44]] + pd.Timedelta(hours=2)) + [ledger['date_hour'].iloc[-1] + pd.Timedelta(days=10)]
+    for date in dates:
+        held = index.holdings_at(date, include_closed=True)
+        expected = _recompute(ledger, date)
+        assert held.index.tolist() == expected.index.tolist()
+        assert np.allclose(held['quantity'], expected['quantity'])
+        assert np.allclose(held['cost'], expected['cost'])
+        # Closed positions are left out by default
+        assert index.holdings_at(date).index.tolist() == expected.index[expected['quantity'] != 0].tolist()
+
+
+def test_holdings_between_matches_recompute(ledger):
+    index = HoldingsIndex(ledger, snapshot_every=8)
+    quantities = index.holdings_between('2024-01-03', '2024-01-12')
+    for date, row in quantities.iterrows():
+        expected = _recompute(ledger, date)['quantity']
+        assert np.allclose(row.reindex(expected.index, fill_value=0), expected)
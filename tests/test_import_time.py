@@ -0,0 +1,33 @@
+import os
+import sys
+import json
+import subprocess
+
+
+repository_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Importing the portfolio (as the app and batch scripts do) should start in well under a second
+import_time_budget = 1.0
+deferred_modules = ['matplotlib', 'yfinance', 'currency_converter']
+
+import_script = f'''
+import sys, json, time
+start = time.perf_counter()
+import Invest_e_Gator.src.portfolio
+print(json.dumps({{'seconds': time.perf_counter() - start, 'loaded': [module for module in {deferred_modules!r} if module in sys.modules]}}))
+'''
+
+
+def _import_portfolio() -> dict:
+    # Fresh interpreter so that nothing is imported yet
+    output = subprocess.run([sys.executable, '-c', import_script], cwd=repository_path, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_import_defers_heavy_modules():
+    assert _import_portfolio()['loaded'] == []
+
+
+def test_import_time_budget():
+    # Best of a few runs so that a busy machine doesn't fail the test
+    seconds = min(_import_portfolio()['seconds'] for _ in range(3))
+    assert seconds < import_time_budget, f'Importing Invest_e_Gator.src.portfolio took {seconds:.2f}s'
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Invest_e_Gator.src.lot_engine import LotEngine
+
+
+def _ledger(rows) -> pd.DataFrame:
+    # (transaction_type, n_shares, share_price_base_currency) rows of one ticker, one day apart
+    df = pd.DataFrame(rows, columns=['transaction_type', 'n_shares', 'share_price_base_currency'])
+    df['date_hour'] = pd.date_range('2024-01-01', periods=len(df))
+    df['ticker_symbol'] = 'aaa'
+    df['transaction_action'] = 'real'
+    return df
+
+
+@pytest.mark.parametrize('method, realized, open_lots', [
+    # 10 @ 10 then 5 @ 20 sold at 30
+    ('fifo', 10 * 20 + 5 * 10, [(5, 20)]),
+    # 10 @ 20 then 5 @ 10 sold at 30
+    ('lifo', 10 * 10 + 5 * 20, [(5, 10)]),
+    # 15 pooled @ 15 sold at 30
+    ('average', 15 * 15, [(5, 15)]),
+    ])
+def test_methods(method, realized, open_lots):
+    engine = LotEngine(_ledger([('buy', 10, 10.0), ('buy', 10, 20.0), ('sale', 15, 30.0)]), method)
+    assert engine.run().tolist() == [0, 0, realized]
+    lots = engine.open_lots()
+    assert list(zip(lots['n_shares'], lots['share_price_base_currency'])) == open_lots
+    assert (lots['transaction_type'] == 'buy').all()
+
+
+def test_partial_sell_across_lots():
+    engine = LotEngine(_ledger([('buy', 10, 10.0), ('buy', 10, 20.0), ('buy', 10, 30.0), ('sale', 25, 40.0), ('sale', 3, 40.0)]), 'fifo')
+    # The first sale empties the first two lots and takes 5 shares of the third, the second one takes 3 more
+    assert engine.run().tolist() == [0, 0, 0, 10 * 30 + 10 * 20 + 5 * 10, 3 * 10]
+    lots = engine.open_lots()
+    assert lots[['n_shares', 'share_price_base_currency']].values.tolist() == [[2, 30]]
+    assert lots['date_hour'].tolist() == [pd.Timestamp('2024-01-03')]
+
+
+def test_oversell_is_an_open_sale_lot():
+    # Selling more than the open shares keeps the excess as an open sale lot (a short), realized when shares are bought back
+    ledger = _ledger([('buy', 5, 10.0), ('sale', 8, 20.0), ('buy', 4, 15.0)])
+    engine = LotEngine(ledger.iloc[:2], 'fifo')
+    assert engine.run().tolist() == [0, 5 * 10]
+    assert engine.open_lots()[['transaction_type', 'n_shares', 'share_price_base_currency']].values.tolist() == [['sale', 3, 20.0]]
+
+    engine = LotEngine(ledger, 'fifo')
+    assert engine.run().tolist() == [0, 5 * 10, 3 * (20 - 15)]
+    lots = engine.open_lots()
+    assert lots[['transaction_type', 'n_shares', 'share_price_base_currency']].values.tolist() == [['buy', 1, 15.0]]
+
+
+def test_cumulative_realized():
+    engine = LotEngine(_ledger([('buy', 10, 10.0), ('sale', 4, 12.0), ('sale', 6, 15.0)]), 'fifo')
+    cumulative = engine.cumulative_realized(pd.date_range('2024-01-01', '2024-01-04'))
+    # Transactions dated on or before each date
+    assert cumulative['aaa'].tolist() == [0, 4 * 2, 4 * 2 + 6 * 5, 4 * 2 + 6 * 5]
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        LotEngine(_ledger([('buy', 1, 1.0)]), 'hifo')
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Invest_e_Gator.src import ticker as ticker_module
+from Invest_e_Gator.src.metrics_engine import MetricsEngine
+from Invest_e_Gator.src.secondary_modules.price_history_store import PriceHistoryStore
+
+
+def _ledger(rows) -> pd.DataFrame:
+    # Portfolio ledger layout, amounts already in the base currency
+    df = pd.DataFrame(rows, columns=['date_hour', 'transaction_type', 'ticker_symbol', 'n_shares', 'share_price_base_currency'])
+    df['date_hour'] = pd.to_datetime(df['date_hour'])
+    df['transaction_action'] = 'real'
+    df['quantity'] = np.where(df['transaction_type'] == 'buy', 1, -1) * df['n_shares']
+    df['transact_amount_base_currency'] = df['quantity'] * df['share_price_base_currency']
+    return df
+
+
+@pytest.fixture
+def closes(tmp_path, monkeypatch):
+    # Stored closes: aaa trades from Thursday 2024-01-04, bbb only from Tuesday 2024-01-09
+    store = PriceHistoryStore(store_path=str(tmp_path))
+    bars = {'aaa': {'2024-01-04': 11.0, '2024-01-05': 12.0, '2024-01-08': 13.0, '2024-01-09': 14.0}, 'bbb': {'2024-01-09': 55.0}}
+    for symbol, symbol_closes in bars.items():
+        store.update(symbol, pd.DataFrame({'Close': list(symbol_closes.values())}, index=pd.to_datetime(list(symbol_closes))), start='2024-01-01', end='2024-01-09')
+    monkeypatch.setattr(ticker_module, 'price_history_store', store)
+
+
+@pytest.fixture
+def engine(closes):
+    ledger = _ledger([
+        ('2024-01-04 10:00:00', 'buy', 'aaa', 10, 10.0),
+        # Saturday, bbb has no price before Tuesday
+        ('2024-01-06 11:00:00', 'buy', 'bbb', 2, 50.0),
+        # Buy and sale on the same day
+        ('2024-01-08 09:00:00', 'buy', 'aaa', 5, 12.0),
+        ('2024-01-08 15:00:00', 'sale', 'aaa', 6, 13.0),
+        ])
+    # Friday to Tuesday: each transaction counts from the first date on or after it
+    dates = pd.date_range('2024-01-05', '2024-01-09')
+    return MetricsEngine(ledger, 'usd', dates, ticker_currencies={'aaa': 'usd', 'bbb': 'usd'})
+
+
+def test_positions(engine):
+    matrices = engine.compute()
+    assert matrices['position_held']['aaa'].tolist() == [10, 10, 10, 10, 9]
+    # Weekend dates are valued at the previous (Friday) close
+    assert matrices['position_values']['aaa'].tolist() == [120, 120, 120, 130, 126]
+    assert matrices['position_invested']['aaa'].tolist() == [100, 100, 100, 100, 82]
+    assert matrices['position_cost_average']['aaa'].iloc[-1] == pytest.approx(82 / 9)
+    # FIFO: 6 shares bought at 10 sold at 13
+    assert matrices['position_realized_gains_losses']['aaa'].tolist() == [0, 0, 0, 0, 18]
+    assert matrices['position_pl']['aaa'].iloc[-1] == pytest.approx((126 + 18 - 82) / 82)
+
+    # bbb is not traded before Sunday, then valued 0 until it has a price
+    assert np.isnan(matrices['position_held']['bbb'].iloc[:2]).all()
+    assert matrices['position_held']['bbb'].iloc[2:].tolist() == [2, 2, 2]
+    assert matrices['position_values']['bbb'].iloc[2:].tolist() == [0, 0, 110]
+    assert matrices['position_ratio_pf_value']['bbb'].iloc[-1] == pytest.approx(110 / 236)
+    assert matrices['position_ratio_invested']['aaa'].iloc[-1] == pytest.approx(82 / 182)
+
+
+def test_totals(engine):
+    totals = engine.to_totals_frame()
+    assert totals['total_value'].tolist() == [120, 120, 120, 130, 236]
+    assert totals['total_invested'].tolist() == [100, 100, 200, 200, 182]
+    assert totals['total_realized'].tolist() == [0, 0, 0, 0, 18]
+    assert np.allclose(totals['total_pl'], [0.2, 0.2, -0.4, -0.35, (236 + 18 - 182) / 182])
+
+
+def test_tidy_positions(engine):
+    positions = engine.to_positions_frame()
+    # Rows of the traded tickers only, by date then ticker
+    assert len(positions) == 2 + 3 * 2
+    assert positions.xs(pd.Timestamp('2024-01-06'), level='date').index.astype(str).tolist() == ['aaa']
+    pd.testing.assert_series_equal(positions.xs('aaa', level='ticker_symbol')['position_values'],
+                                   engine.matrices['position_values']['aaa'].rename_axis('date'), check_names=False, check_freq=False)
@@ -0,0 +1,64 @@
+import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Invest_e_Gator.src.portfolio import Portfolio
+from Invest_e_Gator.src.secondary_modules.metrics_state import MetricsState, fingerprint_columns
+
+
+def test_state_key_per_table():
+    portfolios = [Portfolio(user_id='user'), Portfolio(user_id='user')]
+    portfolios[0].table_name, portfolios[1].table_name = 'degiro', 'ibkr'
+    keys = [portfolio.metrics_state_key(today=False, lot_method='fifo') for portfolio in portfolios]
+    assert keys[0] != keys[1]
+
+
+def test_state_key_fields_do_not_collide():
+    # Joined with '_', user a_b and table c would give the same key as user a and table b_c
+    portfolios = [Portfolio(user_id='a_b'), Portfolio(user_id='a')]
+    portfolios[0].table_name, portfolios[1].table_name = 'c', 'b_c'
+    keys = [portfolio.metrics_state_key(today=False, lot_method='fifo') for portfolio in portfolios]
+    assert keys[0] != keys[1]
+    assert portfolios[0].metrics_state_key(today=True, lot_method='fifo') != keys[0]
+
+
+def test_state_key_per_ledger_without_table():
+    def ledger(ticker_symbols):
+        # One row per ticker, each column holding the ticker symbol
+        return pd.DataFrame({column: ticker_symbols for column in fingerprint_columns})
+
+    portfolios = [Portfolio(user_id='user'), Portfolio(user_id='user')]
+    portfolios[0].transactions_df, portfolios[1].transactions_df = ledger(['aaa']), ledger(['bbb'])
+    keys = [portfolio.metrics_state_key(today=False, lot_method='fifo') for portfolio in portfolios]
+    assert keys[0] != keys[1]
+    # Adding transactions keeps the key of the ledger
+    portfolios[0].transactions_df = ledger(['aaa', 'bbb'])
+    assert portfolios[0].metrics_state_key(today=False, lot_method='fifo') == keys[0]
+
+
+def test_save_and_load(tmp_path):
+    state = MetricsState('user_degiro_usd_fifo', state_path=str(tmp_path))
+    assert state.load() is None
+    state.save({'fingerprint': np.arange(3)})
+    assert np.array_equal(state.load()['fingerprint'], np.arange(3))
+    assert os.listdir(tmp_path) == [os.path.basename(state.path)]
+
+
+def test_concurrent_saves_of_a_key(tmp_path):
+    # Writers of the same key never share their temporary file, so the state is always one of the saved states
+    states = [{'writer': writer, 'values': np.full(100_000, writer)} for writer in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda state: MetricsState('user_degiro_usd_fifo', state_path=str(tmp_path)).save(state), states))
+    loaded = MetricsState('user_degiro_usd_fifo', state_path=str(tmp_path)).load()
+    assert (loaded['values'] == loaded['writer']).all()
+    assert os.listdir(tmp_path) == [os.path.basename(MetricsState('user_degiro_usd_fifo').path)]
+
+
+def test_failed_save_leaves_no_temporary_file(tmp_path):
+    with pytest.raises((pickle.PicklingError, AttributeError)):
+        MetricsState('user_degiro_usd_fifo', state_path=str(tmp_path)).save({'unpicklable': lambda: None})
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Invest_e_Gator.src import ticker as ticker_module
+from Invest_e_Gator.src import portfolio_metrics as portfolio_metrics_module
+from Invest_e_Gator.src.ticker import Ticker
+from Invest_e_Gator.src.portfolio_metrics import PortfolioMetrics
+from Invest_e_Gator.src.secondary_modules.price_history_store import PriceHistoryStore
+
+
+@pytest.fixture
+def downloads(tmp_path, monkeypatch):
+    # Local price history store in a temporary directory and multi-ticker downloads answered with fake daily bars
+    monkeypatch.setattr(ticker_module, 'price_history_store', PriceHistoryStore(store_path=str(tmp_path / 'price_history')))
+    requested = []
+
+    def download_daily_bars(symbols, start, end):
+        requested.append((tuple(symbols), start, end))
+        index = pd.date_range(start, end, freq='D')
+        return {symbol: pd.DataFrame({'Close': 10.0 + np.arange(len(index))}, index=index) for symbol in symbols}
+
+    monkeypatch.setattr(Ticker, '_download_daily_bars', staticmethod(download_daily_bars))
+    return requested
+
+
+def test_plot_current_metrics(downloads, tmp_path, monkeypatch):
+    monkeypatch.setattr(portfolio_metrics_module, 'results_path', str(tmp_path / 'results'))
+    today = pd.Timestamp(datetime.now().date())
+    positions = pd.DataFrame({'position_values': [100.0, 50.0], 'position_invested': [80.0, 60.0], 'position_ratio_invested': [0.6, 0.4],
+                              'position_ratio_pf_value': [0.7, 0.3], 'position_cost_average': [8.0, 12.0], 'position_pl': [20.0, -10.0]},
+                             index=pd.MultiIndex.from_product([[today], ['aaa', 'bbb']], names=['date', 'ticker_symbol']))
+    totals = pd.DataFrame({'total_value': [150.0], 'total_invested': [140.0], 'total_realized': [0.0], 'total_pl': [10.0]}, index=pd.Index([today], name='date'))
+
+    # The current prices of all plotted tickers come from one bulk download
+    PortfolioMetrics(pd.DataFrame(), 'usd', today=True)._plot_current_metrics(positions, totals)
+    assert len(downloads) == 1
+    assert (tmp_path / 'results' / 'metrics' / 'metrics_plot.png').exists()
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Invest_e_Gator.src.secondary_modules.price_history_store import PriceHistoryStore, _to_day
+
+
+def _bars(start, end):
+    index = pd.date_range(start, end, freq='D')
+    return pd.DataFrame({'Open': 1.0, 'High': 1.0, 'Low': 1.0, 'Close': np.arange(len(index), dtype='float64'), 'Volume': 0.0}, index=index)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PriceHistoryStore(store_path=str(tmp_path))
+
+
+def test_sync_fetches_missing_ranges_only(store):
+    start, end = _to_day(datetime.now() - timedelta(days=10)), _to_day(datetime.now())
+    fetched = []
+    fetch = lambda range_start, range_end: fetched.append((range_start, range_end)) or _bars(range_start, range_end)
+
+    store.sync('aaa', fetch, start=start, end=end)
+    store.sync('aaa', fetch, start=start + timedelta(days=2), end=end - timedelta(days=2))
+    assert fetched == [(start, end)]
+    assert len(store.history('aaa', start=start, end=end)) == 11
+
+
+def test_failed_fetch_is_refetched(store):
+    start, end = _to_day(datetime.now() - timedelta(days=10)), _to_day(datetime.now())
+    fetched = []
+
+    # A failed download (None): nothing is stored and the range is still missing
+    store.sync('aaa', lambda range_start, range_end: fetched.append((range_start, range_end)), start=start, end=end)
+    assert store.get_coverage('aaa') is None
+    assert store.missing_ranges('aaa', start=start, end=end) == [(start, end)]
+
+    store.sync('aaa', lambda range_start, range_end: fetched.append((range_start, range_end)) or _bars(range_start, range_end), start=start, end=end)
+    assert fetched == [(start, end), (start, end)]
+    assert store.missing_ranges('aaa', start=start, end=end) == []
+    assert len(store.history('aaa', start=start, end=end)) == 11
+
+
+def test_empty_range_is_not_refetched(store):
+    # Bars stored from a Monday, then a head range over the weekend before it, which has no trading day
+    monday = _to_day(datetime.now() - timedelta(days=14 + datetime.now().weekday()))
+    store.update('aaa', _bars(monday, _to_day(datetime.now())), start=monday, end=datetime.now())
+    fetched = []
+    fetch = lambda range_start, range_end: fetched.append((range_start, range_end)) or pd.DataFrame()
+
+    for _ in range(3):
+        store.sync('aaa', fetch, start=monday - timedelta(days=2), end=monday)
+    assert fetched == [(monday - timedelta(days=2), monday - timedelta(days=1))]
+    assert store.get_coverage('aaa')['start'] == str((monday - timedelta(days=2)).date())
+    # Stored bars are kept
+    assert len(store.history('aaa')) == len(_bars(monday, _to_day(datetime.now())))
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Invest_e_Gator.src.ticker import Ticker
+from Invest_e_Gator.src.purchase_optimizer import PurchaseOptimizer
+
+
+@pytest.fixture
+def quotes(monkeypatch):
+    # Live quotes of some tickers, last closes of all of them
+    live_quotes = {'AAA': 12.5, 'BBB': None}
+    last_closes = {'aaa': 11.0, 'bbb': 20.0}
+    bulk_requests = []
+
+    def bulk_history(symbols, start=None, end=None):
+        bulk_requests.append(list(symbols))
+        return pd.DataFrame({symbol: [np.nan, last_closes[symbol]] for symbol in symbols})
+
+    monkeypatch.setattr(Ticker, 'current_price', property(lambda self: live_quotes[self.ticker_symbol.upper()]))
+    monkeypatch.setattr(Ticker, 'bulk_history', staticmethod(bulk_history))
+    return bulk_requests
+
+
+def test_current_prices_are_live_quotes(quotes):
+    optimizer = PurchaseOptimizer(1000, ['aaa', 'bbb'], {'aaa': 0.5, 'bbb': 0.5})
+    # Live quote when there is one, the last close otherwise (one multi-ticker request for all of them)
+    assert optimizer.prices == {'aaa': 12.5, 'bbb': 20.0}
+    assert quotes == [['bbb']]
+
+
+def test_given_prices_are_kept(quotes):
+    optimizer = PurchaseOptimizer(1000, ['aaa', 'bbb'], {'aaa': 0.5, 'bbb': 0.5}, prices={'aaa': 10.0, 'bbb': 10.0})
+    assert optimizer.prices == {'aaa': 10.0, 'bbb': 10.0}
+    assert quotes == []
@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from Invest_e_Gator.src.secondary_modules.pydantic_valids import (data_history_batch_errors, validate_data_history, validate_data_history_batch,
+                                                                 transaction_batch_errors, validate_transaction, tags_dict_errors, validate_tags_dict)
+
+
+def _data_history_frame(starts, ends) -> pd.DataFrame:
+    return pd.DataFrame({'interval': '1d', 'period': None, 'start': pd.Series(starts, dtype=object), 'end': pd.Series(ends, dtype=object),
+                         'include_divs_splits': False, 'repair': True, 'keepna': False})
+
+
+def test_data_history_batch_report():
+    df = _data_history_frame(['2024-01-02', None, '02/01/2024', datetime(2024, 1, 2, 15, 30), datetime(2024, 1, 2)],
+                             [None, '2024-01-31', '2024-01-31', None, 'tomorrow'])
+    df.index = ['a', 'b', 'c', 'd', 'e']
+    report = data_history_batch_errors(df)
+    assert report[['row', 'field']].values.tolist() == [['c', 'start'], ['d', 'start'], ['e', 'end']]
+    with pytest.raises(ValueError, match='Row c -- input start -- 02/01/2024'):
+        validate_data_history_batch(df)
+    # The valid rows pass
+    validate_data_history_batch(df.loc[['a', 'b']])
+
+
+def test_data_history_batch_matches_pydantic():
+    df = _data_history_frame(['2024-01-02', None, '02/01/2024', datetime(2024, 1, 2, 15, 30), datetime(2024, 1, 2), 20240102],
+                             [None] * 6)
+    df.loc[1, 'interval'] = '7d'
+    df['repair'] = pd.Series([True, True, 'yes', True, True, True], dtype=object)
+    batch_invalid = set(data_history_batch_errors(df)['row'])
+    for row, params in df.iterrows():
+        try:
+            validate_data_history(**params.to_dict())
+            valid = True
+        except ValueError:
+            valid = False
+        assert valid == (row not in batch_invalid), row
+
+
+def test_transaction_batch_matches_pydantic():
+    df = pd.DataFrame({
+        'date_hour': ['2024-01-02 10:00:00', '2024-01-02', datetime(2024, 1, 3, 11, 30), '2024-01-02 10:00:00', '2024-01-02 10:00:00', '2024-01-02 10:00:00'],
+        'transaction_type': ['buy', 'buy', 'sale', 'sell', 'buy', 'buy'],
+        'ticker_symbol': ['aaa', 'aaa', 'aaa', 'aaa', 12, 'aaa'],
+        'n_shares': [1, 1, 2.5, 1, 1, 1],
+        'share_price': [10.0, 10.0, 10.0, 10.0, 10.0, 10.0],
+        'share_currency': ['usd', 'usd', 'eur', 'usd', 'usd', 'xyz'],
+        'transact_currency': ['usd'] * 6,
+        'fee': [0.0, None, 1.0, 0.0, 0.0, 0.0],
+        'transaction_action': ['real', 'real', 'non_real', 'real', 'real', 'real'],
+        })
+    report = transaction_batch_errors(df)
+    assert report[['row', 'field']].values.tolist() == [[1, 'date_hour'], [3, 'transaction_type'], [4, 'ticker_symbol'], [5, 'share_currency']]
+    for row, params in df.iterrows():
+        params = params.where(params.notna(), None).to_dict()
+        try:
+            validate_transaction(**params)
+            valid = True
+        except ValueError:
+            valid = False
+        assert valid == (row not in set(report['row'])), row
+
+
+def test_tags_dict_report():
+    assert tags_dict_errors(None).empty
+    assert tags_dict_errors({'aaa': ['tech', 'us'], 'bbb': []}).empty
+    report = tags_dict_errors({'aaa': ['tech'], 'bbb': 'tech', 'ccc': ['tech', 1]})
+    assert report['row'].tolist() == ['bbb', 'ccc']
+    with pytest.raises(ValueError, match='Row bbb'):
+        validate_tags_dict({'aaa': ['tech'], 'bbb': 'tech'})
+    with pytest.raises(ValueError):
+        validate_tags_dict(['tech'])
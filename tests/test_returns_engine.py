@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from Invest_e_Gator.src.returns_engine import xirr
+
+
+def _reference_xirr(amounts, years, lo:float, hi:float) -> float:
+    # Scalar bisection on [lo, hi] (rates)
+    npv = lambda rate: sum(amount / (1 + rate) ** year for amount, year in zip(amounts, years))
+    for _ in range(200):
+        middle = (lo + hi) / 2
+        lo, hi = (middle, hi) if np.sign(npv(middle)) == np.sign(npv(lo)) else (lo, middle)
+    return (lo + hi) / 2
+
+
+def test_single_root():
+    assert np.allclose(xirr([[-100, 110]], [[0, 1]]), [0.1])
+    assert np.allclose(xirr([[-100, 50, 60]], [[0, 0.5, 1]]), [_reference_xirr([-100, 50, 60], [0, 0.5, 1], 0, 1)])
+
+
+def test_no_root():
+    # Flows all of the same sign, or nothing at all
+    assert np.isnan(xirr([[-100, 0, 0], [100, 50, 0], [0, 0, 0]], [[0, 1, 2]] * 3)).all()
+
+
+@pytest.mark.parametrize('amounts, rate', [
+    # Roots at 10% and 20%
+    ([-100, 230, -132], 0.1),
+    # Roots at 10% and 10.5%, closer than the grid step
+    ([-100, 220.5, -121.55], 0.1),
+    # Roots at -5% and 2%: the one closest to 0%
+    ([-100, 197, -96.9], 0.02),
+    ])
+def test_close_roots(amounts, rate):
+    assert np.allclose(xirr([amounts], [[0, 1, 2]]), [rate])
+
+
+def test_batched_series():
+    # Padded series of different lengths solved together give the rates they give alone
+    amounts = [[-100, 110, 0, 0], [-100, 230, -132, 0], [-50, -50, 20, 100], [-100, 0, 0, 0]]
+    years = [[0, 1, 0, 0], [0, 1, 2, 0], [0, 0.5, 1, 2], [0, 0, 0, 0]]
+    rates = xirr(amounts, years)
+    alone = [xirr([series], [series_years])[0] for series, series_years in zip(amounts, years)]
+    assert np.allclose(rates, alone, equal_nan=True)
+    assert np.allclose(rates[:2], [0.1, 0.1]) and np.isnan(rates[3])
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Invest_e_Gator.src.risk_metrics import RiskMetrics
+
+
+@pytest.fixture
+def returns() -> pd.Series:
+    # Fixed daily returns around a large mean (the rolling sums are centered so that variances don't lose precision)
+    rng = np.random.default_rng(0)
+    return pd.Series(0.5 + rng.normal(0, 0.01, 300), index=pd.bdate_range('2024-01-01', periods=300))
+
+
+@pytest.fixture
+def benchmark(returns) -> pd.Series:
+    rng = np.random.default_rng(1)
+    return 0.5 * returns + pd.Series(rng.normal(0, 0.01, len(returns)), index=returns.index)
+
+
+def _reference_drawdown(returns:pd.Series) -> pd.Series:
+    # Loss from the highest compounded value so far, starting from 1
+    wealth = pd.concat([pd.Series([1.0]), (1 + returns).cumprod().reset_index(drop=True)])
+    return (wealth / wealth.cummax() - 1).iloc[1:].set_axis(returns.index)
+
+
+@pytest.mark.parametrize('window', [2, 21, 63, 252])
+def test_rolling_volatility(returns, window):
+    volatility = RiskMetrics(returns).rolling([window])[('volatility', window)]
+    pd.testing.assert_series_equal(volatility, returns.rolling(window).std() * np.sqrt(252), check_names=False, rtol=1e-8)
+
+
+def test_rolling_against_benchmark(returns, benchmark):
+    rolling = RiskMetrics(returns, benchmark).rolling([63])
+    expected_beta = returns.rolling(63).cov(benchmark) / benchmark.rolling(63).var()
+    pd.testing.assert_series_equal(rolling[('beta', 63)], expected_beta, check_names=False, rtol=1e-8)
+    pd.testing.assert_series_equal(rolling[('correlation', 63)], returns.rolling(63).corr(benchmark), check_names=False, rtol=1e-8)
+
+
+def test_series_shorter_than_window(returns):
+    short = returns.iloc[:10]
+    rolling = RiskMetrics(short).rolling([21, 63])
+    assert len(rolling) == 10 and rolling.isna().all().all()
+    pd.testing.assert_series_equal(rolling[('volatility', 21)], short.rolling(21).std() * np.sqrt(252), check_names=False)
+
+
+def test_drawdown():
+    returns = pd.Series([-0.1, 0.05, 0.1, -0.2, 0.1, 0.3, -0.05], index=pd.bdate_range('2024-01-01', periods=7))
+    drawdown = RiskMetrics(returns).drawdown()
+    pd.testing.assert_series_equal(drawdown, _reference_drawdown(returns), check_names=False)
+    # A loss on the first day is a drawdown from the initial value
+    assert drawdown.iloc[0] == pytest.approx(-0.1)
+    assert RiskMetrics(returns).summary()['max_drawdown'] == pytest.approx(_reference_drawdown(returns).min())
+
+
+def test_drawdown_of_random_returns(returns):
+    returns = returns - 0.5
+    pd.testing.assert_series_equal(RiskMetrics(returns).drawdown(), _reference_drawdown(returns), check_names=False)
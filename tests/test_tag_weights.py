@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from Invest_e_Gator.src.tag_weights import TagWeights
+
+
+ticker_tags = {
+    'AAA': {'equity': {'weight': 0.6, 'subtags': {'us': 0.5, 'europe': 0.5}}, 'bond': {'weight': 0.4, 'subtags': {'gov': 1.0}}},
+    'bbb': {'equity': {'weight': 1.0, 'subtags': {'us': 1.0}}},
+    # No subtags: counts in its main tag only
+    'ccc': {'gold': {'weight': 1.0}},
+    }
+
+
+def test_allocations():
+    dates = pd.date_range('2024-01-01', periods=3)
+    # ddd is not tagged, ccc is not traded before the second date
+    values = pd.DataFrame({'aaa': [100.0, 100.0, 0.0], 'bbb': [50.0, 0.0, 0.0], 'ccc': [np.nan, 50.0, 0.0], 'ddd': [50.0, 50.0, 0.0]}, index=dates)
+    main, sub = TagWeights(ticker_tags).allocations(values)
+    assert main.loc[dates[0]].to_dict() == {'equity': 60 + 50, 'bond': 40, 'gold': 0}
+    assert main.loc[dates[1]].to_dict() == {'equity': 60, 'bond': 40, 'gold': 50}
+    assert sub.loc[dates[0]].to_dict() == {('equity', 'us'): 30 + 50, ('equity', 'europe'): 30, ('bond', 'gov'): 40}
+    # Subtags with weights adding up to 1 add up to their main tag
+    assert np.allclose(sub.T.groupby(level='main_tag').sum().T['equity'], main['equity'])
+    assert 'gold' not in sub.columns.get_level_values('main_tag')
+
+
+def test_allocations_normalized_by_total_value():
+    dates = pd.date_range('2024-01-01', periods=3)
+    values = pd.DataFrame({'aaa': [100.0, 100.0, 0.0], 'ccc': [0.0, 100.0, 0.0]}, index=dates)
+    total_value = values.sum(axis=1)
+    main, sub = TagWeights(ticker_tags).allocations(values, total_value)
+    # Fractions of the portfolio value, adding up to 1 for tickers whose main tag weights add up to 1
+    assert np.allclose(main.sum(axis=1), [1, 1, 0])
+    assert main.loc[dates[1]].to_dict() == {'equity': 0.3, 'bond': 0.2, 'gold': 0.5}
+    # A date without value has no allocation
+    assert (main.loc[dates[2]] == 0).all() and (sub.loc[dates[2]] == 0).all()
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Invest_e_Gator.src import ticker as ticker_module
+from Invest_e_Gator.src.ticker import Ticker
+from Invest_e_Gator.src.secondary_modules.price_history_store import PriceHistoryStore
+
+
+@pytest.fixture
+def downloads(tmp_path, monkeypatch):
+    # Local price history store in a temporary directory and multi-ticker downloads answered with fake daily bars
+    monkeypatch.setattr(ticker_module, 'price_history_store', PriceHistoryStore(store_path=str(tmp_path / 'price_history')))
+    requested = []
+
+    def download_daily_bars(symbols, start, end):
+        requested.append((tuple(symbols), start, end))
+        index = pd.date_range(start, end, freq='D')
+        return {symbol: pd.DataFrame({'Open': 10.0, 'High': 10.0, 'Low': 10.0, 'Close': 10.0 + np.arange(len(index)), 'Volume': 0.0}, index=index)
+                for symbol in symbols}
+
+    monkeypatch.setattr(Ticker, '_download_daily_bars', staticmethod(download_daily_bars))
+    return requested
+
+
+def test_bulk_history_accepts_datetimes(downloads):
+    start = datetime.now() - timedelta(days=Ticker.closing_price_lookback_days)
+    closes = Ticker.bulk_history(['aaa', 'bbb'], start=start, end=datetime.now())
+    # Windows are taken at their day
+    assert downloads == [(('aaa', 'bbb'), pd.Timestamp(start.date()), pd.Timestamp(datetime.now().date()))]
+    assert list(closes.columns) == ['aaa', 'bbb']
+    assert closes.iloc[-1].tolist() == [10.0 + Ticker.closing_price_lookback_days] * 2
+
+
+def test_download_daily_bars_failed_and_empty(monkeypatch):
+    # One symbol downloaded, one without any bar in the range and one whose download failed
+    import yfinance
+    from yfinance import shared as yf_shared
+    index = pd.date_range('2024-01-01', '2024-01-05', freq='D')
+    data = pd.concat({'AAA': pd.DataFrame({'Close': 1.0}, index=index), 'BBB': pd.DataFrame({'Close': np.nan}, index=index),
+                      'CCC': pd.DataFrame({'Close': np.nan}, index=index)}, axis=1)
+    monkeypatch.setattr(yfinance, 'download', lambda *args, **kwargs: data)
+    monkeypatch.setattr(yf_shared, '_ERRORS', {'BBB': "$BBB: possibly delisted; no price data found  (1d 2024-01-01 -> 2024-01-06)",
+                                               'CCC': "ConnectionError('Connection aborted.')"})
+    monkeypatch.setattr(ticker_module, 'get_session', lambda: None)
+
+    bars = Ticker._download_daily_bars(['aaa', 'bbb', 'ccc'], pd.Timestamp('2024-01-01'), pd.Timestamp('2024-01-05'))
+    assert len(bars['aaa']) == 5
+    assert bars['bbb'].empty
+    assert bars['ccc'] is None
+
+
+def test_bulk_history_rejects_invalid_strings(downloads):
+    with pytest.raises(ValueError):
+        Ticker.bulk_history(['aaa'], start='01/02/2024')
+    assert downloads == []
+
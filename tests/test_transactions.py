@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Invest_e_Gator.src.transactions import Transaction, TransactionBatch
+from Invest_e_Gator.src.secondary_modules.pydantic_valids import transaction_batch_errors
+
+
+def _batch_frame(index=None) -> pd.DataFrame:
+    return pd.DataFrame({
+        'date_hour': ['2024-01-02 10:00:00', datetime(2024, 1, 3, 11, 30), '2024-01-04 09:15:00', '2024-01-05 16:00:00'],
+        'transaction_type': ['buy', 'buy', 'SALE', 'buy'],
+        'ticker_symbol': ['AAA', 'bbb', 'aaa', 'ccc'],
+        'n_shares': pd.Series([10, 5.5, 4, 1], index=index, dtype=object),
+        'share_price': [20.0, 30, 25.0, 100.0],
+        'share_currency': ['usd', 'USD', 'usd', 'usd'],
+        'transact_currency': ['usd', 'usd', 'usd', 'usd'],
+        'fee': [1.0, None, 0.5, 0.0],
+        'transaction_action': ['real', 'real', 'real', 'non_real'],
+        }, index=index)
+
+
+def test_batch_columns():
+    batch = TransactionBatch(_batch_frame())
+    assert len(batch) == 4
+    assert batch.df['ticker_symbol'].tolist() == ['aaa', 'bbb', 'aaa', 'ccc']
+    assert batch.df['date_hour'].tolist() == [pd.Timestamp('2024-01-02 10:00:00'), pd.Timestamp('2024-01-03 11:30:00'),
+                                              pd.Timestamp('2024-01-04 09:15:00'), pd.Timestamp('2024-01-05 16:00:00')]
+    assert batch.quantity.tolist() == [10, 5.5, -4, 1]
+    assert np.isnan(batch.df['fee'][1])
+    # Same currency amounts are not converted
+    assert batch.transaction_amount_transact_currency.tolist() == [200.0, 165.0, -100.0, 100.0]
+
+
+def test_batch_matches_transactions():
+    transactions = [Transaction('2024-01-02 10:00:00', 'buy', 'AAA', 10, 20.0, 'usd', 'usd', 1.0, 'real'),
+                    Transaction('2024-01-04 09:15:00', 'sale', 'aaa', 4, 25.0, 'usd', 'usd', 0.5, 'real')]
+    batch = TransactionBatch.from_transactions(transactions)
+    assert batch.quantity.tolist() == [transaction.quantity for transaction in transactions]
+    assert batch.transaction_amount_transact_currency.tolist() == [transaction.transaction_amount_transact_currency for transaction in transactions]
+
+
+def test_invalid_rows_are_reported_with_their_index():
+    df = _batch_frame(index=[10, 11, 12, 13])
+    df.loc[11, 'share_currency'] = 'xyz'
+    df.loc[13, 'date_hour'] = '2024/01/05 16:00'
+    df.loc[13, 'n_shares'] = 'many'
+
+    # Reported once normalized as TransactionBatch does
+    report = transaction_batch_errors(df.assign(transaction_type=df['transaction_type'].str.lower()))
+    assert report[['row', 'field']].values.tolist() == [[11, 'share_currency'], [13, 'date_hour'], [13, 'n_shares']]
+    with pytest.raises(ValueError) as error:
+        TransactionBatch(df)
+    assert 'Row 11 -- input share_currency -- xyz' in str(error.value)
+    assert 'Row 13 -- input date_hour' in str(error.value)
+    assert 'Row 10' not in str(error.value) and 'Row 12' not in str(error.value)
+
+    # The valid rows still load
+    batch = TransactionBatch(df.drop(index=report['row'].unique()))
+    assert batch.df['ticker_symbol'].tolist() == ['aaa', 'aaa']
+    assert batch.quantity.tolist() == [10, -4]